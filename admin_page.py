@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+import streamlit as st
+from llm_metrics import metrics
+from utils import get_gateway, get_speculator, get_shared_cache
+from case_study import get_case_store, get_diversity_index
+from chat_page import get_prefix_cache, get_answer_cache
+
+
+def admin_page():
+    """Operator view of LLM latency metrics and cache statistics (open with ?page=admin)."""
+    st.title("MediLearn Admin")
+
+    st.subheader("LLM latency")
+    rows = metrics.snapshot()
+    if rows:
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    else:
+        st.info("No LLM requests have been made by this process yet.")
+    if metrics.trace_path:
+        st.caption(f"Per-request traces are appended to `{metrics.trace_path}`.")
+
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    with col1:
+        st.markdown("**Gateway**")
+        st.json(get_gateway().stats())
+    with col2:
+        st.markdown("**Case study pool**")
+        st.json(get_case_store().stats())
+    with col3:
+        st.markdown("**Repeated cases**")
+        st.json(get_diversity_index().stats())
+    with col4:
+        st.markdown("**Prompt prefix reuse**")
+        st.json(get_prefix_cache().stats())
+    with col5:
+        st.markdown("**Speculative prefetch**")
+        st.json(get_speculator().stats())
+    with col6:
+        st.markdown("**Answer cache**")
+        st.json(get_answer_cache().stats())
+
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        # Every figure on this page is for the worker process that served it
+        st.markdown(f"**Shared cache** (worker {os.environ.get('MEDILEARN_WORKER', 0)})")
+        st.json(shared_cache.stats())
+
+    with st.expander("Prometheus metrics"):
+        prometheus_text = metrics.prometheus_text()
+        st.code(prometheus_text, language="text")
+        st.download_button("Download metrics", prometheus_text, file_name="metrics.txt")
+
+    if st.button("Back to MediLearn"):
+        st.query_params.clear()
+        st.session_state.page = "case_selection"
+        st.rerun()
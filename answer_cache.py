@@ -0,0 +1,278 @@
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from storage import connect
+
+# Cosine similarity a cached question needs to be served instead of asking the model
+answer_threshold = 0.75
+# A question of fewer content words than this is mostly its context, so it must match more closely
+short_question_words = 3
+short_question_threshold = 0.9
+max_answers_per_case = 200
+max_cached_cases = 2000
+# Feature space of the hashed TF-IDF vectors
+feature_dimensions = 1 << 18
+# Weight of the previous question's features next to the question's own
+context_weight = 0.35
+
+word_pattern = re.compile(r"[a-z0-9]+")
+# Negations ("no", "not") and question words that change the answer are kept
+stop_words = frozenset(
+    "a an the i me my we you your he she it its they them is am are was were be been being do does did "
+    "to of in on at for with and or so if then this that these those there here can could would should "
+    "will shall may might must please ok okay just also any some about doctor sir patient his her him".split())
+
+
+def normalize(text):
+    """Lowercase word stems of a text, without stop words."""
+    words = []
+    for word in word_pattern.findall(text.lower()):
+        if len(word) < 2 or word in stop_words:
+            continue
+        # Light stemming so "vitals" and "vital" or "labs" and "lab" match
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def features(question, context=""):
+    """Hashed term counts of a question's words and word pairs, plus down-weighted context words.
+
+    Returns parallel arrays of feature indices and weights.
+    """
+    counts = Counter()
+    words = normalize(question)
+    for word in words:
+        counts[zlib.crc32(word.encode("utf-8")) % feature_dimensions] += 1.0
+    for first, second in zip(words, words[1:]):
+        counts[zlib.crc32(f"{first} {second}".encode("utf-8")) % feature_dimensions] += 1.0
+    for word in normalize(context):
+        counts[zlib.crc32(f"context:{word}".encode("utf-8")) % feature_dimensions] += context_weight
+    if not counts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, weights
+
+
+class CaseAnswers:
+    """Cached questions and answers of one case study, with their features concatenated for scoring."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # answer id -> (indices, weights, answer), least recently used first
+        self._packed = None
+
+    def add(self, answer_id, indices, weights, answer):
+        self.entries[answer_id] = (indices, weights, answer)
+        self._packed = None
+
+    def remove(self, answer_id):
+        self._packed = None
+        return self.entries.pop(answer_id)
+
+    def packed(self):
+        """Entry ids, all feature indices and weights end to end, and each entry's start offset."""
+        if self._packed is None:
+            ids = list(self.entries)
+            lengths = [len(indices) for indices, _, _ in self.entries.values()]
+            self._packed = (
+                ids,
+                np.concatenate([indices for indices, _, _ in self.entries.values()]),
+                np.concatenate([weights for _, weights, _ in self.entries.values()]),
+                np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64),
+            )
+        return self._packed
+
+
+class AnswerCache:
+    """Per-case cache of senior-doctor answers, looked up by TF-IDF similarity of the question.
+
+    Learners on the same case ask the same things in different words. A
+    question (with the previous question as context) is turned into a hashed
+    TF-IDF vector; when its cosine similarity to a question already answered
+    on this case reaches `threshold` (`short_question_threshold` for a
+    question of few words), the stored answer is served instead of a new
+    completion. Inverse document frequencies come from every cached
+    question. Each case keeps its `max_per_case` most recently used answers
+    and only the `max_cases` most recently used cases are kept; the cache
+    persists in SQLite, and answers other worker processes store there are
+    picked up on the next lookup. With `enabled` off, lookups always miss
+    and nothing is stored.
+    """
+
+    def __init__(self, db_name="answers.db", enabled=True, threshold=answer_threshold,
+                 max_per_case=max_answers_per_case, max_cases=max_cached_cases):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_per_case = max_per_case
+        self.max_cases = max_cases
+        self.lookups = 0
+        self.hits = 0
+        self.stored = 0
+        self.evicted = 0
+        self.saved_characters = 0
+        self._cases = OrderedDict()  # case id -> CaseAnswers, least recently used first
+        self._document_frequency = np.zeros(feature_dimensions, dtype=np.int32)
+        self._documents = 0
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                case_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                context TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        # Features are recomputed on load, so changing the normalization needs no migration
+        with self._lock:
+            self._load("SELECT id, case_id, question, context, answer FROM answers ORDER BY last_used")
+
+    def _load(self, query, *parameters):
+        for answer_id, case_id, question, context, answer in self._conn.execute(query, parameters).fetchall():
+            self._add(answer_id, case_id, *features(question, context), answer)
+            self._last_id = max(self._last_id, answer_id)
+        self._delete(self._evict())
+
+    def _load_new(self):
+        """Add answers stored since the last load, by this or another process."""
+        self._load("SELECT id, case_id, question, context, answer FROM answers WHERE id > ? ORDER BY id",
+                   self._last_id)
+
+    def _add(self, answer_id, case_id, indices, weights, answer):
+        if not len(indices):
+            # Stored under an older normalization that now leaves no features; it can never match
+            return
+        answers = self._cases.get(case_id)
+        if answers is None:
+            answers = self._cases[case_id] = CaseAnswers()
+        self._cases.move_to_end(case_id)
+        answers.add(answer_id, indices, weights, answer)
+        self._document_frequency[indices] += 1
+        self._documents += 1
+
+    def _evict(self):
+        """Drop answers beyond the per-case and case limits; return the dropped ids."""
+        evicted = []
+        for answers in self._cases.values():
+            while len(answers.entries) > self.max_per_case:
+                evicted.append(self._forget(answers, next(iter(answers.entries))))
+        while len(self._cases) > self.max_cases:
+            _, answers = self._cases.popitem(last=False)
+            evicted += [self._forget(answers, answer_id) for answer_id in list(answers.entries)]
+        self.evicted += len(evicted)
+        return evicted
+
+    def _forget(self, answers, answer_id):
+        indices, _, _ = answers.remove(answer_id)
+        self._document_frequency[indices] -= 1
+        self._documents -= 1
+        return answer_id
+
+    def _delete(self, answer_ids):
+        if answer_ids:
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in answer_ids])
+            self._conn.commit()
+
+    def _idf(self, indices):
+        return np.log((1 + self._documents) / (1 + self._document_frequency[indices])) + 1
+
+    def _best_match(self, answers, indices, weights):
+        """Id and cosine similarity of the cached question closest to the given features."""
+        ids, all_indices, all_weights, offsets = answers.packed()
+        order = np.argsort(indices)
+        query_indices = indices[order]
+        query = (weights * self._idf(indices))[order]
+        stored = all_weights * self._idf(all_indices)
+        # The query's weight for every stored feature, zero where the query lacks it
+        positions = np.minimum(np.searchsorted(query_indices, all_indices), len(query_indices) - 1)
+        shared = np.where(query_indices[positions] == all_indices, query[positions], 0.0)
+        dots = np.add.reduceat(shared * stored, offsets)
+        norms = np.sqrt(np.add.reduceat(stored * stored, offsets)) * np.linalg.norm(query)
+        similarities = dots / np.maximum(norms, 1e-12)
+        best = int(np.argmax(similarities))
+        return ids[best], float(similarities[best])
+
+    def threshold_for(self, question):
+        """Similarity needed to serve a cached answer to `question`."""
+        if len(normalize(question)) < short_question_words:
+            return max(self.threshold, short_question_threshold)
+        return self.threshold
+
+    def lookup(self, case_id, question, context=""):
+        """Return a cached answer to a question similar enough to `question` on this case, or None."""
+        if not self.enabled:
+            return None
+        indices, weights = features(question, context)
+        with self._lock:
+            self.lookups += 1
+            self._load_new()
+            answers = self._cases.get(case_id)
+            if answers is None or not answers.entries or not len(indices):
+                return None
+            answer_id, similarity = self._best_match(answers, indices, weights)
+            if similarity < self.threshold_for(question):
+                return None
+            self._cases.move_to_end(case_id)
+            answers.entries.move_to_end(answer_id)
+            answer = answers.entries[answer_id][2]
+            self.hits += 1
+            self.saved_characters += len(answer)
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), answer_id))
+            self._conn.commit()
+        return answer
+
+    def put(self, case_id, question, context, answer):
+        """Store the model's answer to a question on this case."""
+        if not self.enabled or not answer.strip():
+            return
+        indices, weights = features(question, context)
+        if not len(indices):
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (case_id, question, context, answer, last_used) VALUES (?, ?, ?, ?, ?)",
+                (case_id, question, context, answer, time.time()))
+            self._conn.commit()
+            self.stored += 1
+            # Loads this answer along with any another process stored meanwhile
+            self._load_new()
+
+    def clear(self, case_id=None):
+        """Drop every cached answer, or those of one case, e.g. after changing the system prompt."""
+        with self._lock:
+            case_ids = [case_id] if case_id is not None else list(self._cases)
+            for key in case_ids:
+                answers = self._cases.pop(key, None)
+                if answers is not None:
+                    for answer_id in list(answers.entries):
+                        self._forget(answers, answer_id)
+            if case_id is None:
+                self._conn.execute("DELETE FROM answers")
+            else:
+                self._conn.execute("DELETE FROM answers WHERE case_id = ?", (case_id,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "cases": len(self._cases),
+                "answers": self._documents,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "stored": self.stored,
+                "evicted": self.evicted,
+                "saved_characters": self.saved_characters,
+            }
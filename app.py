@@ -1,18 +1,52 @@
+import hmac
+import importlib
+
 import streamlit as st
-from case_study import case_study_page
-from chat_page import chat_page
-from evaluation_page import evaluation_page
+from session import restore_session
+
+# Page name -> (module, render function). Modules are imported on first visit,
+# so e.g. pandas and plotly are only loaded once someone reaches the evaluation.
+pages = {
+    "case_selection": ("case_study", "case_study_page"),
+    "chat_page": ("chat_page", "chat_page"),
+    "evaluation": ("evaluation_page", "evaluation_page"),
+    "admin": ("admin_page", "admin_page"),
+    "cohort": ("cohort_page", "cohort_page"),
+}
+# Staff pages, only reachable by URL (?page=admin, ?page=cohort) and behind the [ADMIN] password
+url_pages = ["admin", "cohort"]
+
+
+def staff_authorized():
+    """Ask for the [ADMIN] password once per session; staff pages stay off until one is configured."""
+    password = st.secrets.get("ADMIN", {}).get("password")
+    if not password:
+        st.error("Staff pages are disabled. Set `password` in an [ADMIN] section of secrets.toml to enable them.")
+        return False
+    if st.session_state.get("staff_authorized"):
+        return True
+    entered = st.text_input("Staff password", type="password")
+    if entered and hmac.compare_digest(entered.encode("utf-8"), password.encode("utf-8")):
+        st.session_state.staff_authorized = True
+        return True
+    if entered:
+        st.error("Wrong password.")
+    return False
 
-# Initialize the app and define pages
+
+# Pick up a saved session after a reconnect, then initialize the app and define pages
+restore_session()
 if "page" not in st.session_state:
     st.session_state.page = "case_selection"
 
-# Handle page routing
-if st.session_state.page == "case_selection":
-    case_study_page()
+if st.query_params.get("page") in url_pages:
+    st.session_state.page = st.query_params["page"]
 
-elif st.session_state.page == "chat_page":
-    chat_page()
+if st.session_state.page in url_pages and not staff_authorized():
+    # Dropping ?page from the URL leads back to the app rather than to this prompt
+    st.session_state.page = "case_selection"
+    st.stop()
 
-elif st.session_state.page == "evaluation":
-    evaluation_page()
+# Handle page routing
+module_name, render_name = pages[st.session_state.page]
+getattr(importlib.import_module(module_name), render_name)()
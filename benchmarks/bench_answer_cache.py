@@ -0,0 +1,84 @@
+"""Measure the answer cache's hit rate, wrong answers and lookup time on simulated learner questions.
+
+--learners learners each ask --questions questions about one case, drawn
+from common intents in several phrasings (with the previous question as
+context). A miss stores the "model's" answer, tagged with its intent; a hit
+whose stored answer belongs to another intent counts as a wrong answer.
+Repeated for several similarity thresholds.
+
+    python benchmarks/bench_answer_cache.py [--learners 200] [--questions 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDILEARN_CACHE_DIR"] = tempfile.mkdtemp(prefix="medilearn-bench-")
+
+from answer_cache import AnswerCache  # noqa: E402
+
+intents = {
+    "vitals": ["What are the vitals?", "What are the patient's vitals?", "Can I see the vital signs?",
+               "vitals please", "What are his vitals right now?"],
+    "ecg": ["Should I order an ECG?", "should i order ECG", "Can we get an ECG?", "I'd like an ECG",
+            "Is an ECG needed?"],
+    "no_ecg": ["Should I not order an ECG?", "Can I skip the ECG?"],
+    "labs": ["What labs should I order?", "Which labs do I order?", "What blood tests should I send?",
+             "what labs?"],
+    "temperature": ["What is the temperature?", "temperature?", "Does he have a fever?", "What's his temp?"],
+    "heart_rate": ["What is the heart rate?", "what's his heart rate", "What's the pulse?"],
+    "chest_pain": ["Is there any chest pain?", "Does he have chest pain?", "Any chest pain?"],
+    "history": ["What is his past medical history?", "Any past medical history?", "Tell me the medical history"],
+    "medications": ["What medications is he on?", "Is he taking any medications?", "current meds?"],
+    "imaging": ["Should I order a chest X-ray?", "Do we need a chest x-ray?", "Can I get imaging of the chest?"],
+    "diagnosis": ["What is the diagnosis?", "Is my diagnosis right?", "What do you think is going on?"],
+    "next_step": ["What should I do next?", "What next?", "What's the next step?"],
+}
+
+
+def simulate(threshold, learners, questions, rng):
+    cache = AnswerCache(db_name=f"answers-{threshold}.db", threshold=threshold)
+    names = list(intents)
+    # Learners favour the usual questions
+    popularity = 1 / np.arange(1, len(names) + 1)
+    popularity /= popularity.sum()
+    hits = wrong = asked = 0
+    lookup_time = 0.0
+    for _ in range(learners):
+        previous = ""
+        for intent in rng.choice(names, size=questions, p=popularity):
+            question = rng.choice(intents[intent])
+            asked += 1
+            started = time.perf_counter()
+            answer = cache.lookup("case-1", question, previous)
+            lookup_time += time.perf_counter() - started
+            if answer is None:
+                cache.put("case-1", question, previous, f"{intent}: answer")
+            else:
+                hits += 1
+                wrong += not answer.startswith(f"{intent}:")
+            previous = question
+    return asked, hits, wrong, lookup_time / asked, cache.stats()["answers"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--learners", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=8)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.75, 0.8, 0.9, 1.0])
+    args = parser.parse_args()
+
+    print(f"{'threshold':>9} {'questions':>10} {'hit rate':>9} {'wrong':>7} {'cached':>7} {'lookup ms':>10}")
+    for threshold in args.thresholds:
+        asked, hits, wrong, lookup, cached = simulate(threshold, args.learners, args.questions,
+                                                      np.random.default_rng(5))
+        print(f"{threshold:>9.2f} {asked:>10} {hits / asked:>9.1%} {wrong / asked:>7.1%} {cached:>7} "
+              f"{lookup * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Time near-duplicate lookups in the case diversity index as it grows to --cases entries.
+
+Synthetic vignettes share the section labels and phrasing of real generated
+cases around varied content, are indexed, and are then probed with lightly
+reworded copies of indexed cases and with unseen cases.
+
+    python benchmarks/bench_case_diversity.py [--cases 100000] [--probes 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from minhash import MinHasher, MinHashIndex  # noqa: E402
+
+# Shared section labels and phrasing, as every generated case has them
+skeleton = ["Patient History: A {age}-year-old {sex} with", "presents with", "for {hours} hours.",
+            "Symptoms:", "Test Results: BP {sbp}/{dbp} mmHg, HR {hr} bpm.", "Investigations show"]
+syllables = ["ab", "an", "ar", "bi", "car", "di", "em", "fi", "gas", "hep", "in", "lo", "ma", "neu", "os",
+             "pa", "pul", "re", "sto", "ta", "thy", "ur", "va", "xi"]
+
+
+def build_vocabulary(rng, size=6000):
+    """Pseudo clinical terms standing in for the varied content of real vignettes."""
+    return ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) + rng.choice(["itis", "osis", "al", "ia", ""])
+            for _ in range(size)]
+
+
+def synthetic_case(rng, vocabulary):
+    values = {"age": rng.randint(18, 90), "sex": rng.choice(["man", "woman"]), "hours": rng.randint(1, 72),
+              "sbp": rng.randint(90, 190), "dbp": rng.randint(50, 110), "hr": rng.randint(45, 150)}
+    parts = []
+    for line in skeleton:
+        parts.append(line.format(**values))
+        parts.append(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(6, 12))))
+    return " ".join(parts)
+
+
+def reword(case, rng):
+    """A near-duplicate: the same vignette with a few numbers changed."""
+    words = case.split()
+    for _ in range(3):
+        i = rng.randrange(len(words))
+        if words[i].isdigit():
+            words[i] = str(int(words[i]) + 1)
+    return " ".join(words)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, default=100_000)
+    parser.add_argument("--probes", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    hasher = MinHasher()
+    index = MinHashIndex(hasher.num_perm)
+    vocabulary = build_vocabulary(rng)
+    cases = [synthetic_case(rng, vocabulary) for _ in range(args.cases)]
+
+    started = time.perf_counter()
+    signatures = [hasher.signature(case) for case in cases]
+    signing = (time.perf_counter() - started) / len(cases)
+    started = time.perf_counter()
+    for i, signature in enumerate(signatures):
+        index.add(i, signature)
+    adding = (time.perf_counter() - started) / len(cases)
+
+    def probe(texts):
+        timings, hits = [], 0
+        for text in texts:
+            signature = hasher.signature(text)
+            started = time.perf_counter()
+            hits += bool(index.query(signature, args.threshold))
+            timings.append(time.perf_counter() - started)
+        return timings, hits
+
+    near = [reword(cases[rng.randrange(len(cases))], rng) for _ in range(args.probes)]
+    fresh = [synthetic_case(rng, vocabulary) for _ in range(args.probes)]
+    print(f"{len(index)} cases indexed; signature {signing * 1e6:.0f} us/case, add {adding * 1e6:.1f} us/case")
+    print(f"{'probe':<16} {'found':>7} {'p50 us':>8} {'p99 us':>8} {'mean us':>8}")
+    for name, texts in (("near-duplicate", near), ("unseen", fresh)):
+        timings, hits = probe(texts)
+        print(f"{name:<16} {hits / len(texts):>6.1%} {percentile(timings, 50) * 1e6:>8.1f} "
+              f"{percentile(timings, 99) * 1e6:>8.1f} {statistics.fmean(timings) * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
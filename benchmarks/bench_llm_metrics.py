@@ -0,0 +1,87 @@
+"""Measure what LLM request instrumentation adds to a streamed reply through the gateway.
+
+Streams --chunks deltas from an in-process backend that returns them as
+fast as the event loop allows, through LLMGateway.stream, once with the real
+LLMMetrics and once with metrics that record nothing. The difference per
+chunk is the instrumentation cost; it is also shown as a share of the
+gap between chunks of a real stream at --tps tokens per second.
+
+    python benchmarks/bench_llm_metrics.py [--chunks 20000] [--repeat 5] [--tps 250]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_backend import LLMBackend  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from llm_metrics import LLMMetrics  # noqa: E402
+
+model = "bench-model"
+
+
+class InstantBackend(LLMBackend):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream(self, messages, model, max_tokens=None, usage=None):
+        for _ in range(self.chunks):
+            yield "token "
+        if usage is not None:
+            usage(10, self.chunks)
+
+
+class NullTrace:
+    admitted = None
+    chunks = 0
+
+    def mark_admitted(self):
+        self.admitted = 0
+
+    def mark_chunk(self):
+        pass
+
+    def set_usage(self, prompt_tokens, completion_tokens):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+
+class NullMetrics:
+    def start(self, operation, model, prompt_tokens):
+        return NullTrace()
+
+
+def time_stream(metrics, chunks):
+    gateway = LLMGateway(InstantBackend(chunks), limits={model: {"concurrency": 1, "tokens_per_minute": 10**12}},
+                         metrics=metrics)
+    started = time.perf_counter()
+    for _ in gateway.stream([{"role": "user", "content": "hi"}], model):
+        pass
+    elapsed = time.perf_counter() - started
+    gateway.loop.call_soon_threadsafe(gateway.loop.stop)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tps", type=float, default=250.0, help="token rate of a real stream, for the share column")
+    args = parser.parse_args()
+
+    bare = min(time_stream(NullMetrics(), args.chunks) for _ in range(args.repeat))
+    timed = min(time_stream(LLMMetrics(), args.chunks) for _ in range(args.repeat))
+    per_chunk = (timed - bare) / args.chunks
+    print(f"{'metrics':>8} {'us/chunk':>9}")
+    print(f"{'off':>8} {bare / args.chunks * 1e6:>9.2f}")
+    print(f"{'on':>8} {timed / args.chunks * 1e6:>9.2f}")
+    print(f"Instrumentation: {per_chunk * 1e6:+.2f} us per chunk, {per_chunk / bare * args.chunks:+.1%} of an "
+          f"in-process stream, {per_chunk * args.tps:+.3%} of a {args.tps:.0f} tokens/s stream")
+
+
+if __name__ == "__main__":
+    main()
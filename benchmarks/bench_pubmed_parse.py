@@ -0,0 +1,90 @@
+"""Compare the streaming efetch parser with the previous ET.fromstring parser.
+
+Builds a multi-megabyte efetch document by repeating the recorded sample
+articles, then reports parse time and peak traced memory for both.
+
+    python benchmarks/bench_pubmed_parse.py [--articles 4000] [--repeat 5]
+"""
+import argparse
+import io
+import os
+import re
+import sys
+import time
+import tracemalloc
+from xml.etree import ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pubmed_requests import PubMedClient  # noqa: E402
+
+fixture_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "efetch_sample.xml")
+
+
+def build_efetch_document(article_count):
+    """Return an efetch document of `article_count` articles built from the recorded sample."""
+    with open(fixture_path, "rb") as f:
+        sample = f.read()
+    articles = re.findall(rb"<PubmedArticle>.*?</PubmedArticle>", sample, re.DOTALL)
+    parts = [b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n']
+    for i in range(article_count):
+        article = articles[i % len(articles)]
+        parts.append(re.sub(rb"<PMID Version=\"1\">\d+</PMID>",
+                            b'<PMID Version="1">%d</PMID>' % (40000000 + i), article))
+    parts.append(b"\n</PubmedArticleSet>\n")
+    return b"".join(parts)
+
+
+def legacy_parse_article_details(xml_response):
+    """The parser PubMedClient used before switching to iterparse."""
+    root = ET.fromstring(xml_response)
+    articles = []
+    for article in root.findall('.//PubmedArticle'):
+        title_elem = article.find('.//ArticleTitle')
+        title = title_elem.text if title_elem is not None else None
+        abstract = article.find('.//Abstract/AbstractText')
+        abstract_text = abstract.text if abstract is not None else 'No abstract available'
+        articles.append({'title': title, 'abstract': abstract_text})
+    return articles
+
+
+def measure(label, fn, repeat):
+    # Time without tracemalloc (it slows allocation-heavy code), then trace one run for peak memory
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34} {best * 1000:9.1f} ms   peak {peak / 2**20:7.2f} MiB   {len(result)} articles")
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    document = build_efetch_document(args.articles)
+    print(f"efetch document: {len(document) / 2**20:.2f} MiB, {args.articles} articles")
+    client = PubMedClient()
+
+    # Legacy path: response.text decoded into a str, then parsed into one tree
+    legacy = measure("ET.fromstring (legacy fields)",
+                     lambda: legacy_parse_article_details(document.decode("utf-8")), args.repeat)
+    measure("ET.fromstring (full records)",
+            lambda: [client.parse_article(article) for article in
+                     ET.fromstring(document.decode("utf-8")).iter("PubmedArticle")], args.repeat)
+    # Streaming path: parsed straight from the byte stream
+    streaming = measure("iterparse (streaming)",
+                        lambda: list(client.iter_article_details(io.BytesIO(document))), args.repeat)
+    print(f"speedup {legacy[0] / streaming[0]:.2f}x, peak memory {streaming[1] / legacy[1]:.0%} of legacy")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Measure chat page rerun time as the conversation grows to 10, 100 and 500 messages.
+
+Each size is timed three ways under Streamlit's AppTest runner:
+
+- "bubbles": the message bubbles alone, the floor for any rerun that draws the history;
+- "full rerun": app.py on the chat page, as after a button press and as every sent
+  message did before the chat became a fragment;
+- "new turn": only the chat fragment, which is what reruns when a message is sent; it
+  draws the turns sent since the last full rerun, none here, so its cost stays flat.
+
+The first two draw every message as its own bubble, so the difference between them is
+only what else reruns. The evaluation chart is timed separately, building its figure and reusing the
+cached spec.
+
+    python benchmarks/bench_rerun.py [--sizes 10 100 500] [--reruns 10]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+# Keep the session store of the benchmark out of the real cache directory
+os.environ.setdefault("MEDILEARN_CACHE_DIR", tempfile.mkdtemp(prefix="medilearn-bench-"))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+fixture_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "llm_responses.json")
+
+
+def bubbles_script():
+    import streamlit as st
+
+    for message in st.session_state.messages:
+        avatar = "🤖" if message["role"] == "assistant" else "👨‍💻"
+        with st.chat_message(message["role"], avatar=avatar):
+            st.markdown(message["content"])
+
+
+def turn_script():
+    import streamlit as st
+    from chat_page import chat_panel
+
+    chat_panel(st.session_state.selected_case_study)
+
+
+def chart_script(evaluation):
+    import streamlit as st
+    from evaluation_page import render_scores
+
+    render_scores(evaluation, st.empty(), st.empty())
+
+
+def build_messages(fixtures, count):
+    return [{"role": "user", "content": f"Question {i}: should we repeat the ECG?"} if i % 2 == 0
+            else {"role": "assistant", "content": fixtures["chat"][i % len(fixtures["chat"])]}
+            for i in range(count)]
+
+
+def time_reruns(at, reruns):
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    started = time.perf_counter()
+    for _ in range(reruns):
+        at.run()
+    return (time.perf_counter() - started) / reruns
+
+
+def chat_app(source, fixtures, messages):
+    at = source()
+    at.session_state.page = "chat_page"
+    at.session_state.session_id = "bench"
+    at.session_state.selected_case_study = fixtures["case_studies"][0]
+    at.session_state.messages = messages
+    # As left by the full rerun that drew the history above the fragment
+    at.session_state.history_drawn = len(messages)
+    return at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(fixture_path, encoding="utf-8") as f:
+        fixtures = json.load(f)
+
+    sources = {
+        "bubbles": lambda: AppTest.from_function(bubbles_script, default_timeout=120),
+        "full rerun": lambda: AppTest.from_file(os.path.join(repo_dir, "app.py"), default_timeout=120),
+        "new turn": lambda: AppTest.from_function(turn_script, default_timeout=120),
+    }
+    print(f"{'messages':>8} " + " ".join(f"{name + ' ms':>14}" for name in sources))
+    for size in args.sizes:
+        messages = build_messages(fixtures, size)
+        timings = [time_reruns(chat_app(source, fixtures, list(messages)), args.reruns)
+                   for source in sources.values()]
+        print(f"{size:>8} " + " ".join(f"{timing * 1000:>14.1f}" for timing in timings))
+
+    from evaluation_page import empty_evaluation, score_chart_spec, update_evaluation
+    from json_stream import parse_object_tolerant
+
+    evaluation = empty_evaluation()
+    update_evaluation(evaluation, parse_object_tolerant(fixtures["evaluation"][0]).items())
+    at = AppTest.from_function(chart_script, args=(evaluation,), default_timeout=120)
+    score_chart_spec.cache_clear()
+    started = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - started
+    print(f"evaluation chart: first render {first * 1000:.1f} ms, "
+          f"rerun {time_reruns(at, args.reruns) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
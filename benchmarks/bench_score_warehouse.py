@@ -0,0 +1,133 @@
+"""Time appends and cohort analytics on a score warehouse of --rows synthetic evaluations.
+
+Rows are spread over --learners learners, 24 specializations and 3
+difficulties across a year and appended in batches to a warehouse in a
+temporary directory. Each cohort query is then timed on the memory-mapped
+columns and, on the first --baseline-rows rows, as a loop over one dict per
+evaluation for comparison.
+
+    python benchmarks/bench_score_warehouse.py [--rows 2000000] [--learners 50000] [--baseline-rows 200000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MEDILEARN_CACHE_DIR"] = tempfile.mkdtemp(prefix="medilearn-bench-")
+
+from score_warehouse import (ScoreWarehouse, score_columns, select,  # noqa: E402
+                             score_percentiles, specialization_heatmap, weekly_trend, learner_summary)
+
+specializations = [f"Specialization {i}" for i in range(24)]
+difficulties = ["Beginner", "Intermediate", "Expert"]
+
+
+def fill(warehouse, rows, learners, batch, rng):
+    """Append synthetic evaluations whose scores drift upwards with each learner's practice."""
+    now = time.time()
+    skill = rng.normal(6, 1.2, learners)
+    for start in range(0, rows, batch):
+        size = min(batch, rows - start)
+        learner = rng.integers(0, learners, size)
+        evaluated_at = now - 365 * 86400 * (1 - (start + np.arange(size)) / rows)
+        scores = np.clip(skill[learner, None] + 2 * (start / rows) + rng.normal(0, 1.5, (size, len(score_columns))),
+                         0, 10).round()
+        warehouse.append_many([f"learner-{i}" for i in learner], rng.choice(specializations, size),
+                              rng.choice(difficulties, size), scores, rng.integers(2, 40, size), evaluated_at)
+
+
+def dict_heatmap(records):
+    sums, counts = defaultdict(float), defaultdict(int)
+    for record in records:
+        cell = (record["specialization"], record["difficulty"])
+        sums[cell] += record["overall_impression"]
+        counts[cell] += 1
+    return {cell: sums[cell] / counts[cell] for cell in sums}
+
+
+def dict_learner_means(records):
+    scores = defaultdict(list)
+    for record in sorted(records, key=lambda record: record["evaluated_at"]):
+        scores[record["learner"]].append(record["overall_impression"])
+    return {learner: (statistics.fmean(values), values[-1]) for learner, values in scores.items()}
+
+
+def dict_percentiles(records):
+    return {key: statistics.quantiles([record[key] for record in records], n=10) for key in score_columns}
+
+
+def timed(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--learners", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=100_000)
+    parser.add_argument("--baseline-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    warehouse = ScoreWarehouse()
+    started = time.perf_counter()
+    fill(warehouse, args.rows, args.learners, args.batch, rng)
+    filling = time.perf_counter() - started
+    started = time.perf_counter()
+    single_rows = 1000
+    for i in range(single_rows):
+        warehouse.append(f"learner-{i}", specializations[i % 24], difficulties[i % 3], [7] * len(score_columns))
+    single = (time.perf_counter() - started) / single_rows
+    print(f"{warehouse.rows:,} rows, {warehouse.stats()['bytes'] / 2**20:.0f} MiB; "
+          f"bulk append {args.rows / filling:,.0f} rows/s, single append {single * 1e3:.2f} ms")
+
+    started = time.perf_counter()
+    columns = ScoreWarehouse().columns()
+    print(f"open and map columns: {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+    mask = select(columns)
+    since = time.time() - 30 * 86400
+    queries = {
+        "filter (spec, difficulty, 30 days)": lambda: select(columns, 3, 1, since),
+        "percentiles, 6 scores": lambda: score_percentiles(columns, mask),
+        "specialization heatmap": lambda: specialization_heatmap(columns, mask, len(specializations),
+                                                                 len(difficulties)),
+        "weekly trend": lambda: weekly_trend(columns, mask),
+        "learner trends and percentiles": lambda: learner_summary(columns, mask),
+    }
+
+    # The same data as one dict per evaluation, as the page held it before
+    n = min(args.baseline_rows, len(columns["scores"]))
+    records = [{"learner": int(learner), "specialization": int(spec), "difficulty": int(difficulty),
+                "evaluated_at": float(at), **dict(zip(score_columns, map(float, scores)))}
+               for learner, spec, difficulty, at, scores in zip(
+                   columns["learner"][:n], columns["specialization"][:n], columns["difficulty"][:n],
+                   columns["evaluated_at"][:n], columns["scores"][:n])]
+    baselines = {
+        "percentiles, 6 scores": lambda: dict_percentiles(records),
+        "specialization heatmap": lambda: dict_heatmap(records),
+        "learner trends and percentiles": lambda: dict_learner_means(records),
+    }
+
+    print(f"{'query':<34} {'columnar ms':>12} {'dicts ms':>12}  (dicts: {n:,} rows, scaled to {len(mask):,})")
+    for name, query in queries.items():
+        columnar = timed(query) * 1e3
+        baseline = baselines.get(name)
+        scaled = f"{timed(baseline, 1) * 1e3 * len(mask) / n:>12.0f}" if baseline else f"{'-':>12}"
+        print(f"{name:<34} {columnar:>12.1f} {scaled}")
+
+
+if __name__ == "__main__":
+    main()
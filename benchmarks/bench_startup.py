@@ -0,0 +1,89 @@
+"""Measure cold-start import cost per route and per-rerun overhead of the Streamlit entry point.
+
+Cold start runs each route's imports in a fresh interpreter under
+`python -X importtime` and sums the top-level cumulative times; "all pages"
+is what app.py loaded before routes were imported lazily. Rerun overhead is
+the wall time of repeated reruns of app.py on the case selection page under
+Streamlit's AppTest runner.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--reruns 20] [--json startup.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+routes = {
+    "case_selection": ["case_study"],
+    "chat_page": ["chat_page"],
+    "evaluation": ["evaluation_page"],
+    "all pages": ["case_study", "chat_page", "evaluation_page", "admin_page"],
+}
+# Dependencies worth knowing about when they show up on a route
+heavy_modules = ["numpy", "pandas", "plotly.express", "groq", "httpx", "requests"]
+
+importtime_line = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def import_profile(modules):
+    """Return (total cumulative microseconds, set of imported module names) for a fresh interpreter."""
+    statement = "; ".join(f"import {name}" for name in ["streamlit", "session"] + modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=repo_dir, capture_output=True, text=True, check=True)
+    total = 0
+    imported = set()
+    for match in importtime_line.finditer(result.stderr):
+        imported.add(match.group(4))
+        # One space of indent marks a module imported directly by the statement
+        if len(match.group(3)) == 1:
+            total += int(match.group(2))
+    return total, imported
+
+
+def rerun_overhead(reruns):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(repo_dir, "app.py"), default_timeout=60)
+    at.run()
+    started = time.perf_counter()
+    for _ in range(reruns):
+        at.run()
+    return (time.perf_counter() - started) / reruns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per route (best is kept)")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {"cold_start_ms": {}, "heavy_modules": {}}
+    print(f"{'route':<16} {'cold ms':>8}  heavy modules loaded")
+    for route, modules in routes.items():
+        best = None
+        for _ in range(args.repeat):
+            total, imported = import_profile(modules)
+            best = total if best is None else min(best, total)
+        heavy = [name for name in heavy_modules if name in imported]
+        results["cold_start_ms"][route] = best / 1000
+        results["heavy_modules"][route] = heavy
+        print(f"{route:<16} {best / 1000:>8.1f}  {', '.join(heavy) or '-'}")
+
+    per_rerun = rerun_overhead(args.reruns)
+    results["rerun_ms"] = per_rerun * 1000
+    print(f"case_selection rerun: {per_rerun * 1000:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
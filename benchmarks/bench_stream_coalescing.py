@@ -0,0 +1,87 @@
+"""Measure frontend updates and server CPU for a streamed chat reply with and without delta coalescing.
+
+Replays a reply of --tokens token-sized deltas (built from the recorded chat
+fixtures, arriving every 1/--tps seconds on a simulated clock) through
+st.write_stream inside Streamlit's AppTest runner, once per flush policy.
+
+    python benchmarks/bench_stream_coalescing.py [--tokens 600] [--tps 250] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from stream_coalescing import CoalescePolicy, coalesce_chunks, passthrough_policy  # noqa: E402
+
+fixture_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "llm_responses.json")
+# Model tokens usually carry their leading space
+token_pattern = re.compile(r"\s*\S+")
+
+policies = {
+    "passthrough": passthrough_policy,
+    "word 40ms": CoalescePolicy(min_interval=0.04, boundary="word"),
+    "sentence 40ms": CoalescePolicy(min_interval=0.04, boundary="sentence"),
+    "word 100ms": CoalescePolicy(min_interval=0.1, max_interval=0.25, boundary="word"),
+}
+
+
+def build_deltas(token_count):
+    with open(fixture_path, encoding="utf-8") as f:
+        replies = json.load(f)["chat"]
+    tokens = token_pattern.findall(" ".join(replies))
+    return [tokens[i % len(tokens)] for i in range(token_count)]
+
+
+def simulated_clock(interval):
+    """A clock that advances one delta interval per reading, so no real sleeping is needed."""
+    now = [0.0]
+
+    def clock():
+        now[0] += interval
+        return now[0]
+    return clock
+
+
+def render_script(chunks):
+    import streamlit as st
+    st.write_stream(iter(chunks))
+
+
+def measure(deltas, policy, tps, repeat):
+    # Untimed, as the simulated clock does not count real seconds
+    chunks = list(coalesce_chunks(deltas, policy, simulated_clock(1 / tps), timed=False))
+    # Each update re-sends the whole reply so far
+    sent_chars = sum(len("".join(chunks[:i + 1])) for i in range(len(chunks)))
+    best = float("inf")
+    for _ in range(repeat):
+        at = AppTest.from_function(render_script, args=(chunks,), default_timeout=60)
+        started = time.process_time()
+        at.run()
+        best = min(best, time.process_time() - started)
+        assert at.markdown[-1].value == "".join(deltas)
+    return len(chunks), sent_chars, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=600, help="deltas in the streamed reply")
+    parser.add_argument("--tps", type=float, default=250.0, help="simulated deltas per second")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    deltas = build_deltas(args.tokens)
+    print(f"{args.tokens} deltas, {len(''.join(deltas))} chars, {args.tps:g} deltas/s")
+    print(f"{'policy':<14} {'updates':>8} {'chars sent':>11} {'cpu ms':>8}")
+    for name, policy in policies.items():
+        updates, sent_chars, cpu = measure(deltas, policy, args.tps, args.repeat)
+        print(f"{name:<14} {updates:>8} {sent_chars:>11} {cpu * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
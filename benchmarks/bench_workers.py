@@ -0,0 +1,159 @@
+"""Measure how script-run throughput scales with the number of workers started by serve.py.
+
+For each --workers count, serve.py is started on free ports with a cache
+directory holding --rows synthetic evaluations, and --clients simulated
+browsers connect through its sticky proxy over Streamlit's websocket
+protocol. Each client reruns --page --runs times; every rerun executes the
+page script in full (the cohort dashboard by default, which is CPU bound),
+so throughput can only grow with workers on a machine with spare cores.
+
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--clients 8] [--runs 20] [--rows 200000]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+os.environ["MEDILEARN_CACHE_DIR"] = tempfile.mkdtemp(prefix="medilearn-bench-")
+
+from streamlit.proto.BackMsg_pb2 import BackMsg  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+from tornado.websocket import websocket_connect  # noqa: E402
+
+from score_warehouse import ScoreWarehouse, score_columns  # noqa: E402
+
+specializations = [f"Specialization {i}" for i in range(24)]
+difficulties = ["Beginner", "Intermediate", "Expert"]
+
+
+def fill_warehouse(rows, rng):
+    now = time.time()
+    ScoreWarehouse().append_many(
+        [f"learner-{i}" for i in rng.integers(0, 5000, rows)], rng.choice(specializations, rows),
+        rng.choice(difficulties, rows), rng.integers(0, 11, (rows, len(score_columns))),
+        rng.integers(2, 40, rows), now - rng.uniform(0, 365 * 86400, rows))
+
+
+def free_ports(count):
+    """`count` consecutive free ports (checked, not reserved)."""
+    while True:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            first = probe.getsockname()[1]
+        if first + count > 65535:
+            continue
+        sockets = []
+        try:
+            for port in range(first, first + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return first
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+
+
+def start_serve(workers):
+    port = free_ports(1)
+    worker_port = free_ports(workers)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(repo_dir, "serve.py"), "--workers", str(workers), "--host", "127.0.0.1",
+         "--port", str(port), "--worker-port", str(worker_port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    ready = set()
+    while len(ready) < workers:
+        if time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("workers did not start")
+        for worker in set(range(workers)) - ready:
+            request = urllib.request.Request(f"http://127.0.0.1:{port}/_stcore/health",
+                                             headers={"Cookie": f"medilearn_worker={worker}"})
+            try:
+                with urllib.request.urlopen(request, timeout=1) as response:
+                    # A worker that is not up yet gets the request rerouted, with a new cookie
+                    if "medilearn_worker" not in response.headers.get("Set-Cookie", ""):
+                        ready.add(worker)
+            except OSError:
+                pass
+        time.sleep(0.2)
+    return process, port
+
+
+async def rerun(connection, query_string):
+    message = BackMsg()
+    message.rerun_script.query_string = query_string
+    await connection.write_message(message.SerializeToString(), binary=True)
+    while True:
+        data = await connection.read_message()
+        if data is None:
+            raise ConnectionError("worker closed the websocket")
+        if ForwardMsg.FromString(data).WhichOneof("type") == "script_finished":
+            return
+
+
+async def client(port, query_string, runs, latencies):
+    connection = await websocket_connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"])
+    try:
+        # The first run of a session imports the page and fills caches
+        await rerun(connection, query_string)
+        for _ in range(runs):
+            started = time.perf_counter()
+            await rerun(connection, query_string)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+
+
+async def drive(port, clients, runs, query_string):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, query_string, runs, latencies) for _ in range(clients)))
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page", default="cohort", help='page to rerun ("" for case selection)')
+    args = parser.parse_args()
+
+    fill_warehouse(args.rows, np.random.default_rng(7))
+    query_string = f"page={args.page}" if args.page else ""
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients x {args.runs} reruns of ?{query_string}")
+    print(f"{'workers':>7} {'runs/s':>8} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    baseline = None
+    for workers in args.workers:
+        process, port = start_serve(workers)
+        try:
+            elapsed, latencies = asyncio.run(drive(port, args.clients, args.runs, query_string))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        # Every client's first run counts too, since it is in the elapsed time
+        throughput = args.clients * (args.runs + 1) / elapsed
+        baseline = baseline or throughput
+        latencies.sort()
+        print(f"{workers:>7} {throughput:>8.1f} {throughput / baseline:>7.2f}x "
+              f"{statistics.median(latencies) * 1e3:>8.0f} {latencies[int(0.95 * (len(latencies) - 1))] * 1e3:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Drive concurrent simulated learner sessions through the LLM gateway and report latency percentiles.
+
+Each session generates case studies, chats for a few turns (streamed) and
+asks for an evaluation, exactly like the app does. By default a local mock
+server is started so no API credits are spent:
+
+    python benchmarks/load_test.py --sessions 50 --turns 4
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8765   # already running mock
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_context import ChatContext  # noqa: E402
+from llm_backend import create_backend  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+model_name = "llama3-70b-8192"
+case_prompt = ("Generate 3 case studies for a Intermediate level doctor specializing in Cardiology "
+               "without providing diagnosis. Each case should include detailed patient history, "
+               "symptoms, and test results.")
+system_prompt = "You are a senior doctor mentoring a junior doctor."
+questions = ["What do the vitals suggest?", "Should I order an ECG?",
+             "What is on my differential?", "How should I manage this patient now?"]
+evaluation_prompt = ("You are a senior doctor tasked with evaluating a junior doctor. "
+                     "Please provide the evaluation in JSON format only.\n")
+
+
+def start_mock_process(ttft, tps):
+    """Run the mock server in its own process so it does not compete with the client for the GIL."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(repo_dir, "mock_llm_server.py"),
+         "--port", str(port), "--ttft", str(ttft), "--tps", str(tps)],
+        stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("mock LLM server did not start")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def bucket_ms(seconds):
+    """Show a histogram quantile (a bucket upper bound) in milliseconds."""
+    return "-" if seconds is None else f"<={seconds * 1000:g}"
+
+
+async def run_session(gateway, session_id, turns, timings):
+    started = time.perf_counter()
+    case_text = await gateway.complete_async(
+        [{"role": "system", "content": case_prompt}], model_name, coalesce=False, label="case_studies")
+    timings["generate"].append(time.perf_counter() - started)
+
+    context = ChatContext(case_text)
+    messages = []
+    for turn in range(turns):
+        question = f"{questions[turn % len(questions)]} (session {session_id})"
+        request = context.build_messages(system_prompt, messages, question)
+        started = time.perf_counter()
+        first = None
+        parts = []
+        async for text in gateway.stream_async(request, model_name, max_tokens=600, label="chat"):
+            if first is None:
+                first = time.perf_counter() - started
+            parts.append(text)
+        timings["chat_ttft"].append(first if first is not None else float("nan"))
+        timings["chat_total"].append(time.perf_counter() - started)
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": "".join(parts)})
+
+    transcript = "".join(f"{m['role']}: {m['content']}\n" for m in messages)
+    started = time.perf_counter()
+    await gateway.evaluate_async(evaluation_prompt + case_text + transcript, model_name, max_tokens=800,
+                                 label="evaluation")
+    timings["evaluate"].append(time.perf_counter() - started)
+
+
+async def run(gateway, sessions, turns):
+    timings = {"generate": [], "chat_ttft": [], "chat_total": [], "evaluate": []}
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_session(gateway, i, turns, timings) for i in range(sessions)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failures = [r for r in results if isinstance(r, Exception)]
+    return timings, elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--base-url", help="use an already running OpenAI-compatible server")
+    parser.add_argument("--ttft", type=float, default=0.3, help="mock time to first token (s)")
+    parser.add_argument("--tps", type=float, default=250.0, help="mock tokens per second")
+    parser.add_argument("--concurrency", type=int, default=64, help="gateway concurrency limit")
+    parser.add_argument("--tpm", type=int, default=10_000_000, help="gateway tokens-per-minute limit")
+    args = parser.parse_args()
+
+    mock_process = None
+    base_url = args.base_url
+    if base_url is None:
+        mock_process, base_url = start_mock_process(args.ttft, args.tps)
+
+    limits = {model_name: {"concurrency": args.concurrency, "tokens_per_minute": args.tpm}}
+    gateway = LLMGateway(create_backend({"backend": "mock", "base_url": base_url}, "mock"), limits)
+    future = asyncio.run_coroutine_threadsafe(run(gateway, args.sessions, args.turns), gateway.loop)
+    timings, elapsed, failures = future.result()
+
+    print(f"{args.sessions} sessions x {args.turns} turns in {elapsed:.2f}s "
+          f"({len(failures)} failed), gateway {gateway.stats()}")
+    print(f"{'operation':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for name, samples in timings.items():
+        if samples:
+            print(f"{name:<12} {len(samples):>5} {percentile(samples, 50) * 1000:>9.1f} "
+                  f"{percentile(samples, 95) * 1000:>9.1f} {percentile(samples, 99) * 1000:>9.1f} "
+                  f"{statistics.fmean(samples) * 1000:>9.1f}")
+    # The gateway's own view, measured from enqueue rather than from the caller
+    print(f"\n{'label':<14} {'requests':>8} {'queue p50':>10} {'ttft p50':>9} {'ttft p95':>9} {'gap p99':>8} (ms)")
+    for row in gateway.metrics.snapshot():
+        print(f"{row['operation']:<14} {row['requests']:>8} {bucket_ms(row['queue_p50_s']):>10} "
+              f"{bucket_ms(row['ttft_p50_s']):>9} {bucket_ms(row['ttft_p95_s']):>9} "
+              f"{bucket_ms(row['gap_p99_s']):>8}")
+    for failure in failures[:3]:
+        print(f"failure: {failure!r}")
+    if mock_process is not None:
+        mock_process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Time the pure-Python hot paths against stored baselines and fail on regressions.
+
+Covers PubMed esearch/efetch parsing, extracting the evaluation JSON from
+messy model output, building the chat prompt at 10, 100 and 1000 messages
+and splitting generated text into case studies, all on the recorded
+fixtures in benchmarks/fixtures. Streamlit is replaced by a stub and the LLM
+gateway refuses to start, so the suite runs offline in a few seconds.
+
+Every timing is divided by the time of a fixed pure-Python calibration
+loop run just before it, so baselines recorded on one machine carry over
+to another roughly and a busy machine slows both alike. A case
+fails when its normalized time exceeds the baseline by more than
+--threshold in each of three timings, or when its result no longer
+passes its check.
+
+    python benchmarks/regression.py                # compare with benchmarks/baselines.json
+    python benchmarks/regression.py --update       # record new baselines
+    python benchmarks/regression.py --only prompt --threshold 0.5
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import types
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmarks_dir))
+fixtures_dir = os.path.join(benchmarks_dir, "fixtures")
+baselines_path = os.path.join(benchmarks_dir, "baselines.json")
+default_threshold = 0.25
+# Each case is timed for at least this long per round, best of `rounds`
+min_round_time = 0.2
+rounds = 5
+# A case that looks regressed is timed again up to this many times in all before it fails,
+# and --update records the median of this many timings
+attempts = 3
+
+
+class SessionState(dict):
+    """Attribute-style dict standing in for st.session_state."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def install_streamlit_stub():
+    """Put a minimal `streamlit` module in sys.modules, enough to import the app modules."""
+    def passthrough(function=None, **kwargs):
+        return function if function is not None else (lambda f: f)
+
+    st = types.ModuleType("streamlit")
+    st.secrets = {}
+    st.session_state = SessionState()
+    st.cache_resource = st.cache_data = st.fragment = passthrough
+    st.dialog = lambda *args, **kwargs: (lambda f: f)
+    st.components = types.ModuleType("streamlit.components")
+    st.components.v1 = types.ModuleType("streamlit.components.v1")
+    sys.modules["streamlit"] = st
+    sys.modules["streamlit.components"] = st.components
+    sys.modules["streamlit.components.v1"] = st.components.v1
+    return st
+
+
+def load_fixture(name):
+    with open(os.path.join(fixtures_dir, name), "rb") as f:
+        return f.read()
+
+
+def calibrate():
+    """Seconds for a fixed mix of interpreter work: loops, string building, dicts and a regex."""
+    pattern = re.compile(r"\d+")
+    started = time.perf_counter()
+    parts = []
+    counts = {}
+    for i in range(200_000):
+        key = i % 97
+        counts[key] = counts.get(key, 0) + i
+        if i % 10 == 0:
+            parts.append(str(i))
+    len(pattern.findall(" ".join(parts)))
+    return time.perf_counter() - started
+
+
+def time_case(run):
+    """Best seconds per call of `run` over several rounds."""
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            run()
+        if time.perf_counter() - started >= min_round_time / 4:
+            break
+        calls *= 2
+    calls = max(1, int(calls * min_round_time / 4 / max(time.perf_counter() - started, 1e-9)) * 4)
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(calls):
+            run()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best
+
+
+def measure(run):
+    """Seconds per call of `run` and the calibration time measured just before it."""
+    calibration = min(calibrate() for _ in range(3))
+    return time_case(run), calibration
+
+
+def repeat_efetch(document, copies):
+    """The recorded efetch document with its articles repeated verbatim `copies` times."""
+    start = document.index(b"<PubmedArticle>")
+    end = document.rindex(b"</PubmedArticleSet>")
+    return document[:start] + document[start:end] * copies + document[end:]
+
+
+def pubmed_cases():
+    from pubmed_requests import PubMedClient
+
+    client = PubMedClient()
+    esearch = load_fixture("esearch_sample.xml").decode("utf-8")
+    efetch = load_fixture("efetch_sample.xml")
+    # One recorded response is only a few articles; repeat it to the size of a large fetch
+    efetch_copies = 667
+    recorded_pmids = ["31000001", "31000002", "31000003"]
+
+    def check_ids(ids):
+        return None if len(ids) == 1000 and all(i.isdigit() for i in ids) else f"parsed {len(ids)} ids"
+
+    def check_articles(copies):
+        def check(articles):
+            if ([article.pmid for article in articles] != recorded_pmids * copies
+                    or not all(article.title and article.abstract for article in articles)):
+                return f"parsed {len(articles)} articles, expected {len(recorded_pmids) * copies}"
+            return None
+        return check
+
+    repeated = repeat_efetch(efetch, efetch_copies)
+    yield "parse_pubmed_ids[1000 ids]", lambda: client.parse_pubmed_ids(esearch), check_ids
+    yield ("parse_article_details[efetch_sample.xml]", lambda: client.parse_article_details(efetch),
+           check_articles(1))
+    yield (f"parse_article_details[efetch_sample.xml x {efetch_copies}]",
+           lambda: client.parse_article_details(repeated), check_articles(efetch_copies))
+    client.close()
+
+
+def evaluation_cases():
+    from evaluation_page import extract_json_from_string
+
+    outputs = json.loads(load_fixture("evaluation_outputs.json"))["outputs"]
+
+    def extract_all():
+        return [len(extract_json_from_string(output["text"])) for output in outputs]
+
+    def check(counts):
+        wrong = [output["name"] for output, count in zip(outputs, counts) if count != output["expected_members"]]
+        return f"wrong member count for {', '.join(wrong)}" if wrong else None
+
+    yield f"extract_json_from_string[{len(outputs)} outputs]", extract_all, check
+
+
+def prompt_cases(st):
+    import chat_page
+
+    responses = json.loads(load_fixture("llm_responses.json"))
+    case_study = responses["case_studies"][0]
+    replies = responses["chat"]
+
+    for size in (10, 100, 1000):
+        history = []
+        for i in range(size):
+            if i % 2 == 0:
+                history.append({"role": "user", "content": f"Question {i}: what does the ECG show now?"})
+            else:
+                history.append({"role": "assistant", "content": replies[i % len(replies)]})
+
+        def cold(history=history):
+            # The first turn of a restored session: no running summary yet
+            st.session_state.clear()
+            return chat_page.get_dynamic_prompt(case_study, "What next?", history)
+
+        def warm(history=history):
+            return chat_page.get_dynamic_prompt(case_study, "What next?", history)
+
+        def check(prompt, history=history):
+            if not prompt.endswith("What next?") or history[-1]["content"] not in prompt:
+                return "prompt lost the latest turn"
+            context = st.session_state.chat_context
+            if chat_page.estimate_tokens(prompt) > context.token_budget * 1.1:
+                return "prompt over the token budget"
+            return None
+
+        yield f"get_dynamic_prompt[{size} messages, cold]", cold, check
+        cold()
+        yield f"get_dynamic_prompt[{size} messages, warm]", warm, check
+
+
+def case_split_cases():
+    import utils
+
+    responses = json.loads(load_fixture("llm_responses.json"))
+    cases = utils.split_case_studies(responses["case_studies"][0])
+    # A long generation: the recorded cases, renumbered, 30 times over
+    text = "Here are the case studies:\n\n" + "\n\n".join(
+        f"**Case Study {i + 1}:**\n{cases[i % len(cases)]}" for i in range(90))
+    chunks = re.findall(r"\s*\S+", text)
+
+    def stream():
+        splitter = utils.CaseStudySplitter()
+        found = []
+        for chunk in chunks:
+            found.extend(splitter.feed(chunk))
+        return found + splitter.close()
+
+    def check(found):
+        return None if len(found) == 90 else f"split into {len(found)} cases"
+
+    yield "split_case_studies[90 cases]", lambda: utils.split_case_studies(text), check
+    yield f"CaseStudySplitter[90 cases, {len(chunks)} chunks]", stream, check
+
+
+def all_cases(st):
+    yield from pubmed_cases()
+    yield from evaluation_cases()
+    yield from prompt_cases(st)
+    yield from case_split_cases()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="record the results as the new baselines")
+    parser.add_argument("--threshold", type=float, default=default_threshold,
+                        help="allowed slowdown as a fraction of the baseline (default 0.25)")
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    args = parser.parse_args()
+
+    st = install_streamlit_stub()
+    import utils
+
+    def no_llm():
+        raise RuntimeError("the regression suite runs offline and must not call the LLM")
+    utils.get_gateway = no_llm
+
+    baselines = {}
+    if os.path.exists(baselines_path):
+        with open(baselines_path, encoding="utf-8") as f:
+            baselines = json.load(f)["cases"]
+
+    print(f"{platform.python_implementation()} {platform.python_version()}, threshold +{args.threshold:.0%}")
+    print(f"{'case':<44} {'ms':>9} {'baseline ms':>12} {'change':>8}  status")
+    results = {}
+    failures = []
+    broken = []
+    for name, run, check in all_cases(st):
+        if args.only and args.only not in name:
+            continue
+        problem = check(run())
+        baseline = baselines.get(name)
+        if args.update:
+            timings = sorted((measure(run) for _ in range(attempts)), key=lambda timing: timing[0] / timing[1])
+            seconds, calibration = timings[len(timings) // 2]
+        else:
+            # Noise only has to be beaten once; a real slowdown shows up every time
+            for _ in range(attempts):
+                seconds, calibration = measure(run)
+                if baseline is None or seconds / calibration <= baseline * (1 + args.threshold):
+                    break
+        results[name] = seconds / calibration
+        if problem:
+            status = f"FAILED: {problem}"
+        elif baseline is None:
+            status = "new"
+        elif results[name] > baseline * (1 + args.threshold):
+            status = "REGRESSED"
+        else:
+            status = "ok"
+        if problem:
+            broken.append(name)
+        if problem or status == "REGRESSED":
+            failures.append(name)
+        expected = f"{baseline * calibration * 1e3:>12.3f}" if baseline else f"{'-':>12}"
+        change = f"{results[name] / baseline - 1:>+8.0%}" if baseline else f"{'-':>8}"
+        print(f"{name:<44} {seconds * 1e3:>9.3f} {expected} {change}  {status}")
+
+    if args.update:
+        # Recording a slower baseline is how a slowdown is accepted; a wrong result never is
+        if broken:
+            print(f"Not updating baselines: {', '.join(broken)} failed their checks.")
+            return 1
+        baselines.update(results)
+        with open(baselines_path, "w", encoding="utf-8") as f:
+            json.dump({"unit": "seconds per call / calibration seconds", "cases": baselines}, f, indent=2)
+            f.write("\n")
+        print(f"Recorded {len(results)} baselines in {os.path.relpath(baselines_path)}")
+        return 0
+    if failures:
+        print(f"{len(failures)} case(s) failed (threshold +{args.threshold:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
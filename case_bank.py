@@ -0,0 +1,221 @@
+"""Bank of pre-generated case studies for every specialization and difficulty.
+
+Filled offline by a bounded pool of workers that reuse the app's generation
+prompt and case splitting, skip near-duplicates (MinHash), and commit every
+accepted case so an interrupted run resumes where it stopped:
+
+    python case_bank.py build --per-level 50 --workers 4 --requests-per-minute 30
+    python case_bank.py stats
+
+The case study page serves from the bank whenever it holds cases for the
+selected specialization and difficulty.
+"""
+import argparse
+import math
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from minhash import MinHasher, MinHashIndex
+from storage import connect
+
+# Cases at least this similar to a banked case are dropped as duplicates
+duplicate_threshold = 0.8
+# Give up on a level once this many batches per missing batch produced nothing new
+max_attempts_factor = 3
+
+
+class CaseBank:
+    """Indexed SQLite store of generated cases; bodies are zlib-compressed next to their MinHash signature."""
+
+    def __init__(self, db_name="case_bank.db"):
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cases (
+                id INTEGER PRIMARY KEY,
+                specialization TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                body BLOB NOT NULL,
+                signature BLOB NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cases_level ON cases (specialization, difficulty);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def add(self, specialization, difficulty, body, signature):
+        """Store one case and return its ID."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO cases (specialization, difficulty, body, signature, created) VALUES (?, ?, ?, ?, ?)",
+                (specialization, difficulty, zlib.compress(body.encode("utf-8")),
+                 signature.astype(np.uint32).tobytes(), time.time()))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def count(self, specialization, difficulty):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cases WHERE specialization = ? AND difficulty = ?",
+                (specialization, difficulty)).fetchone()[0]
+
+    def counts(self):
+        """Return {(specialization, difficulty): number of cases}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT specialization, difficulty, COUNT(*) FROM cases GROUP BY specialization, difficulty")
+            return {(s, d): n for s, d, n in rows}
+
+    def ids(self, specialization, difficulty):
+        """Return the IDs of every case for a level (served from the index alone)."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT id FROM cases WHERE specialization = ? AND difficulty = ?",
+                (specialization, difficulty))]
+
+    def get(self, case_ids):
+        """Return {id: case text} for the given IDs."""
+        if not case_ids:
+            return {}
+        placeholders = ",".join("?" * len(case_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, body FROM cases WHERE id IN ({placeholders})", list(case_ids)).fetchall()
+        return {case_id: zlib.decompress(body).decode("utf-8") for case_id, body in rows}
+
+    def sample(self, specialization, difficulty, count=3, exclude=()):
+        """Return up to `count` random (id, text) pairs for a level, skipping IDs in `exclude`."""
+        candidates = [case_id for case_id in self.ids(specialization, difficulty) if case_id not in exclude]
+        chosen = random.sample(candidates, min(count, len(candidates)))
+        texts = self.get(chosen)
+        return [(case_id, texts[case_id]) for case_id in chosen if case_id in texts]
+
+    def signature_version(self):
+        """Return the MinHasher version the banked signatures were made with, or None if unrecorded."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'signature_version'").fetchone()
+        return row[0] if row else None
+
+    def ensure_signatures(self, hasher):
+        """Re-sign every banked case unless its signatures were made by `hasher`'s version; return how many."""
+        if self.signature_version() == hasher.version:
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT id, body FROM cases").fetchall()
+            self._conn.executemany(
+                "UPDATE cases SET signature = ? WHERE id = ?",
+                [(hasher.signature(zlib.decompress(body).decode("utf-8")).astype(np.uint32).tobytes(), case_id)
+                 for case_id, body in rows])
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature_version', ?)",
+                               (hasher.version,))
+            self._conn.commit()
+        return len(rows)
+
+    def signatures(self):
+        """Yield (id, signature) for every banked case."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, signature FROM cases").fetchall()
+        for case_id, signature in rows:
+            yield case_id, np.frombuffer(signature, dtype=np.uint32)
+
+
+def fill_bank(bank, generate_fn, levels, per_level, build_prompt, workers=4,
+              requests_per_minute=30, threshold=duplicate_threshold, log=print):
+    """Generate cases until every (specialization, difficulty) level holds `per_level` of them.
+
+    Progress is whatever the bank already holds, so rerunning after an
+    interruption only generates what is missing.
+    """
+    from pubmed_requests import RateLimiter
+
+    hasher = MinHasher()
+    # Signatures from another MinHasher version would silently never match new ones
+    resigned = bank.ensure_signatures(hasher)
+    if resigned:
+        log(f"Re-signed {resigned} banked cases for MinHash version {hasher.version}")
+    index = MinHashIndex(hasher.num_perm)
+    for case_id, signature in bank.signatures():
+        index.add(case_id, signature)
+    # One request at a time, however low the rate: a burst would defeat a slow per-minute limit
+    limiter = RateLimiter(requests_per_minute / 60, burst=1)
+    index_lock = threading.Lock()
+    totals = {"accepted": 0, "duplicates": 0, "failed_batches": 0}
+
+    def fill_level(specialization, difficulty):
+        missing = per_level - bank.count(specialization, difficulty)
+        # Each request yields about three cases
+        attempts = max_attempts_factor * math.ceil(max(missing, 0) / 3)
+        prompt = build_prompt(specialization, difficulty)
+        while missing > 0 and attempts > 0:
+            attempts -= 1
+            limiter.acquire()
+            try:
+                cases = generate_fn(prompt)
+            except Exception as e:
+                with index_lock:
+                    totals["failed_batches"] += 1
+                log(f"{specialization} / {difficulty}: generation failed: {e}")
+                continue
+            for case in cases[:missing]:
+                signature = hasher.signature(case)
+                with index_lock:
+                    if index.query(signature, threshold):
+                        totals["duplicates"] += 1
+                        continue
+                    case_id = bank.add(specialization, difficulty, case, signature)
+                    index.add(case_id, signature)
+                    totals["accepted"] += 1
+                    missing -= 1
+        log(f"{specialization} / {difficulty}: {per_level - max(missing, 0)}/{per_level} cases")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(fill_level, s, d) for s, d in levels]:
+            future.result()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill and inspect the offline case study bank.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="generate cases for every specialization and difficulty")
+    build_parser.add_argument("--per-level", type=int, default=30, help="cases per specialization and difficulty")
+    build_parser.add_argument("--specializations", nargs="+", help="default: all")
+    build_parser.add_argument("--difficulties", nargs="+", help="default: all")
+    build_parser.add_argument("--workers", type=int, default=4)
+    build_parser.add_argument("--requests-per-minute", type=float, default=30)
+    build_parser.add_argument("--threshold", type=float, default=duplicate_threshold,
+                              help="MinHash similarity above which a case counts as a duplicate")
+    commands.add_parser("stats", help="show how many cases each level holds")
+    args = parser.parse_args()
+
+    bank = CaseBank()
+    if args.command == "build":
+        # Imported here so `stats` works without LLM credentials
+        from case_study import SPECIALIZATIONS, DIFFICULTY_LEVELS, build_case_prompt
+        from utils import generate_case_studies
+
+        levels = [(s, d) for s in args.specializations or SPECIALIZATIONS
+                  for d in args.difficulties or DIFFICULTY_LEVELS]
+        started = time.perf_counter()
+        totals = fill_bank(bank, generate_case_studies, levels, args.per_level, build_case_prompt,
+                           args.workers, args.requests_per_minute, args.threshold)
+        print(f"Accepted {totals['accepted']} cases, dropped {totals['duplicates']} near-duplicates, "
+              f"{totals['failed_batches']} failed batches in {time.perf_counter() - started:.1f}s.")
+    else:
+        counts = bank.counts()
+        for (specialization, difficulty), count in sorted(counts.items()):
+            print(f"{specialization:<30} {difficulty:<13} {count}")
+        print(f"{sum(counts.values())} cases in total")
+
+
+if __name__ == "__main__":
+    main()
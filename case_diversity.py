@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from minhash import MinHasher, MinHashIndex
+from session_store import case_id_for
+from storage import connect
+
+# Cases this similar to one the learner has already seen count as repeats
+repeat_threshold = 0.7
+max_indexed_cases = 100_000
+
+
+class CaseDiversityIndex:
+    """Process-wide MinHash index of every case study shown, persisted in SQLite.
+
+    One index serves all sessions; each session only keeps the IDs of the
+    cases it has seen, and a new case is a repeat when one of its near
+    neighbours in the index is among them.
+    """
+
+    def __init__(self, db_name="case_diversity.db", threshold=repeat_threshold,
+                 max_entries=max_indexed_cases):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hasher = MinHasher()
+        self.index = MinHashIndex(self.hasher.num_perm)
+        self.checked = 0
+        self.repeats = 0
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shown_cases (
+                id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                added REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'signature_version'").fetchone()
+        if row is None or row[0] != self.hasher.version:
+            # Only signatures are kept, so ones from another MinHasher version cannot be rebuilt
+            self._conn.execute("DELETE FROM shown_cases")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature_version', ?)",
+                               (self.hasher.version,))
+        self._conn.commit()
+        # Oldest first, so eviction drops from the left
+        self._order = deque()
+        for case_id, signature in self._conn.execute(
+                "SELECT id, signature FROM shown_cases ORDER BY added"):
+            self.index.add(case_id, np.frombuffer(signature, dtype=np.uint32))
+            self._order.append(case_id)
+
+    def drop_repeats(self, cases, seen_ids, limit=None):
+        """Return up to `limit` cases that are not near-duplicates of ones in `seen_ids` (or of each other).
+
+        Kept cases are added to the index and their IDs to `seen_ids`.
+        """
+        return self._record(cases, seen_ids, limit, check=True)
+
+    def mark_seen(self, cases, seen_ids):
+        """Add cases known to be new to this learner to the index and their IDs to `seen_ids`."""
+        self._record(cases, seen_ids, None, check=False)
+
+    def _record(self, cases, seen_ids, limit, check):
+        kept = []
+        rows = []
+        with self._lock:
+            for case in cases:
+                if limit is not None and len(kept) >= limit:
+                    break
+                case_id = case_id_for(case)
+                signature = self.hasher.signature(case)
+                if check:
+                    self.checked += 1
+                    if any(key in seen_ids for key, _ in self.index.query(signature, self.threshold)):
+                        self.repeats += 1
+                        continue
+                kept.append(case)
+                seen_ids.add(case_id)
+                if case_id not in self.index:
+                    self.index.add(case_id, signature)
+                    self._order.append(case_id)
+                    rows.append((case_id, signature.tobytes(), time.time()))
+            evicted = self._evict()
+            if rows or evicted:
+                self._conn.executemany("INSERT OR REPLACE INTO shown_cases (id, signature, added) VALUES (?, ?, ?)",
+                                       rows)
+                self._conn.executemany("DELETE FROM shown_cases WHERE id = ?", [(e,) for e in evicted])
+                self._conn.commit()
+        return kept
+
+    def _evict(self):
+        evicted = []
+        while len(self._order) > self.max_entries:
+            case_id = self._order.popleft()
+            self.index.remove(case_id)
+            evicted.append(case_id)
+        return evicted
+
+    def stats(self):
+        return {
+            "indexed_cases": len(self.index),
+            "checked": self.checked,
+            "repeats_dropped": self.repeats,
+        }
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+
+class CaseStudyStore:
+    """Disk-backed pool of pre-generated case studies keyed by a hash of prompt and model."""
+
+    def __init__(self, generate_fn, model, db_name="case_store.db", pool_size=6,
+                 ttl=7 * 24 * 3600, max_entries=2000, refill=True, shared_cache=None, refill_interval=10):
+        self.generate_fn = generate_fn
+        # With several worker processes, only the one holding a pool's lease refills it
+        self.shared_cache = shared_cache
+        self.model = model
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Seconds between background generations, so refills leave most of the token budget to learners
+        self.refill_interval = refill_interval
+        self._last_generation = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pools (
+                key TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                body TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cases_key ON cases (key, id);
+        """)
+        self._conn.commit()
+        self._queue = queue.Queue()
+        self._pending = set()
+        if refill:
+            threading.Thread(target=self._refill_loop, name="case-store-refill", daemon=True).start()
+
+    def key_for(self, prompt):
+        """Return the content-addressed key for a prompt under the current model."""
+        return hashlib.sha256(f"{self.model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def take(self, prompt, count=3):
+        """Pop up to `count` unused cases for the prompt, or return None on a miss.
+
+        A hit schedules a top-up of the pool. A miss does not, since the caller
+        generates the cases itself; it calls `request_refill` once it is done.
+        """
+        key = self.key_for(prompt)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._touch(key, prompt, now)
+            rows = self._conn.execute(
+                "SELECT id, body FROM cases WHERE key = ? ORDER BY id LIMIT ?", (key, count)
+            ).fetchall()
+            if rows:
+                self._conn.executemany("DELETE FROM cases WHERE id = ?", [(row[0],) for row in rows])
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._conn.commit()
+        if rows:
+            self.request_refill(prompt)
+        return [row[1] for row in rows] or None
+
+    def put(self, prompt, cases):
+        """Add freshly generated cases to the pool for the prompt."""
+        key = self.key_for(prompt)
+        now = time.time()
+        with self._lock:
+            self._touch(key, prompt, now)
+            self._conn.executemany(
+                "INSERT INTO cases (key, body, created) VALUES (?, ?, ?)",
+                [(key, case, now) for case in cases],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def available(self, prompt):
+        """Return the number of unused cases pooled for the prompt."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cases WHERE key = ?", (self.key_for(prompt),)
+            ).fetchone()[0]
+
+    def request_refill(self, prompt):
+        """Schedule a background top-up of the pool for the prompt."""
+        key = self.key_for(prompt)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put((key, prompt))
+
+    def stats(self):
+        """Return hit/miss counters and pool occupancy."""
+        with self._lock:
+            pooled = self._conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "refills": self.refills,
+                "evictions": self.evictions,
+                "pooled_cases": pooled,
+                "pending_refills": len(self._pending),
+            }
+
+    def _touch(self, key, prompt, now):
+        self._conn.execute(
+            "INSERT INTO pools (key, prompt, last_used) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET last_used = excluded.last_used",
+            (key, prompt, now),
+        )
+
+    def _expire(self, now):
+        cursor = self._conn.execute("DELETE FROM cases WHERE created < ?", (now - self.ttl,))
+        self.evictions += cursor.rowcount
+
+    def _evict(self):
+        # Drop whole pools, least recently used first, until under the size bound
+        total = self._conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+        if total <= self.max_entries:
+            return
+        for (key,) in self._conn.execute("SELECT key FROM pools ORDER BY last_used").fetchall():
+            cursor = self._conn.execute("DELETE FROM cases WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM pools WHERE key = ?", (key,))
+            self.evictions += cursor.rowcount
+            total -= cursor.rowcount
+            if total <= self.max_entries:
+                break
+
+    def _refill(self, prompt):
+        while self.available(prompt) < self.pool_size:
+            wait = self._last_generation + self.refill_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_generation = time.monotonic()
+            cases = self.generate_fn(prompt)
+            if not cases:
+                break
+            self.put(prompt, cases)
+            with self._lock:
+                self.refills += 1
+
+    def _refill_loop(self):
+        while True:
+            key, prompt = self._queue.get()
+            try:
+                if self.shared_cache is None:
+                    self._refill(prompt)
+                else:
+                    with self.shared_cache.lease(f"case-refill:{key}") as held:
+                        if held:
+                            self._refill(prompt)
+            except Exception:
+                logger.exception("Refilling case study pool failed")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
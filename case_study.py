@@ -1,90 +1,246 @@
 import streamlit as st
 import re
-from utils import generate_case_studies
-from pubmed_modal import open_dialog
+from functools import partial
+from utils import (generate_case_studies, stream_case_studies, split_case_studies, submit_case_studies,
+                   model_name, get_gateway, get_speculator, get_shared_cache)
+from case_store import CaseStudyStore
+from chat_context import estimate_tokens
+from llm_gateway import default_completion_tokens
+from session import save_session, store_case_studies, current_session_id
 
+# Specializations and difficulty levels
+SPECIALIZATIONS = [
+    "Cardiology",
+    "Neurology",
+    "Pediatrics",
+    "Oncology",
+    "Dermatology",
+    "Endocrinology",
+    "Gastroenterology",
+    "Hematology",
+    "Infectious Disease",
+    "Nephrology",
+    "Orthopedics",
+    "Pulmonology",
+    "Rheumatology",
+    "Urology",
+    "Emergency Medicine",
+    "Geriatrics",
+    "Ophthalmology",
+    "Psychiatry",
+    "Radiology",
+    "Obstetrics and Gynecology",
+    "Anesthesiology",
+    "Otolaryngology (ENT)",
+    "Allergy and Immunology"
+]
+
+DIFFICULTY_LEVELS = ["Beginner", "Intermediate", "Expert"]
+
+# Case studies offered per "Generate Case Studies" click
+CASES_PER_REQUEST = 3
+
+
+def build_case_prompt(specialization, difficulty, count=CASES_PER_REQUEST):
+    """Build the case study generation prompt for a specialization and difficulty."""
+    cases = "case study" if count == 1 else "case studies"
+    return f"Generate {count} {cases} for a {difficulty} level doctor specializing in {specialization} without providing diagnosis. Each case should include detailed patient history, symptoms, and test results."
+
+
+@st.cache_resource
+def get_case_store():
+    """Return the process-wide case study pool; each selection's pool fills once it is first shown or used."""
+    return CaseStudyStore(partial(generate_case_studies, gateway=get_gateway()), model_name,
+                          shared_cache=get_shared_cache())
+
+
+@st.cache_resource
+def get_case_bank():
+    """Return the offline case bank filled by `python case_bank.py build`."""
+    # numpy (for the bank and the diversity index) loads on the first generation, not page load
+    from case_bank import CaseBank
+    return CaseBank()
+
+
+def take_from_bank(specialization, difficulty, count=CASES_PER_REQUEST):
+    """Serve cases this session has not seen from the case bank, or None if it has too few."""
+    shown = st.session_state.setdefault("bank_shown", set())
+    cases = get_case_bank().sample(specialization, difficulty, count, exclude=shown)
+    if len(cases) < count:
+        return None
+    shown.update(case_id for case_id, _ in cases)
+    return [text for _, text in cases]
+
+
+@st.cache_resource
+def get_diversity_index():
+    """Return the process-wide index of case studies shown so far."""
+    from case_diversity import CaseDiversityIndex
+    return CaseDiversityIndex()
+
+
+def drop_seen_cases(case_studies, specialization, difficulty, banked=False):
+    """Drop cases too similar to ones this learner has seen, then top up only as many as are missing.
+
+    Banked cases were deduplicated when the bank was built and are never served
+    twice in a session, so they are only recorded as seen.
+    """
+    seen = st.session_state.setdefault("seen_case_ids", set())
+    index = get_diversity_index()
+    if banked:
+        index.mark_seen(case_studies, seen)
+        return case_studies
+    case_studies = index.drop_repeats(case_studies, seen, limit=CASES_PER_REQUEST)
+    missing = CASES_PER_REQUEST - len(case_studies)
+    if missing > 0:
+        with st.spinner("Replacing case studies you have already seen..."):
+            extra = top_up_cases(specialization, difficulty, missing)
+        case_studies += index.drop_repeats(extra, seen, limit=missing)
+    return case_studies
+
+
+def top_up_cases(specialization, difficulty, count):
+    """Return `count` more cases for the selection, from its pool if it has any, otherwise generated."""
+    extra = get_case_store().take(build_case_prompt(specialization, difficulty), count=count)
+    if extra is None:
+        # One request; if it only repeats too, show fewer cases rather than pay again
+        extra = list(stream_case_studies(build_case_prompt(specialization, difficulty, count)))
+    return extra
+
+
+def display_case(case):
+    """Strip markdown emphasis so a case study reads cleanly in a selectbox."""
+    return re.sub(r'\*+', '', case).strip()
 
-def case_study_page():
-    # Specializations and difficulty levels
-    # specializations = ["Cardiology", "Neurology", "Pediatrics"]
-    specializations = [
-        "Cardiology",
-        "Neurology",
-        "Pediatrics",
-        "Oncology",
-        "Dermatology",
-        "Endocrinology",
-        "Gastroenterology",
-        "Hematology",
-        "Infectious Disease",
-        "Nephrology",
-        "Orthopedics",
-        "Pulmonology",
-        "Rheumatology",
-        "Urology",
-        "Emergency Medicine",
-        "Geriatrics",
-        "Ophthalmology",
-        "Psychiatry",
-        "Radiology",
-        "Obstetrics and Gynecology",
-        "Anesthesiology",
-        "Otolaryngology (ENT)",
-        "Allergy and Immunology"
-    ]
-
-    difficulty_levels = ["Beginner", "Intermediate", "Expert"]
 
+def selection_changed():
+    st.session_state.selection_touched = True
+
+
+def speculate_case_studies(specialization, difficulty):
+    """Start generating cases for the current selection, since Generate is the usual next click.
+
+    Only once the learner has changed the selection: a page visit alone
+    starts nothing, and the selection first shown is pre-warmed anyway.
+    """
+    if not st.session_state.get("selection_touched"):
+        return
+    selection = (specialization, difficulty)
+    if st.session_state.get("speculated_selection") == selection:
+        return
+    st.session_state.speculated_selection = selection
+    prompt = build_case_prompt(specialization, difficulty)
+    store = get_case_store()
+    if store.available(prompt) >= CASES_PER_REQUEST:
+        return
+    # A batch nobody claims, e.g. because the selection changed again, still fills the pool
+    get_speculator().submit(current_session_id(), "case_studies", store.key_for(prompt),
+                            partial(submit_case_studies, prompt),
+                            estimate_tokens(prompt), default_completion_tokens,
+                            on_unclaimed=lambda text: store.put(prompt, split_case_studies(text)),
+                            cancel_superseded=False)
+
+
+def prewarm_selection(specialization, difficulty):
+    """Queue a pool refill for the selection the page opened with, once per session.
+
+    Pools for other selections fill on demand: from the speculative batch
+    started when the learner picks one, and from the refill after a take.
+    """
+    if st.session_state.get("selection_touched") or st.session_state.get("selection_prewarmed"):
+        return
+    st.session_state.selection_prewarmed = True
+    get_case_store().request_refill(build_case_prompt(specialization, difficulty))
+
+
+def claim_speculative_cases(prompt):
+    """Return the cases started when this selection was made, waiting for them if needed, or None."""
+    text = get_speculator().claim(current_session_id(), "case_studies", get_case_store().key_for(prompt))
+    return (split_case_studies(text) or None) if text else None
+
+
+def stream_case_studies_to_selectbox(prompt):
+    """Stream a fresh batch of case studies, growing a preview selectbox as each one completes."""
+    placeholder = st.empty()
+    case_studies = []
+    for case in stream_case_studies(prompt):
+        case_studies.append(case)
+        with placeholder.container():
+            st.selectbox("Select a case study:",
+                         [display_case(c) for c in case_studies],
+                         key=f"streamed_case_studies_{len(case_studies)}")
+            st.caption(f"{len(case_studies)} case studies ready, generating more...")
+    placeholder.empty()
+    return case_studies
+
+
+def case_study_page():
     st.title("MediLearn 🩺")
     st.subheader("Dynamic Case Study Generator")
 
     # Selection boxes for specialization and difficulty
     selected_specialization = st.selectbox(
-        "Select your specialization:", specializations)
+        "Select your specialization:", SPECIALIZATIONS, on_change=selection_changed)
     selected_difficulty = st.selectbox(
-        "Select Difficulty Level:", difficulty_levels)
+        "Select Difficulty Level:", DIFFICULTY_LEVELS, on_change=selection_changed)
     st.markdown("---")
 
     col1, col2 = st.columns(2)
 
     with col1:
-        if st.button("Generate Case Studies", use_container_width=True):
-            prompt = f"Generate 3 case studies for a {selected_difficulty} level doctor specializing in {selected_specialization} without providing diagnosis. Each case should include detailed patient history, symptoms, and test results."
+        generate_clicked = st.button("Generate Case Studies", use_container_width=True)
+    with col2:
+        if st.button("Search PubMed", use_container_width=True):
+            # The PubMed client and its HTTP stack load only when the dialog is first opened
+            from pubmed_modal import open_dialog
+            open_dialog()
 
-            try:
-                # Generate case studies using the utility function
-                case_studies = generate_case_studies(prompt)
+    if generate_clicked:
+        prompt = build_case_prompt(selected_specialization, selected_difficulty)
 
-                # Prepare case studies for display (cleaning up ** formatting, etc.)
-                case_studies_display = [
-                    re.sub(r'\*+', '', case).strip() for case in case_studies]
+        try:
+            # Serve banked or pre-generated cases, streaming a fresh batch only when both miss
+            case_studies = take_from_bank(selected_specialization, selected_difficulty)
+            banked = case_studies is not None
+            if not banked:
+                case_studies = get_case_store().take(prompt)
+                if case_studies is None:
+                    with st.spinner("Generating case studies..."):
+                        case_studies = claim_speculative_cases(prompt)
+                    if case_studies is None:
+                        case_studies = stream_case_studies_to_selectbox(prompt)
+                    # Top the pool up only now, so the refill does not race this generation
+                    get_case_store().request_refill(prompt)
+            case_studies = drop_seen_cases(case_studies, selected_specialization, selected_difficulty, banked)
 
-                # Store case studies in session_state
+            if not case_studies:
+                st.warning("Only case studies you have already seen came back. Try again or pick another specialization.")
+            else:
+                # Store case studies in session_state, and once each in the session store
                 st.session_state.case_studies = case_studies
-                st.session_state.case_studies_display = case_studies_display
+                st.session_state.case_ids = store_case_studies(case_studies)
                 st.session_state.selected_specialization = selected_specialization
                 st.session_state.selected_difficulty = selected_difficulty
+                save_session(case_ids=st.session_state.case_ids,
+                             specialization=selected_specialization, difficulty=selected_difficulty)
 
-            except Exception as e:
-                st.error(f"Error generating case studies: {e}")
-    with col2:
-        if st.button("Search PubMed", use_container_width=True):
-            open_dialog()
+        except Exception as e:
+            st.error(f"Error generating case studies: {e}")
 
     # If case studies are generated, display the selection
     if "case_studies" in st.session_state:
         st.markdown("### Case Studies:")
 
-        # Select a case study from the display list
-        selected_case_study = st.selectbox(
-            "Select a case study:", st.session_state.case_studies_display)
+        # Select a case study, showing it without markdown (cleaning up ** formatting, etc.)
+        case_studies = st.session_state.case_studies
+        selected_index = st.selectbox(
+            "Select a case study:", range(len(case_studies)),
+            format_func=lambda index: display_case(case_studies[index]))
 
-        # Get the original index of the selected case study
-        if selected_case_study is not None:
-            original_index = st.session_state.case_studies_display.index(
-                selected_case_study)
+        if selected_index is not None:
             # Save the selected case study in session_state
-            st.session_state.selected_case_study = st.session_state.case_studies[original_index]
+            st.session_state.selected_case_study = case_studies[selected_index]
+            st.session_state.selected_case_id = st.session_state.case_ids[selected_index]
 
             # Display the selected case study using markdown
             st.markdown("### Selected Case Study:")
@@ -94,4 +250,9 @@ def case_study_page():
             # Button to proceed to the chat page
             if st.button("Proceed to Chat"):
                 st.session_state.page = "chat_page"
+                save_session(page="chat_page", selected_case_id=st.session_state.selected_case_id)
                 st.rerun()
+
+    # Last, so the page is already on screen when the LLM gateway is first created
+    prewarm_selection(selected_specialization, selected_difficulty)
+    speculate_case_studies(selected_specialization, selected_difficulty)
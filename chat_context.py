@@ -0,0 +1,164 @@
+import re
+from collections import deque
+
+# Rough characters-per-token ratio for Llama 3 on English clinical text
+chars_per_token = 4
+# Prompt budget: 8192-token window minus the reply and the system prompt
+default_token_budget = 7000
+# Most recent junior/senior exchanges kept verbatim
+default_keep_turns = 6
+# Upper bound on the running summary of older turns
+default_summary_budget = 800
+# Fraction of the budget the message list is compacted down to once it overflows
+compaction_low_water = 0.75
+# Longest excerpt kept from one folded message
+summary_excerpt_chars = 240
+
+sentence_end = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for budgeting (no tokenizer round trip)."""
+    return len(text) // chars_per_token + 1
+
+
+def speaker(message):
+    return "Senior Doctor" if message["role"] == "assistant" else "Junior Doctor"
+
+
+def format_message(message):
+    return f"{speaker(message)}: {message['content']}\n"
+
+
+def summarize_message(message):
+    """Fold one message into a single summary line: the speaker and its first sentence."""
+    text = " ".join(message["content"].split())
+    first = sentence_end.split(text, 1)[0]
+    if len(first) > summary_excerpt_chars:
+        first = first[:summary_excerpt_chars].rstrip() + "..."
+    return f"- {speaker(message)}: {first}\n"
+
+
+class ChatContext:
+    """Token-bounded chat prompt built from the case study, a running summary and the latest turns."""
+
+    def __init__(self, case_study, token_budget=default_token_budget,
+                 keep_turns=default_keep_turns, summary_budget=default_summary_budget,
+                 summarize_fn=summarize_message):
+        self.case_study = case_study
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_budget = summary_budget
+        self.summarize_fn = summarize_fn
+        self.reset()
+
+    def reset(self):
+        """Forget the running summary, e.g. when the transcript is cleared."""
+        self.summary_lines = deque()
+        self.summary_tokens = 0
+        self.summary_dropped = False
+        self.summarized_upto = 0
+        self.chat_messages = None
+        self.chat_tokens = []
+        self.synced = 0
+
+    def build_prompt(self, messages, user_input):
+        """Return the prompt for the next turn, folding old turns so it stays within budget."""
+        if len(messages) < self.summarized_upto:
+            self.reset()
+
+        header = f"Case Study: {self.case_study}\n\nOur Chat History:\n"
+        footer = f"Now Junior Doctor said something: {user_input}"
+        recent = [format_message(message) for message in messages[self.summarized_upto:]]
+        recent_tokens = [estimate_tokens(line) for line in recent]
+
+        # Keep the last K turns verbatim, folding more only if the budget demands it
+        fold = max(0, len(recent) - 2 * self.keep_turns)
+        total = (estimate_tokens(header) + estimate_tokens(footer)
+                 + self.summary_tokens + sum(recent_tokens[fold:]))
+        while total > self.token_budget and fold < len(recent):
+            total -= recent_tokens[fold]
+            fold += 1
+        self._fold(messages[self.summarized_upto:self.summarized_upto + fold])
+
+        parts = [header]
+        if self.summary_lines:
+            parts.append("Summary of earlier discussion:\n")
+            if self.summary_dropped:
+                parts.append("- (earlier exchanges omitted)\n")
+            parts.extend(self.summary_lines)
+            parts.append("Recent messages:\n")
+        parts.extend(recent[fold:])
+        parts.append(footer)
+        return "".join(parts)
+
+    def build_messages(self, system_prompt, messages, user_input):
+        """Return a role-tagged message list whose prefix stays identical from turn to turn.
+
+        The system prompt and case study form a fixed first message and earlier
+        turns are appended in place. Only when the budget is exceeded are old
+        turns folded into the summary, which rewrites the prefix once.
+        """
+        if len(messages) < self.synced or self.chat_messages is None:
+            if len(messages) < self.summarized_upto:
+                self.reset()
+            self._rebuild_messages(system_prompt, messages)
+        else:
+            self._append_messages(messages[self.synced:])
+
+        pending = {"role": "user", "content": user_input}
+        if sum(self.chat_tokens) + estimate_tokens(user_input) > self.token_budget:
+            # Compact down to the last K turns, or below the low-water mark if that
+            # is still too large, so the next few turns append without compacting
+            low_water = self.token_budget * compaction_low_water
+            fold = max(0, len(messages) - 2 * self.keep_turns - self.summarized_upto)
+            while True:
+                self._fold(messages[self.summarized_upto:self.summarized_upto + fold])
+                self._rebuild_messages(system_prompt, messages)
+                if (sum(self.chat_tokens) + estimate_tokens(user_input) <= low_water
+                        or self.summarized_upto >= len(messages)):
+                    break
+                fold = 2
+        return self.chat_messages + [pending]
+
+    def forget(self, messages, count):
+        """Account for the caller dropping the first `count` messages of its history list.
+
+        Messages not yet folded into the summary are folded now so the model
+        keeps their gist after they leave memory.
+        """
+        if count > self.summarized_upto:
+            self._fold(messages[self.summarized_upto:count])
+            # The verbatim part of the prefix changed; rebuild it on the next turn
+            self.chat_messages = None
+        self.summarized_upto -= count
+        self.synced = max(0, self.synced - count)
+
+    def _rebuild_messages(self, system_prompt, messages):
+        self.chat_messages = [{"role": "system",
+                               "content": f"{system_prompt}\n\nCase Study:\n{self.case_study}"}]
+        if self.summary_lines:
+            dropped = "- (earlier exchanges omitted)\n" if self.summary_dropped else ""
+            self.chat_messages.append({
+                "role": "system",
+                "content": "Summary of earlier discussion:\n" + dropped + "".join(self.summary_lines),
+            })
+        self.chat_tokens = [estimate_tokens(message["content"]) for message in self.chat_messages]
+        self.synced = self.summarized_upto
+        self._append_messages(messages[self.summarized_upto:])
+
+    def _append_messages(self, messages):
+        for message in messages:
+            self.chat_messages.append({"role": message["role"], "content": message["content"]})
+            self.chat_tokens.append(estimate_tokens(message["content"]))
+        self.synced += len(messages)
+
+    def _fold(self, messages):
+        for message in messages:
+            line = self.summarize_fn(message)
+            self.summary_lines.append(line)
+            self.summary_tokens += estimate_tokens(line)
+        self.summarized_upto += len(messages)
+        while self.summary_tokens > self.summary_budget and self.summary_lines:
+            self.summary_tokens -= estimate_tokens(self.summary_lines.popleft())
+            self.summary_dropped = True
@@ -1,83 +1,223 @@
+import functools
+import re
+
 import streamlit as st
 from typing import Generator
-from utils import get_chat_response
-from pubmed_modal import open_dialog
-
-def generate_chat_responses(chat_completion) -> Generator[str, None, None]:
-    """Yield chat response content from the Groq API response."""
-    for chunk in chat_completion:
-        if chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
-
-def get_dynamic_prompt(case_study, user_input):
-    # Start with the case study
-    prompt = f"Case Study: {case_study}\n\nOur Chat History:\n"
-
-    # Add previous chat history if available
-    for message in st.session_state.messages:
-        role = "Senior Doctor" if message["role"] == "assistant" else "Junior Doctor"
-        prompt += f"{role}: {message['content']}\n"
-
-    # Add the latest input from the junior doctor
-    prompt += f"Now Junior Doctor said something: {user_input}"
-
-    return prompt
-
-def chat_page():
-    st.title("Senior-Junior Doctor - Chat on Case Study")
-    st.markdown("---")
-    
+from utils import (get_chat_response, get_chat_messages_response, chat_mode, chat_stream_policy,
+                   get_speculator, submit_evaluation, model_name, evaluation_token)
+from pubmed_modal import open_dialog, get_pubmed_client
+from chat_context import ChatContext, estimate_tokens
+from evaluation_cache import EvaluationCache
+from evaluation_prompt import build_evaluation_prompt, evaluation_prompt_version
+from prompt_cache import PrefixCache
+from answer_cache import AnswerCache
+from literature import LiteratureRetriever, extract_terms
+from stream_coalescing import coalesce_chunks
+from session import append_message, trim_messages, set_references, save_session, full_transcript, current_session_id
+
+# Questions asked before a chat reply also starts evaluating the conversation
+speculate_evaluation_after = 4
+# Messages the chat fragment redraws itself before a full rerun moves them into the history above it
+fragment_messages = 10
+
+system_prompt = "You are a senior doctor mentoring a junior doctor. Provide guidance and feedback based on the following case study and junior doctor's input. Help him to diagnose the patient and not tell him the diagnose just give him hints."
+
+def generate_chat_responses(chat_completion, policy=chat_stream_policy) -> Generator[str, None, None]:
+    """Yield chat response content from the LLM gateway stream, merged into fewer UI updates."""
+    # Every yield re-renders the whole reply, so pass word-aligned batches instead of single tokens
+    yield from coalesce_chunks(chat_completion, policy)
+
+def get_chat_context(case_study):
+    """Return the session's bounded prompt context, starting a new one when the case changes."""
+    context = st.session_state.get("chat_context")
+    if context is None or context.case_study != case_study:
+        context = ChatContext(case_study)
+        st.session_state.chat_context = context
+    return context
+
+def get_dynamic_prompt(case_study, user_input, history=None):
+    # Case study, running summary of older turns, recent turns and the latest input
+    if history is None:
+        history = st.session_state.messages
+    return get_chat_context(case_study).build_prompt(history, user_input)
+
+@st.cache_resource
+def get_prefix_cache():
+    """Return the process-wide prompt prefix cache."""
+    return PrefixCache()
+
+@st.cache_resource
+def get_answer_cache():
+    """Return the process-wide answer cache (configure or switch it off with an optional [ANSWER_CACHE] section)."""
+    return AnswerCache(**st.secrets.get("ANSWER_CACHE", {}))
+
+def previous_question(history):
+    """The learner's last question before this one, the context an answer is cached under."""
+    for message in reversed(history):
+        if message["role"] == "user":
+            return message["content"]
+    return ""
+
+def replay_answer(answer):
+    """Yield a cached answer word by word, like a streamed completion."""
+    yield from re.findall(r"\s*\S+", answer)
+
+def start_chat_completion(case_study, history, user_input):
+    """Start streaming the senior doctor's reply in the configured chat mode."""
+    if chat_mode == "messages":
+        messages = get_chat_context(case_study).build_messages(
+            system_prompt, history, user_input)
+        # Track how much of this prompt repeats an earlier one
+        st.session_state.prompt_reuse = get_prefix_cache().account(messages)
+        return get_chat_messages_response(messages)
+
+    # Generate prompt with case study and user input
+    dynamic_prompt = get_dynamic_prompt(case_study, user_input, history)
+    return get_chat_response(system_prompt, dynamic_prompt)
+
+@st.cache_resource
+def get_literature_retriever():
+    """Return the process-wide background literature retriever."""
+    return LiteratureRetriever(get_pubmed_client())
+
+def start_reference_lookup(case_study, user_input):
+    """Start a background PubMed lookup for this turn, dropping lookups still queued for earlier turns."""
+    pending = st.session_state.setdefault("pending_references", {})
+    for index, future in list(pending.items()):
+        if future.cancel():
+            del pending[index]
+    terms = extract_terms(case_study, user_input)
+    return get_literature_retriever().submit(terms) if terms else None
+
+def resolve_references():
+    """Attach background lookups that have finished since the last rerun to their replies."""
+    pending = st.session_state.get("pending_references", {})
+    for seq, future in list(pending.items()):
+        if not future.done():
+            continue
+        del pending[seq]
+        if not future.cancelled() and future.exception() is None:
+            set_references(seq, future.result())
+
+def speculate_evaluation(case_study):
+    """Start evaluating the transcript so far, since Evaluate Performance is the usual next step.
+
+    Only from the `speculate_evaluation_after`th question on, as few learners
+    evaluate a conversation earlier; the speculator spaces out the rest.
+    """
+    seq = st.session_state.get("messages_offset", 0) + len(st.session_state.messages)
+    if seq < 2 * speculate_evaluation_after:
+        return
+    transcript = full_transcript()
+    prompt = build_evaluation_prompt(case_study, transcript)
+    key = EvaluationCache.key_for(case_study, transcript, model_name, evaluation_prompt_version)
+    # The evaluation of an earlier transcript is cancelled, as nothing can use it
+    get_speculator().submit(current_session_id(), "evaluation", key, functools.partial(submit_evaluation, prompt),
+                            estimate_tokens(prompt), evaluation_token)
+
+def render_references(references):
+    if references:
+        links = "\n".join(f"- [{reference['title']}]({reference['url']})" for reference in references)
+        st.caption(f"**Related literature**\n{links}")
+
+def render_message(message):
+    avatar = "🤖" if message["role"] == "assistant" else "👨‍💻"
+    with st.chat_message(message["role"], avatar=avatar):
+        st.markdown(message["content"])
+        render_references(message.get("references"))
+
+@st.fragment
+def case_panel(case_study):
     st.subheader("Selected Case Study")
-
-    # Display the selected case study
-    st.markdown(f"**Case Study:**\n{st.session_state.selected_case_study}")
+    st.markdown(f"**Case Study:**\n{case_study}")
     st.markdown("---")
 
-    # Initialize chat history and selected model
-    if "messages" not in st.session_state:
-        st.session_state['messages'] = []
-
-    # Display chat messages from history on app rerun
+def chat_history():
+    """Draw the stored conversation; this runs on full reruns only, not when a message is sent."""
+    resolve_references()
     for message in st.session_state.messages:
-        avatar = "🤖" if message["role"] == "assistant" else "👨‍💻"
-        with st.chat_message(message["role"], avatar=avatar):
-            st.markdown(message["content"])
+        render_message(message)
+    st.session_state.history_drawn = st.session_state.get("messages_offset", 0) + len(st.session_state.messages)
 
-    case_study = st.session_state.selected_case_study
+def fragment_start():
+    """Index of the first in-memory message sent since chat_history last ran."""
+    return max(0, st.session_state.get("history_drawn", 0) - st.session_state.get("messages_offset", 0))
+
+@st.fragment
+def chat_panel(case_study):
+    """Turns sent since the last full rerun and the chat input; sending a message reruns only this fragment."""
+    resolve_references()
+    for message in st.session_state.messages[fragment_start():]:
+        render_message(message)
 
     if prompt := st.chat_input("Enter your prompt here..."):
-        with st.chat_message("user", avatar="👨‍💻"):
-            st.markdown(prompt)
+        render_message({"role": "user", "content": prompt})
 
-        # Generate prompt with case study and user input
-        dynamic_prompt = get_dynamic_prompt(case_study, prompt)
+        append_message({"role": "user", "content": prompt})
 
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # Look up related literature while the reply streams
+        reference_lookup = start_reference_lookup(case_study, prompt)
+        references = None
 
-        # Fetch response from Groq API
+        # Serve a question already answered on this case from the answer cache, otherwise ask the model
+        case_id = st.session_state.get("selected_case_id")
+        context = previous_question(st.session_state.messages[:-1])
+        cached_answer = get_answer_cache().lookup(case_id, prompt, context) if case_id else None
+        answered = False
+        full_response = ""
         try:
-            system_prompt = "You are a senior doctor mentoring a junior doctor. Provide guidance and feedback based on the following case study and junior doctor's input. Help him to diagnose the patient and not tell him the diagnose just give him hints."
-            chat_completion = get_chat_response(system_prompt, dynamic_prompt)
+            if cached_answer is not None:
+                chat_completion = replay_answer(cached_answer)
+            else:
+                chat_completion = start_chat_completion(
+                    case_study, st.session_state.messages[:-1], prompt)
 
             # Use the generator function with st.write_stream
             with st.chat_message("assistant", avatar="🤖"):
                 chat_responses_generator = generate_chat_responses(
                     chat_completion)
                 full_response = st.write_stream(chat_responses_generator)
+                answered = True
+                # Never wait for the lookup: show it now if ready, otherwise on a later rerun
+                if (reference_lookup is not None and reference_lookup.done()
+                        and reference_lookup.exception() is None):
+                    references = reference_lookup.result()
+                    render_references(references)
         except Exception as e:
             st.error(e, icon="🚨")
 
-        # Append the full response to session_state.messages
+        # Append the full response to the transcript
         if isinstance(full_response, str):
-            st.session_state.messages.append(
-                {"role": "assistant", "content": full_response}
-            )
+            response = {"role": "assistant", "content": full_response}
         else:
             # Handle the case where full_response is not a string
             combined_response = "\n".join(str(item) for item in full_response)
-            st.session_state.messages.append(
-                {"role": "assistant", "content": combined_response}
-            )
+            response = {"role": "assistant", "content": combined_response}
+        if references is not None:
+            response["references"] = references
+        if answered and cached_answer is None and case_id:
+            get_answer_cache().put(case_id, prompt, context, response["content"])
+        seq = append_message(response)
+        if references is None and reference_lookup is not None:
+            st.session_state.pending_references[seq] = reference_lookup
+        trim_messages()
+        speculate_evaluation(case_study)
+        # Hand the accumulated turns to chat_history so the fragment stays a fixed size
+        if len(st.session_state.messages) - fragment_start() >= fragment_messages:
+            st.rerun()
+
+def chat_page():
+    st.title("Senior-Junior Doctor - Chat on Case Study")
+    st.markdown("---")
+
+    # Initialize chat history and selected model
+    if "messages" not in st.session_state:
+        st.session_state['messages'] = []
+
+    case_study = st.session_state.selected_case_study
+    case_panel(case_study)
+    chat_history()
+    chat_panel(case_study)
 
     col1, col2 = st.columns(2)
     with col1:
@@ -90,6 +230,7 @@ def chat_page():
             # Check if there are any assistant messages
             if assistant_messages_count >= 1:
                 st.session_state.page = "evaluation"
+                save_session(page="evaluation")
                 st.rerun()
 
     with col2:
@@ -0,0 +1,119 @@
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from evaluation_page import get_score_warehouse, rubric
+from score_warehouse import (score_columns, default_percentiles, select, score_percentiles,
+                             specialization_heatmap, weekly_trend, learner_summary, learner_history)
+
+time_windows = {"All time": None, "Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90}
+learner_orders = {"Mean score": "mean", "Trend": "slope", "Latest score": "latest", "Evaluations": "evaluations"}
+# Learners listed in the table; the rest are only counted
+learner_table_rows = 200
+labels = {key: label for label, key in rubric}
+
+
+def code_filter(label, values):
+    """Selectbox over a dictionary's values with an "All" option; return the chosen code or None."""
+    choice = st.selectbox(label, ["All"] + values)
+    return None if choice == "All" else values.index(choice)
+
+
+def back_button():
+    if st.button("Back to MediLearn"):
+        st.query_params.clear()
+        st.session_state.page = "case_selection"
+        st.rerun()
+
+
+def learner_table(summary, names, order):
+    """The top learners by `order`, learners without a value for it last."""
+    values = summary[order]
+    ranked = np.argsort(np.where(np.isnan(values), -np.inf, values), kind="stable")[::-1][:learner_table_rows]
+    return pd.DataFrame({
+        "Learner": [names[code] for code in summary["learner"][ranked]],
+        "Evaluations": summary["evaluations"][ranked].astype(int),
+        "Mean": summary["mean"][ranked].round(2),
+        "Latest": summary["latest"][ranked],
+        "Trend per week": summary["slope"][ranked].round(2),
+        "Percentile": summary["percentile"][ranked].round(0),
+    })
+
+
+def cohort_page():
+    """Score analytics over every recorded evaluation (open with ?page=cohort)."""
+    st.title("MediLearn Cohort Dashboard")
+
+    warehouse = get_score_warehouse()
+    columns = warehouse.columns()
+    if not warehouse.rows:
+        st.info("No evaluations have been recorded yet.")
+        back_button()
+        return
+    dictionaries = warehouse.dictionaries
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        specialization = code_filter("Specialization", dictionaries["specialization"])
+    with col2:
+        difficulty = code_filter("Difficulty", dictionaries["difficulty"])
+    with col3:
+        days = time_windows[st.selectbox("Period", list(time_windows))]
+    with col4:
+        score_label = st.selectbox("Score", list(dict(rubric)), index=len(rubric) - 1)
+    score = score_columns.index(dict(rubric)[score_label])
+    since = time.time() - days * 86400 if days else None
+
+    mask = select(columns, specialization, difficulty, since)
+    if not mask.any():
+        st.info("No evaluations match these filters.")
+        back_button()
+        return
+    summary = learner_summary(columns, mask, score)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Evaluations", f"{int(mask.sum()):,}")
+    col2.metric("Learners", f"{len(summary['learner']):,}")
+    col3.metric(f"Mean {score_label.lower()}", f"{np.nanmean(columns['scores'][mask, score]):.2f}")
+
+    st.subheader("Score percentiles")
+    percentiles = score_percentiles(columns, mask)
+    st.dataframe(pd.DataFrame(percentiles.T.round(1), index=[labels[key] for key in score_columns],
+                              columns=[f"p{p}" for p in default_percentiles]),
+                 use_container_width=True)
+
+    # Every specialization and difficulty, so only the period filter applies
+    st.subheader(f"{score_label} by specialization and difficulty")
+    means, counts = specialization_heatmap(columns, select(columns, since=since),
+                                           len(dictionaries["specialization"]),
+                                           len(dictionaries["difficulty"]), score)
+    fig = px.imshow(means, x=dictionaries["difficulty"], y=dictionaries["specialization"],
+                    zmin=0, zmax=10, text_auto=".1f", aspect="auto", color_continuous_scale="RdYlGn")
+    fig.update_traces(customdata=counts, hovertemplate="%{y}, %{x}: %{z:.2f} over %{customdata} evaluations")
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Weekly trend")
+    weeks, weekly_means = weekly_trend(columns, mask, score)
+    st.line_chart(pd.DataFrame({score_label: weekly_means}, index=pd.to_datetime(weeks, unit="s")))
+
+    st.subheader("Learners")
+    order = learner_orders[st.selectbox("Sort learners by", list(learner_orders))]
+    st.dataframe(learner_table(summary, dictionaries["learner"], order), hide_index=True,
+                 use_container_width=True)
+    if len(summary["learner"]) > learner_table_rows:
+        st.caption(f"Showing {learner_table_rows} of {len(summary['learner']):,} learners.")
+
+    learner_id = st.text_input("Learner history", placeholder="Learner ID")
+    if learner_id:
+        learner = warehouse.code("learner", learner_id)
+        if learner is None:
+            st.warning(f"No evaluations recorded for {learner_id}.")
+        else:
+            times, scores = learner_history(columns, learner)
+            history = pd.DataFrame(scores, columns=[labels[key] for key in score_columns],
+                                   index=pd.to_datetime(times, unit="s"))
+            st.line_chart(history)
+
+    back_button()
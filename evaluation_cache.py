@@ -0,0 +1,71 @@
+import hashlib
+import json
+import threading
+import time
+
+from storage import connect
+
+
+class EvaluationCache:
+    """Bounded SQLite cache of evaluation results keyed by a hash of the transcript."""
+
+    def __init__(self, db_name="evaluations.db", max_entries=5000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS evaluations (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS evaluations_last_used ON evaluations (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key_for(case_study, messages, model, prompt_version):
+        """Hash everything that determines an evaluation."""
+        transcript = [(message["role"], message["content"]) for message in messages]
+        payload = json.dumps([case_study, transcript, model, prompt_version], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached evaluation content for the key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM evaluations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE evaluations SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, content):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO evaluations (key, content, last_used) VALUES (?, ?, ?)",
+                (key, content, time.time()),
+            )
+            # Evict least recently used entries beyond the bound
+            self._conn.execute(
+                "DELETE FROM evaluations WHERE key IN ("
+                "SELECT key FROM evaluations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def invalidate(self, key):
+        """Drop one cached evaluation so the next request recomputes it."""
+        with self._lock:
+            self._conn.execute("DELETE FROM evaluations WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """Drop every cached evaluation, e.g. after changing the rubric."""
+        with self._lock:
+            self._conn.execute("DELETE FROM evaluations")
+            self._conn.commit()
@@ -1,146 +1,242 @@
+import contextlib
+import functools
+import time
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import json
-import re
-from utils import evaluate_performance
+import plotly.graph_objects as go
+from utils import stream_evaluation, model_name, get_speculator, get_shared_cache
+from shared_cache import cache_key, default_lease
+from evaluation_cache import EvaluationCache
+from evaluation_prompt import build_evaluation_prompt, evaluation_prompt_version
+from json_stream import IncrementalObjectParser, parse_object_tolerant
+from score_warehouse import ScoreWarehouse, score_columns
+from session import full_transcript, new_session, current_learner_id, current_session_id
+
+# Rubric categories in display order, with their keys in st.session_state.evaluation
+rubric = [
+    ("Diagnostic Accuracy", "diagnostic_accuracy"),
+    ("Reasoning and Correctness", "reasoning"),
+    ("Patient Management", "patient_management"),
+    ("Communication Skills", "communication_skills"),
+    ("Time Management", "time_management"),
+    ("Overall Impression", "overall_impression"),
+]
+evaluation_fields = dict(rubric, Feedback="feedback")
+# How often a worker waiting for another worker's evaluation looks for it, in seconds
+evaluation_poll_interval = 0.25
+
+
+@st.cache_resource
+def get_evaluation_cache():
+    """Return the process-wide evaluation cache."""
+    return EvaluationCache()
+
+
+@st.cache_resource
+def get_score_warehouse():
+    """Return the process-wide score warehouse."""
+    return ScoreWarehouse()
+
+
+def record_scores(evaluation_key, evaluation):
+    """Append the evaluation's rubric scores to the score warehouse, once per transcript and session."""
+    recorded = st.session_state.setdefault("recorded_evaluations", set())
+    if evaluation_key in recorded:
+        return
+    scores = [pd.to_numeric(evaluation[key]["Score"], errors="coerce") for key in score_columns]
+    get_score_warehouse().append(current_learner_id(),
+                                 st.session_state.get("selected_specialization") or "Unknown",
+                                 st.session_state.get("selected_difficulty") or "Unknown",
+                                 scores, messages=len(full_transcript()))
+    recorded.add(evaluation_key)
+
+
+def get_evaluation_key():
+    """Key of the current transcript's evaluation in the cache."""
+    return EvaluationCache.key_for(st.session_state.selected_case_study, full_transcript(),
+                                   model_name, evaluation_prompt_version)
+
+@contextlib.contextmanager
+def evaluation_lease(evaluation_key):
+    """Hold the cross-worker lease on evaluating this transcript; yields whether it was taken."""
+    shared = get_shared_cache()
+    if shared is None:
+        yield True
+        return
+    with shared.lease(cache_key("evaluation", evaluation_key)) as held:
+        yield held
+
+
+def wait_for_evaluation(evaluation_key):
+    """Wait while another worker evaluates the same transcript; return its cached result, or None if it gave up."""
+    shared = get_shared_cache()
+    lease_key = cache_key("evaluation", evaluation_key)
+    deadline = time.monotonic() + default_lease
+    with st.spinner("Evaluating..."):
+        while time.monotonic() < deadline:
+            content = get_evaluation_cache().get(evaluation_key)
+            if content is not None or shared.acquire_possible(lease_key):
+                return content
+            time.sleep(evaluation_poll_interval)
+    return None
+
 
 def extract_json_from_string(s):
-    try:
-        # Extract the JSON part using regular expressions
-        json_str = re.search(r"\{.*\}", s, re.DOTALL).group(0)
-        return json.loads(json_str)
-    except (json.JSONDecodeError, AttributeError):
+    # Keep every category that parsed, even if the model broke the JSON further on
+    evaluation_dict = parse_object_tolerant(s)
+    if not evaluation_dict:
         raise ValueError("Could not extract valid JSON from the evaluation content.")
+    return evaluation_dict
 
 def get_evaluation_prompt():
-    prompt = f"""
-    You are a senior doctor tasked with evaluating a junior doctor's performance based on their conversation with a patient.
-    Please provide the evaluation strictly in the following JSON format, without any additional text:
-
-    {{
-        "Diagnostic Accuracy": {{
-            "Score": [Score from 0-10],
-            "Comments": "[Specific comments on the accuracy of the diagnosis, including correct and incorrect decisions]"
-        }},
-        "Reasoning and Correctness": {{
-            "Score": [Score from 0-10],
-            "Comments": "[Specific comments on the logical reasoning and correctness of the junior doctor's thought process]"
-        }},
-        "Patient Management": {{
-            "Score": [Score from 0-10],
-            "Comments": "[Specific comments on how well the junior doctor managed the patient, including any recommendations for improvement]"
-        }},
-        "Communication Skills": {{
-            "Score": [Score from 0-10],
-            "Comments": "[Evaluation of how well the junior doctor communicated with the patient, including empathy, clarity, and listening skills]"
-        }},
-        "Time Management": {{
-            "Score": [Score from 0-10],
-            "Comments": "[Assessment of how efficiently the junior doctor managed the consultation time]"
-        }},
-        "Overall Impression": {{
-            "Score": [Score from 0-10],
-            "Comments": "[General comments on the junior doctor's overall performance, including strengths and areas for improvement]"
-        }},
-        "Feedback": "[Detailed feedback highlighting strengths, mistakes, and suggestions for improvement]"
-    }}
-
-    The junior doctor was working on the following case study:
-    "{st.session_state.selected_case_study}"
-
-    Here is the full conversation for reference:
-    """
-
-    for message in st.session_state.messages:
-        role = "Senior Doctor" if message["role"] == "assistant" else "Junior Doctor"
-        prompt += f"{role}: {message['content']}\n"
-
-    prompt += "\nPlease provide the evaluation in JSON format only."
-    return prompt
+    return build_evaluation_prompt(st.session_state.selected_case_study, full_transcript())
+
+
+def empty_evaluation():
+    return {key: None for key in evaluation_fields.values()}
+
+
+def update_evaluation(evaluation, members):
+    """Copy parsed evaluation members into the session's evaluation, ignoring unknown keys."""
+    for name, value in members:
+        key = evaluation_fields.get(name)
+        if key is None:
+            continue
+        if key != "feedback" and not (isinstance(value, dict) and "Score" in value):
+            continue
+        evaluation[key] = value
+
+
+def claim_speculative_evaluation(evaluation_key):
+    """Return the evaluation started after the last chat reply, waiting for it if needed, if it parsed completely."""
+    with st.spinner("Evaluating..."):
+        content = get_speculator().claim(current_session_id(), "evaluation", evaluation_key)
+    if content is None:
+        return None
+    evaluation = empty_evaluation()
+    update_evaluation(evaluation, parse_object_tolerant(content).items())
+    if not all(evaluation.values()):
+        return None
+    get_evaluation_cache().put(evaluation_key, content)
+    return content
+
+
+@functools.lru_cache(maxsize=64)
+def score_chart_spec(categories, scores):
+    """Plotly spec of the rubric bar chart; building it with plotly express takes tens of milliseconds."""
+    return px.bar(pd.DataFrame({"Category": categories, "Score": scores}),
+                  x="Category", y="Score", range_y=[0, 10], title="Evaluation Scores").to_dict()
+
+
+def score_chart(categories, scores):
+    """A new figure from the cached spec, so no session or thread shares a mutable plotly object."""
+    return go.Figure(score_chart_spec(categories, scores))
+
+
+def render_scores(evaluation, table_slot, chart_slot, chart_key="evaluation_chart"):
+    """Show the table and bar chart for the rubric categories received so far."""
+    rows = [(label, evaluation[key]) for label, key in rubric if evaluation[key]]
+    if not rows:
+        return
+
+    # Create DataFrame
+    df_scores = pd.DataFrame({
+        "Category": [label for label, _ in rows],
+        "Score": [pd.to_numeric(value["Score"], errors="coerce") for _, value in rows],
+        "Comments": [value.get("Comments", "") for _, value in rows]
+    })
+
+    # Display table
+    table_slot.table(df_scores)
+
+    # Display the bar chart, reusing the figure while the scores are unchanged
+    fig = score_chart(tuple(df_scores["Category"]), tuple(df_scores["Score"]))
+    chart_slot.plotly_chart(fig, key=chart_key)
+
+
+def render_feedback(evaluation, feedback_slot):
+    if evaluation["feedback"]:
+        with feedback_slot.container():
+            st.subheader("Feedback from Senior Doctor")
+            st.markdown("---")
+            st.markdown(evaluation["feedback"])
+
+
+def stream_scores(evaluation, evaluation_key, table_slot, chart_slot):
+    """Stream the evaluation, filling the table and chart one category at a time, and cache it if complete."""
+    parser = IncrementalObjectParser()
+    parts = []
+    with st.spinner("Evaluating..."):
+        for text in stream_evaluation(get_evaluation_prompt()):
+            parts.append(text)
+            members = parser.feed(text)
+            if members:
+                update_evaluation(evaluation, members)
+                render_scores(evaluation, table_slot, chart_slot,
+                              chart_key=f"evaluation_chart_{len(parts)}")
+    update_evaluation(evaluation, parser.finish())
+    evaluation_content = "".join(parts)
+
+    # Debugging: Check the content before parsing
+    #st.write("Raw Evaluation Content:", evaluation_content)
+
+    if not any(evaluation.values()):
+        raise ValueError("Could not extract valid JSON from the evaluation content.")
+    if all(evaluation.values()):
+        # Only cache complete evaluations; partial ones are retried next time
+        get_evaluation_cache().put(evaluation_key, evaluation_content)
+    else:
+        st.warning("Part of the evaluation could not be parsed; showing the categories that were.")
 
 
 def evaluation_page():
     if "evaluation" not in st.session_state:
-        st.session_state.evaluation = {
-            "diagnostic_accuracy": None,
-            "reasoning": None,
-            "patient_management": None,
-            "communication_skills": None,
-            "time_management": None,
-            "overall_impression": None,
-            "feedback": None
-        }
+        st.session_state.evaluation = empty_evaluation()
 
     st.title("Doctor-Patient Chat Evaluation")
     st.subheader("Final Evaluation")
 
-    evaluation_prompt = get_evaluation_prompt()
+    feedback_slot = st.empty()
+    table_slot = st.empty()
+    chart_slot = st.empty()
+
+    cache = get_evaluation_cache()
+    evaluation_key = get_evaluation_key()
+    evaluation = empty_evaluation()
+    st.session_state.evaluation = evaluation
 
     try:
-        evaluation_content = evaluate_performance(evaluation_prompt)
-        
-        # Debugging: Check the content before parsing
-        #st.write("Raw Evaluation Content:", evaluation_content)
-
-        # Extract JSON from the evaluation content
-        evaluation_dict = extract_json_from_string(evaluation_content)
-
-        # Update the session state with the evaluation content
-        st.session_state.evaluation.update({
-            "diagnostic_accuracy": evaluation_dict["Diagnostic Accuracy"],
-            "reasoning": evaluation_dict["Reasoning and Correctness"],
-            "patient_management": evaluation_dict["Patient Management"],
-            "communication_skills": evaluation_dict["Communication Skills"],
-            "time_management": evaluation_dict["Time Management"],
-            "overall_impression": evaluation_dict["Overall Impression"],
-            "feedback": evaluation_dict["Feedback"]
-        })
+        # Reuse the evaluation of an identical transcript, or the one started in the background
+        evaluation_content = cache.get(evaluation_key) or claim_speculative_evaluation(evaluation_key)
+        if evaluation_content is None:
+            # Only one worker streams a transcript's evaluation; the others wait for it in the cache
+            with evaluation_lease(evaluation_key) as leading:
+                if not leading:
+                    evaluation_content = wait_for_evaluation(evaluation_key)
+                if evaluation_content is None:
+                    stream_scores(evaluation, evaluation_key, table_slot, chart_slot)
+        if evaluation_content is not None:
+            update_evaluation(evaluation, extract_json_from_string(evaluation_content).items())
 
     except ValueError as e:
         st.error(f"Error extracting or parsing evaluation JSON: {e}")
     except Exception as e:
         st.error(f"Error generating evaluation: {e}")
 
-    if st.session_state.evaluation["feedback"]:
-        st.subheader("Feedback from Senior Doctor")
-        st.markdown("---")
-        st.markdown(st.session_state.evaluation["feedback"])
-
-        # Extract categories, scores, and comments
-        categories = ["Diagnostic Accuracy", "Reasoning and Correctness", "Patient Management",
-                      "Communication Skills", "Time Management", "Overall Impression"]
-
-        scores = [st.session_state.evaluation["diagnostic_accuracy"]["Score"],
-                  st.session_state.evaluation["reasoning"]["Score"],
-                  st.session_state.evaluation["patient_management"]["Score"],
-                  st.session_state.evaluation["communication_skills"]["Score"],
-                  st.session_state.evaluation["time_management"]["Score"],
-                  st.session_state.evaluation["overall_impression"]["Score"]]
-
-        comments = [st.session_state.evaluation["diagnostic_accuracy"]["Comments"],
-                    st.session_state.evaluation["reasoning"]["Comments"],
-                    st.session_state.evaluation["patient_management"]["Comments"],
-                    st.session_state.evaluation["communication_skills"]["Comments"],
-                    st.session_state.evaluation["time_management"]["Comments"],
-                    st.session_state.evaluation["overall_impression"]["Comments"]]
-
-        # Create DataFrame
-        df_scores = pd.DataFrame({
-            "Category": categories,
-            "Score": scores,
-            "Comments": comments
-        })
-
-        # Display table
-        st.table(df_scores)
-
-        # Create and display a bar chart
-        fig = px.bar(df_scores, x="Category", y="Score", range_y=[0, 10], title="Evaluation Scores")
-        st.plotly_chart(fig)
+    if all(evaluation.values()):
+        record_scores(evaluation_key, evaluation)
+
+    render_feedback(evaluation, feedback_slot)
+    render_scores(evaluation, table_slot, chart_slot)
+
+    if st.button("Re-evaluate"):
+        cache.invalidate(evaluation_key)
+        st.rerun()
 
     if st.button("Start New Session"):
         st.session_state.page = "case_selection"
-        st.session_state.messages = []
         st.session_state.selected_case_study = None
+        new_session()
         st.rerun()
@@ -0,0 +1,50 @@
+# Bump whenever build_evaluation_prompt changes so cached evaluations are not reused
+evaluation_prompt_version = 1
+
+
+def build_evaluation_prompt(case_study, transcript):
+    """Prompt asking for the rubric scores of a transcript, as JSON."""
+    prompt = f"""
+    You are a senior doctor tasked with evaluating a junior doctor's performance based on their conversation with a patient.
+    Please provide the evaluation strictly in the following JSON format, without any additional text:
+
+    {{
+        "Diagnostic Accuracy": {{
+            "Score": [Score from 0-10],
+            "Comments": "[Specific comments on the accuracy of the diagnosis, including correct and incorrect decisions]"
+        }},
+        "Reasoning and Correctness": {{
+            "Score": [Score from 0-10],
+            "Comments": "[Specific comments on the logical reasoning and correctness of the junior doctor's thought process]"
+        }},
+        "Patient Management": {{
+            "Score": [Score from 0-10],
+            "Comments": "[Specific comments on how well the junior doctor managed the patient, including any recommendations for improvement]"
+        }},
+        "Communication Skills": {{
+            "Score": [Score from 0-10],
+            "Comments": "[Evaluation of how well the junior doctor communicated with the patient, including empathy, clarity, and listening skills]"
+        }},
+        "Time Management": {{
+            "Score": [Score from 0-10],
+            "Comments": "[Assessment of how efficiently the junior doctor managed the consultation time]"
+        }},
+        "Overall Impression": {{
+            "Score": [Score from 0-10],
+            "Comments": "[General comments on the junior doctor's overall performance, including strengths and areas for improvement]"
+        }},
+        "Feedback": "[Detailed feedback highlighting strengths, mistakes, and suggestions for improvement]"
+    }}
+
+    The junior doctor was working on the following case study:
+    "{case_study}"
+
+    Here is the full conversation for reference:
+    """
+
+    for message in transcript:
+        role = "Senior Doctor" if message["role"] == "assistant" else "Junior Doctor"
+        prompt += f"{role}: {message['content']}\n"
+
+    prompt += "\nPlease provide the evaluation in JSON format only."
+    return prompt
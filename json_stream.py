@@ -0,0 +1,92 @@
+import json
+
+closers = {"{": "}", "[": "]"}
+
+
+class IncrementalObjectParser:
+    """Parse the top-level members of a JSON object while its text is still streaming in.
+
+    Each `"key": value` member is emitted as soon as the comma or brace after
+    it arrives. Text before the opening brace is skipped, a member that fails
+    to parse is dropped without losing the others, and `finish` tries to
+    salvage a member cut off by a truncated or broken tail.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.member = []
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.complete = False
+        self.errors = 0
+
+    def feed(self, text):
+        """Consume a chunk of text and return the (key, value) members it completed."""
+        members = []
+        for char in text:
+            if self.complete:
+                break
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.stack.append("{")
+                continue
+
+            if self.in_string:
+                self.member.append(char)
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if len(self.stack) == 1 and char in ",}":
+                members.extend(self._emit())
+                if char == "}":
+                    self.stack.pop()
+                    self.complete = True
+                continue
+
+            self.member.append(char)
+            if char == '"':
+                self.in_string = True
+            elif char in closers:
+                self.stack.append(char)
+            elif char in "}]" and len(self.stack) > 1:
+                self.stack.pop()
+        return members
+
+    def finish(self):
+        """Salvage the member left open when the stream ended without closing the object."""
+        if self.complete or not self.started:
+            return []
+        tail = "".join(self.member)
+        if self.in_string:
+            tail += '"'
+        tail += "".join(closers[opener] for opener in reversed(self.stack[1:]))
+        self.member = [tail]
+        self.complete = True
+        return self._emit()
+
+    def _emit(self):
+        text = "".join(self.member).strip()
+        self.member = []
+        if not text:
+            return []
+        try:
+            return list(json.loads("{" + text + "}").items())
+        except json.JSONDecodeError:
+            self.errors += 1
+            return []
+
+
+def parse_object_tolerant(text):
+    """Parse the first JSON object in text, keeping every member that parsed even if the rest is broken."""
+    parser = IncrementalObjectParser()
+    members = parser.feed(text)
+    members.extend(parser.finish())
+    return dict(members)
@@ -0,0 +1,133 @@
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+# Words that say nothing about the clinical question being discussed
+stopwords = frozenset("""
+    a about above after again against all also am an and any are as at be because been before
+    being below between both but by can could did do does doing down during each few for from
+    further had has have having he her here hers him his how i if in into is it its itself just
+    me more most my no nor not now of off on once only or other our out over own same she should
+    so some such than that the their them then there these they this those through to too under
+    until up very was we were what when where which while who whom why will with would you your
+    patient patients year years old male female man woman history presents presenting presented
+    case study junior senior doctor think next step test tests results result
+    order ordered normal noted shows showed reports reported likely please hint
+    hints sure okay yes know need want thank thanks like look looks well good right left days
+    weeks months hours time today recently since prior start started give given take
+    check getting going maybe
+""".split())
+
+word = re.compile(r"[a-z][a-z\-]{3,}")
+# Terms from the junior doctor's latest message count more than terms from the case
+message_weight = 3
+max_terms = 4
+max_references = 3
+
+
+def extract_terms(case_study, message, limit=max_terms):
+    """Pick the most salient clinical terms from the case study and the latest message."""
+    counts = Counter(w for w in word.findall(case_study.lower()) if w not in stopwords)
+    for w in word.findall(message.lower()):
+        if w not in stopwords:
+            counts[w] += message_weight
+    # Ties resolve alphabetically so the same inputs always give the same cache key
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return tuple(term for term, _ in ranked[:limit])
+
+
+class _Lookup:
+    """One lookup in flight and the Futures handed out to the callers waiting for it."""
+
+    __slots__ = ("future", "callers", "running")
+
+    def __init__(self):
+        self.future = None
+        self.callers = []
+        self.running = False
+
+
+class LiteratureRetriever:
+    """Runs PubMed lookups for extracted terms on background threads, caching results by term set."""
+
+    def __init__(self, client, max_workers=2, max_entries=512):
+        self.client = client
+        self.max_entries = max_entries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="literature")
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, terms):
+        """Start (or join) a lookup for the terms and return a Future of reference dicts.
+
+        Every caller gets its own Future. Cancelling it only withdraws that
+        caller, and succeeds only while the lookup is still queued; the lookup
+        itself is cancelled once no caller is left waiting for it.
+        """
+        caller = Future()
+        with self._lock:
+            if terms in self._results:
+                self._results.move_to_end(terms)
+                caller.set_result(self._results[terms])
+                return caller
+            lookup = self._in_flight.get(terms)
+            if lookup is None:
+                lookup = self._in_flight[terms] = _Lookup()
+                lookup.future = self.executor.submit(self._lookup, terms, lookup)
+                lookup.future.add_done_callback(lambda _: self._finish(terms, lookup))
+            lookup.callers.append(caller)
+            if lookup.running:
+                caller.set_running_or_notify_cancel()
+        caller.add_done_callback(lambda future: self._withdraw(terms, lookup) if future.cancelled() else None)
+        return caller
+
+    def _withdraw(self, terms, lookup):
+        with self._lock:
+            if lookup.running or any(not caller.cancelled() for caller in lookup.callers):
+                return
+            # Later callers start a fresh lookup rather than join one about to be cancelled
+            if self._in_flight.get(terms) is lookup:
+                del self._in_flight[terms]
+        lookup.future.cancel()
+
+    def _finish(self, terms, lookup):
+        with self._lock:
+            if self._in_flight.get(terms) is lookup:
+                del self._in_flight[terms]
+            callers = list(lookup.callers)
+        future = lookup.future
+        for caller in callers:
+            if caller.done():
+                continue
+            try:
+                if future.cancelled():
+                    caller.cancel()
+                elif future.exception() is not None:
+                    caller.set_exception(future.exception())
+                else:
+                    caller.set_result(future.result())
+            except InvalidStateError:
+                # Cancelled by its caller meanwhile
+                pass
+
+    def _lookup(self, terms, lookup):
+        with self._lock:
+            lookup.running = True
+            for caller in lookup.callers:
+                caller.set_running_or_notify_cancel()
+        references = []
+        # Drop the least specific terms until the AND query finds something
+        for size in range(len(terms), 0, -1):
+            articles = self.client.search_articles(" ".join(terms[:size]))
+            if articles:
+                urls = self.client.generate_pubmed_urls([article.pmid for article in articles])
+                references = [{"title": article.title, "url": url}
+                              for article, url in zip(articles[:max_references], urls)]
+                break
+        with self._lock:
+            self._results[terms] = references
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return references
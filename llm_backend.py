@@ -0,0 +1,102 @@
+import math
+import random
+
+import httpx
+from groq import AsyncGroq, APIConnectionError, APIStatusError, RateLimitError
+
+retry_backoff = 1.0
+# Longest Retry-After we honour; the learner is waiting on the request
+max_retry_after = 10
+
+
+class LLMBackend:
+    """Interface every LLM provider behind the gateway implements.
+
+    Each call takes an optional `usage` callback, called with the prompt and
+    completion token counts the provider reports for the request.
+    """
+
+    async def complete(self, messages, model, max_tokens=None, usage=None):
+        """Return the full completion text."""
+        raise NotImplementedError
+
+    async def stream(self, messages, model, max_tokens=None, usage=None):
+        """Yield completion text deltas as they arrive."""
+        raise NotImplementedError
+        yield
+
+    async def evaluate(self, prompt, model, max_tokens=None, usage=None):
+        """Return the evaluation text for a self-contained evaluation prompt."""
+        return await self.complete([{"role": "system", "content": prompt}], model, max_tokens, usage)
+
+    def is_retryable(self, error):
+        """Whether a failed request may succeed if sent again."""
+        return False
+
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying a failed request."""
+        return retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class GroqBackend(LLMBackend):
+    """Groq chat completions, or any server speaking Groq's OpenAI-compatible API at `base_url`."""
+
+    def __init__(self, api_key, base_url=None, max_connections=32, timeout=60):
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+        # Retries are handled by the gateway so they respect its limiters
+        self.client = AsyncGroq(api_key=api_key, base_url=base_url,
+                                http_client=self.http_client, max_retries=0)
+
+    async def _create(self, messages, model, max_tokens, stream):
+        kwargs = {"model": model, "messages": messages, "stream": stream}
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        return await self.client.chat.completions.create(**kwargs)
+
+    async def complete(self, messages, model, max_tokens=None, usage=None):
+        response = await self._create(messages, model, max_tokens, stream=False)
+        if usage is not None and response.usage is not None:
+            usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    async def stream(self, messages, model, max_tokens=None, usage=None):
+        response = await self._create(messages, model, max_tokens, stream=True)
+        async for chunk in response:
+            # Groq reports the usage of a stream in its last chunk
+            x_groq = getattr(chunk, "x_groq", None)
+            reported = x_groq.usage if x_groq is not None else getattr(chunk, "usage", None)
+            if usage is not None and reported is not None:
+                usage(reported.prompt_tokens, reported.completion_tokens)
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                yield content
+
+    def is_retryable(self, error):
+        if isinstance(error, (RateLimitError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+    def retry_delay(self, error, attempt):
+        # Prefer the provider's Retry-After over our own backoff
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = math.nan
+        if not 0 <= delay < math.inf:
+            return super().retry_delay(error, attempt)
+        return min(delay, max_retry_after)
+
+
+def create_backend(settings, api_key):
+    """Build the backend named in the [LLM] settings ("groq" by default, "mock" for the local stand-in)."""
+    name = settings.get("backend", "groq")
+    if name == "groq":
+        return GroqBackend(api_key, base_url=settings.get("base_url"))
+    if name == "mock":
+        return GroqBackend(api_key or "mock", base_url=settings.get("base_url", "http://127.0.0.1:8765"))
+    raise ValueError(f"Unknown LLM backend: {name}")
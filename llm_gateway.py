@@ -0,0 +1,231 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from chat_context import estimate_tokens
+from llm_metrics import metrics as default_metrics
+from storage import worker_share
+
+# Per-model admission limits; tune to the account's Groq rate-limit tier. They are for the
+# whole account: each serve.py worker process admits its share of them
+default_model_limits = {"concurrency": 8, "tokens_per_minute": 30000}
+model_limits = {
+    "llama3-70b-8192": {"concurrency": 8, "tokens_per_minute": 30000},
+}
+# Completion budget reserved for requests that do not set max_tokens
+default_completion_tokens = 1024
+max_retries = 4
+# Deltas a stream may run ahead of its reader; past this the provider waits, still holding its slot
+stream_buffer = 32
+
+_done = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class TokenBucket:
+    """Tokens-per-minute limiter for coroutines on one event loop."""
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.tokens = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.updated = time.monotonic()
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class LLMGateway:
+    """Async front door for every LLM call the app makes.
+
+    Requests run on an event loop owned by a dedicated thread and go to a
+    pluggable LLMBackend with its own pooled HTTP client. Each model has a concurrency limit and a
+    tokens-per-minute budget, identical in-flight completions are merged into
+    one request, and rate-limited or failed requests are retried with backoff.
+    The Streamlit script thread uses the blocking `complete`/`stream` wrappers
+    or the Future returned by `submit_complete`. Every request sent to the
+    backend is timed into `metrics` under its `label` (queue time, time to
+    first token, inter-chunk gaps, prompt and completion tokens).
+    """
+
+    def __init__(self, backend, limits=None, metrics=None):
+        self.backend = backend
+        self.model_limits = model_limits if limits is None else limits
+        self.metrics = default_metrics if metrics is None else metrics
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self._semaphores = {}
+        self._buckets = {}
+        self._in_flight = {}
+        self.coalesced = 0
+        self.retries = 0
+
+    def _limits(self, model):
+        if model not in self._semaphores:
+            limits = self.model_limits.get(model, default_model_limits)
+            self._semaphores[model] = asyncio.Semaphore(max(1, int(worker_share(limits["concurrency"]))))
+            self._buckets[model] = TokenBucket(worker_share(limits["tokens_per_minute"]))
+        return self._semaphores[model], self._buckets[model]
+
+    def _start_trace(self, label, model, messages):
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        return self.metrics.start(label, model, prompt_tokens), prompt_tokens
+
+    async def _admit(self, model, prompt_tokens, max_tokens):
+        semaphore, bucket = self._limits(model)
+        await bucket.acquire(prompt_tokens + (max_tokens or default_completion_tokens))
+        return semaphore
+
+    async def _call(self, label, model, messages, max_tokens, operation):
+        """Run a backend call once admitted, retrying rate limits and transient failures."""
+        trace, prompt_tokens = self._start_trace(label, model, messages)
+        try:
+            semaphore = await self._admit(model, prompt_tokens, max_tokens)
+            for attempt in range(max_retries + 1):
+                async with semaphore:
+                    if trace.admitted is None:
+                        trace.mark_admitted()
+                    try:
+                        result = await operation(trace.set_usage)
+                        # A whole completion arrives as one chunk, so its TTFT is its latency
+                        trace.mark_chunk()
+                        trace.finish()
+                        return result
+                    except Exception as e:
+                        if not self.backend.is_retryable(e) or attempt == max_retries:
+                            raise
+                        delay = self.backend.retry_delay(e, attempt)
+                self.retries += 1
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            trace.finish(e)
+            raise
+
+    async def complete_async(self, messages, model, max_tokens=None, coalesce=True, label="complete"):
+        """Return the completion text, sharing the request with identical in-flight calls."""
+        def call():
+            return self._call(label, model, messages, max_tokens,
+                              lambda usage: self.backend.complete(messages, model, max_tokens, usage))
+
+        if not coalesce:
+            return await call()
+        return await self._coalesced(["complete", model, messages, max_tokens], call)
+
+    async def evaluate_async(self, prompt, model, max_tokens=None, label="evaluate"):
+        """Return the evaluation text, sharing the request with identical in-flight evaluations."""
+        messages = [{"role": "system", "content": prompt}]
+        return await self._coalesced(
+            ["evaluate", model, prompt, max_tokens],
+            lambda: self._call(label, model, messages, max_tokens,
+                               lambda usage: self.backend.evaluate(prompt, model, max_tokens, usage)))
+
+    async def _coalesced(self, request, call):
+        key = json.dumps(request, sort_keys=True)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so one caller giving up does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def stream_async(self, messages, model, max_tokens=None, label="stream"):
+        """Yield completion text deltas, holding a concurrency slot until the stream ends."""
+        trace, prompt_tokens = self._start_trace(label, model, messages)
+        try:
+            semaphore = await self._admit(model, prompt_tokens, max_tokens)
+            for attempt in range(max_retries + 1):
+                async with semaphore:
+                    if trace.admitted is None:
+                        trace.mark_admitted()
+                    try:
+                        async for text in self.backend.stream(messages, model, max_tokens, trace.set_usage):
+                            trace.mark_chunk()
+                            yield text
+                        trace.finish()
+                        return
+                    except Exception as e:
+                        # Once text has been shown, retrying would repeat it
+                        if trace.chunks or not self.backend.is_retryable(e) or attempt == max_retries:
+                            raise
+                        delay = self.backend.retry_delay(e, attempt)
+                self.retries += 1
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            trace.finish(e)
+            raise
+
+    def submit_complete(self, messages, model, max_tokens=None, coalesce=True, label="complete"):
+        """Schedule a completion from any thread and return a concurrent.futures.Future of its text."""
+        return asyncio.run_coroutine_threadsafe(
+            self.complete_async(messages, model, max_tokens, coalesce, label), self.loop)
+
+    def complete(self, messages, model, max_tokens=None, coalesce=True, label="complete"):
+        """Blocking completion for the Streamlit script thread."""
+        return self.submit_complete(messages, model, max_tokens, coalesce, label).result()
+
+    def submit_evaluate(self, prompt, model, max_tokens=None, label="evaluate"):
+        """Schedule an evaluation from any thread and return a concurrent.futures.Future of its text."""
+        return asyncio.run_coroutine_threadsafe(
+            self.evaluate_async(prompt, model, max_tokens, label), self.loop)
+
+    def evaluate(self, prompt, model, max_tokens=None, label="evaluate"):
+        """Blocking evaluation for the Streamlit script thread."""
+        return self.submit_evaluate(prompt, model, max_tokens, label).result()
+
+    def stream(self, messages, model, max_tokens=None, label="stream"):
+        """Start a streamed completion now and return a blocking iterator over its text deltas."""
+        chunks = queue.Queue()
+        credits = asyncio.Semaphore(stream_buffer)
+
+        async def produce():
+            try:
+                async for chunk in self.stream_async(messages, model, max_tokens, label):
+                    await credits.acquire()
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(_Failure(e))
+            finally:
+                chunks.put(_done)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self.loop)
+        return self._drain(chunks, future, lambda: self.loop.call_soon_threadsafe(credits.release))
+
+    @staticmethod
+    def _drain(chunks, future, consumed):
+        try:
+            while True:
+                item = chunks.get()
+                if item is _done:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                consumed()
+                yield item
+        finally:
+            # Stop generating if the caller abandoned the stream
+            future.cancel()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+        }
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram upper bounds in seconds
+latency_buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+gap_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus layout."""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket holding it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class OperationStats:
+    """Aggregates for one (operation, model) pair."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.chunks = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.queue_time = Histogram(latency_buckets)
+        self.ttft = Histogram(latency_buckets)
+        self.total_time = Histogram(latency_buckets)
+        self.inter_chunk = Histogram(gap_buckets)
+
+
+class RequestTrace:
+    """Timing of one LLM request from enqueue to last chunk.
+
+    The per-chunk path is one perf_counter call, a subtraction and a bisect:
+    well under a microsecond, against milliseconds between the tokens of a
+    real stream (benchmarks/bench_llm_metrics.py).
+    """
+
+    __slots__ = ("metrics", "operation", "model", "prompt_tokens", "completion_tokens", "enqueued",
+                 "admitted", "first", "last", "chunks", "stats")
+
+    def __init__(self, metrics, operation, model, prompt_tokens):
+        self.metrics = metrics
+        self.operation = operation
+        self.model = model
+        # Estimated from the prompt until the provider reports the real counts
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.enqueued = time.perf_counter()
+        self.admitted = None
+        self.first = None
+        self.last = None
+        self.chunks = 0
+        self.stats = metrics.stats_for(operation, model)
+
+    def mark_admitted(self):
+        self.admitted = time.perf_counter()
+
+    def mark_chunk(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        else:
+            self.stats.inter_chunk.observe(now - self.last)
+        self.last = now
+        self.chunks += 1
+
+    def set_usage(self, prompt_tokens, completion_tokens):
+        """Record the token counts the provider reported for the request."""
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def finish(self, error=None):
+        self.metrics.record(self, error)
+
+
+class LLMMetrics:
+    """Process-wide LLM latency metrics with Prometheus and JSONL trace export."""
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()
+
+    def stats_for(self, operation, model):
+        key = (operation, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(key, OperationStats())
+        return stats
+
+    def start(self, operation, model, prompt_tokens):
+        """Begin timing a request as it enters the gateway queue."""
+        return RequestTrace(self, operation, model, prompt_tokens)
+
+    def record(self, trace, error=None):
+        end = time.perf_counter()
+        admitted = trace.admitted or trace.enqueued
+        stats = trace.stats
+        with self._lock:
+            stats.requests += 1
+            stats.errors += error is not None
+            stats.chunks += trace.chunks
+            stats.prompt_tokens += trace.prompt_tokens
+            stats.completion_tokens += trace.completion_tokens
+            stats.queue_time.observe(admitted - trace.enqueued)
+            if trace.first is not None:
+                stats.ttft.observe(trace.first - admitted)
+            stats.total_time.observe(end - trace.enqueued)
+        if self.trace_path:
+            self._write_trace(trace, end, error)
+
+    def _write_trace(self, trace, end, error):
+        admitted = trace.admitted or trace.enqueued
+        record = {
+            "ts": time.time(),
+            "operation": trace.operation,
+            "model": trace.model,
+            "prompt_tokens": trace.prompt_tokens,
+            "completion_tokens": trace.completion_tokens,
+            "chunks": trace.chunks,
+            "queue_s": round(admitted - trace.enqueued, 6),
+            "ttft_s": round(trace.first - admitted, 6) if trace.first is not None else None,
+            "total_s": round(end - trace.enqueued, 6),
+            "error": type(error).__name__ if error is not None else None,
+        }
+        with self._trace_lock, open(self.trace_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def snapshot(self):
+        """Return one summary row per (operation, model) for display."""
+        rows = []
+        with self._lock:
+            for (operation, model), stats in sorted(self._stats.items()):
+                rows.append({
+                    "operation": operation,
+                    "model": model,
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "chunks": stats.chunks,
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                    "queue_p50_s": stats.queue_time.quantile(0.5),
+                    "ttft_p50_s": stats.ttft.quantile(0.5),
+                    "ttft_p95_s": stats.ttft.quantile(0.95),
+                    "gap_p50_s": stats.inter_chunk.quantile(0.5),
+                    "gap_p99_s": stats.inter_chunk.quantile(0.99),
+                    "total_p95_s": stats.total_time.quantile(0.95),
+                })
+        return rows
+
+    def prometheus_text(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        counters = [("requests", "requests"), ("errors", "errors"),
+                    ("chunks", "chunks"), ("prompt_tokens", "prompt_tokens"),
+                    ("completion_tokens", "completion_tokens")]
+        histograms = [("queue_seconds", "queue_time"), ("ttft_seconds", "ttft"),
+                      ("inter_chunk_seconds", "inter_chunk"), ("request_seconds", "total_time")]
+        with self._lock:
+            items = sorted(self._stats.items())
+            for name, attribute in counters:
+                lines.append(f"# TYPE medilearn_llm_{name}_total counter")
+                for (operation, model), stats in items:
+                    lines.append(f'medilearn_llm_{name}_total{{operation="{operation}",model="{model}"}} '
+                                 f"{getattr(stats, attribute)}")
+            for name, attribute in histograms:
+                lines.append(f"# TYPE medilearn_llm_{name} histogram")
+                for (operation, model), stats in items:
+                    histogram = getattr(stats, attribute)
+                    labels = f'operation="{operation}",model="{model}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(f'medilearn_llm_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'medilearn_llm_{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"medilearn_llm_{name}_sum{{{labels}}} {histogram.total}")
+                    lines.append(f"medilearn_llm_{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(metrics, port, host="0.0.0.0"):
+    """Serve /metrics for Prometheus scraping on a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            payload = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-metrics", daemon=True).start()
+    return server
+
+
+# Shared by every gateway in the process. Set MEDILEARN_LLM_TRACE to a file
+# path to also append one JSON line per request.
+metrics = LLMMetrics(trace_path=os.environ.get("MEDILEARN_LLM_TRACE"))
@@ -0,0 +1,127 @@
+import re
+import zlib
+
+import numpy as np
+
+# Words per shingle; 3-grams catch reworded but structurally copied cases
+shingle_size = 3
+default_num_perm = 64
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard usually collide in some band
+default_bands = 16
+word_pattern = re.compile(r"\w+")
+# Bump whenever signatures change. Signatures of different versions are not comparable,
+# so stores of them record the version they were made with (see MinHasher.version)
+signature_version = 2
+
+
+def shingles(text, size=shingle_size):
+    """Return the set of hashed word n-grams of a text."""
+    words = word_pattern.findall(text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+            for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures whose agreement rate estimates the Jaccard similarity of two texts."""
+
+    def __init__(self, num_perm=default_num_perm, seed=1):
+        rng = np.random.default_rng(seed)
+        # Random odd multipliers; a * x + b wrapping mod 2**64 acts as one permutation per row.
+        # (a * x + b mod a 61-bit prime with small coefficients badly skewed the estimates.)
+        self.a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.seed = seed
+
+    @property
+    def version(self):
+        """Identifies the signatures this hasher makes; equal versions give comparable signatures."""
+        return f"{signature_version}/{self.num_perm}/{self.seed}"
+
+    def signature(self, text):
+        """Return the signature of a text as a uint32 array of length num_perm."""
+        hashes = np.fromiter(shingles(text), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            permuted = self.a[:, None] * hashes[None, :] + self.b[:, None]
+        # The high bits carry the ordering, so they identify the minimum well
+        return (permuted.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(first == second)) / len(first)
+
+
+class MinHashIndex:
+    """Locality-sensitive hash index answering "which stored signatures are near this one?".
+
+    Each signature is split into bands; two signatures become candidates when
+    any band matches exactly, and all candidates are then checked against the
+    full signatures in one vectorized comparison, so a lookup costs a few
+    dict probes rather than a scan.
+    """
+
+    def __init__(self, num_perm=default_num_perm, bands=default_bands, capacity=1024):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = [{} for _ in range(bands)]
+        self._matrix = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self._slots = {}
+        self._keys = []
+        self._free = []
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def _band_keys(self, signature):
+        data = signature.tobytes()
+        width = self.rows * signature.itemsize
+        return [data[i * width:(i + 1) * width] for i in range(self.bands)]
+
+    def add(self, key, signature):
+        if key in self._slots:
+            return
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = key
+        else:
+            slot = len(self._keys)
+            self._keys.append(key)
+            if slot == len(self._matrix):
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[slot] = signature
+        self._slots[key] = slot
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band, []).append(slot)
+
+    def remove(self, key):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        for bucket, band in zip(self._buckets, self._band_keys(self._matrix[slot])):
+            slots = bucket.get(band)
+            if slots is not None:
+                slots.remove(slot)
+                if not slots:
+                    del bucket[band]
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def query(self, signature, threshold=0.8):
+        """Return (key, similarity) of stored signatures at least `threshold` similar, most similar first."""
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band, ()))
+        if not candidates:
+            return []
+        slots = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+        similarities = (self._matrix[slots] == signature).mean(axis=1)
+        order = np.argsort(-similarities)
+        return [(self._keys[slots[i]], float(similarities[i])) for i in order if similarities[i] >= threshold]
@@ -0,0 +1,162 @@
+"""Local stand-in for the Groq/OpenAI chat completions API, for load tests and offline development.
+
+Replays recorded responses with a configurable time to first token and
+tokens-per-second rate. Point the app at it with
+
+    [LLM]
+    backend = "mock"
+    base_url = "http://127.0.0.1:8765"
+
+in .streamlit/secrets.toml, then run
+
+    python mock_llm_server.py --ttft 0.4 --tps 250
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+default_responses_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmarks", "fixtures", "llm_responses.json")
+# Recorded text is replayed in word-sized pieces, roughly one token each
+token_pattern = re.compile(r"\S+\s*|\s+")
+
+
+def classify(messages):
+    """Pick which kind of recorded response answers a request."""
+    first = messages[0]["content"] if messages else ""
+    if first.startswith("Generate") and "case stud" in first:
+        return "case_studies"
+    if "evaluation" in first and "JSON" in first:
+        return "evaluation"
+    return "chat"
+
+
+class MockLLM:
+    """Recorded responses plus the timing model used to replay them."""
+
+    def __init__(self, responses, ttft=0.3, tokens_per_second=250.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self._cycles = {kind: itertools.cycle(texts) for kind, texts in responses.items()}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def next_response(self, messages):
+        with self._lock:
+            self.requests += 1
+            return next(self._cycles[classify(messages)])
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        text = self.mock.next_response(request.get("messages", []))
+        tokens = token_pattern.findall(text)
+        if request.get("max_tokens"):
+            tokens = tokens[:request["max_tokens"]]
+        if request.get("stream"):
+            self._stream(request, tokens)
+        else:
+            self._complete(request, tokens)
+
+    def _envelope(self, request, kind):
+        return {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": kind,
+                "created": int(time.time()), "model": request.get("model", "mock")}
+
+    @staticmethod
+    def _usage(request, tokens):
+        prompt_tokens = sum(len(token_pattern.findall(message.get("content", "")))
+                            for message in request.get("messages", []))
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens)}
+
+    def _complete(self, request, tokens):
+        time.sleep(self.mock.ttft + len(tokens) / self.mock.tokens_per_second)
+        body = self._envelope(request, "chat.completion")
+        body["choices"] = [{"index": 0, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": "".join(tokens)}}]
+        body["usage"] = self._usage(request, tokens)
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, request, tokens):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        envelope = self._envelope(request, "chat.completion.chunk")
+        started = time.perf_counter() + self.mock.ttft
+        for i, token in enumerate(tokens):
+            # Schedule against the start time so write overhead does not slow the rate down
+            delay = started + i / self.mock.tokens_per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            chunk = dict(envelope, choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            self._write_event(json.dumps(chunk))
+        chunk = dict(envelope, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     x_groq={"id": envelope["id"], "usage": self._usage(request, tokens)})
+        self._write_event(json.dumps(chunk))
+        self._write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_event(self, data):
+        event = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 makes bursts of concurrent sessions wait on SYN retries
+    request_queue_size = 512
+
+
+def start_server(host="127.0.0.1", port=8765, ttft=0.3, tokens_per_second=250.0,
+                 responses_path=default_responses_path):
+    """Start the mock server on a background thread and return it."""
+    with open(responses_path, encoding="utf-8") as f:
+        responses = json.load(f)
+    handler = type("BoundMockHandler", (MockHandler,), {"mock": MockLLM(responses, ttft, tokens_per_second)})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded chat completions with realistic timing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tps", type=float, default=250.0, help="tokens per second after the first")
+    parser.add_argument("--responses", default=default_responses_path, help="recorded responses JSON")
+    args = parser.parse_args()
+    server = start_server(args.host, args.port, args.ttft, args.tps, args.responses)
+    print(f"Mock LLM server on http://{args.host}:{server.server_address[1]} "
+          f"(ttft {args.ttft}s, {args.tps} tokens/s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
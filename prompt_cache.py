@@ -0,0 +1,60 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from chat_context import estimate_tokens
+
+
+class PrefixCache:
+    """In-process record of message-list prefixes already sent, used to account for prompt token reuse.
+
+    Each message is hashed together with everything before it, so a lookup
+    finds the longest prefix of a new request that an earlier request (from
+    any session) already sent and that the provider can serve from its cache.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.reused_tokens = 0
+        self._prefixes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def account(self, messages):
+        """Record a request and return its prompt token count and the tokens covered by a cached prefix."""
+        digest = hashlib.sha1()
+        hashes = []
+        total = 0
+        for message in messages:
+            digest.update(message["role"].encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(message["content"].encode("utf-8"))
+            digest.update(b"\0")
+            total += estimate_tokens(message["content"])
+            hashes.append((digest.copy().hexdigest(), total))
+
+        reused = 0
+        with self._lock:
+            for prefix_hash, tokens in hashes:
+                if prefix_hash not in self._prefixes:
+                    break
+                reused = tokens
+            for prefix_hash, tokens in hashes:
+                self._prefixes[prefix_hash] = tokens
+                self._prefixes.move_to_end(prefix_hash)
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+            self.requests += 1
+            self.prompt_tokens += total
+            self.reused_tokens += reused
+        return {"prompt_tokens": total, "reused_tokens": reused}
+
+    def stats(self):
+        """Return cumulative prompt and reused token counts."""
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "reused_tokens": self.reused_tokens,
+            "reuse_ratio": self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
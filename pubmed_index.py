@@ -0,0 +1,132 @@
+"""Offline full-text index over PubMed articles, backed by SQLite FTS5.
+
+Articles fetched by PubMedClient are added incrementally. A PubMed
+baseline dump can be bulk-loaded with:
+
+    python pubmed_index.py import pubmed24n0001.xml.gz [more files...]
+    python pubmed_index.py search "febrile seizure recurrence"
+"""
+import argparse
+import gzip
+import re
+import threading
+import time
+
+from storage import connect
+
+# Terms are ANDed like a PubMed [TIAB] search; titles weigh more than abstracts
+title_weight = 5.0
+abstract_weight = 1.0
+import_batch_size = 1000
+
+query_term = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(query):
+    """Turn free text into an FTS5 query of quoted terms so user input cannot inject FTS syntax."""
+    return " ".join(f'"{term}"' for term in query_term.findall(query.casefold()))
+
+
+class ArticleIndex:
+    """BM25-ranked full-text index of article titles and abstracts."""
+
+    def __init__(self, db_name="pubmed.db"):
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5(
+                title, abstract, tokenize = 'porter unicode61'
+            )
+        """)
+        self._conn.commit()
+
+    def add(self, records):
+        """Index new or updated article records."""
+        # PMIDs are integers, so they double as the FTS rowid and replace stale rows in place
+        rows = [(int(r.pmid), r.title, r.abstract) for r in records if r.pmid and r.pmid.isdigit()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO article_fts (rowid, title, abstract) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def search(self, query, limit=10):
+        """Return up to `limit` PMIDs matching every term of the query, best match first."""
+        match = fts_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid FROM article_fts WHERE article_fts MATCH ? "
+                "ORDER BY bm25(article_fts, ?, ?) LIMIT ?",
+                (match, title_weight, abstract_weight, limit),
+            ).fetchall()
+        return [str(row[0]) for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM article_fts").fetchone()[0]
+
+    def optimize(self):
+        """Merge index segments after a bulk load."""
+        with self._lock:
+            self._conn.execute("INSERT INTO article_fts (article_fts) VALUES ('optimize')")
+            self._conn.commit()
+
+
+def import_dump(paths, index, store, client):
+    """Stream PubMed baseline/update XML files into the article store and the index."""
+    total = 0
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        started = time.perf_counter()
+        batch = []
+        with opener(path, "rb") as source:
+            for record in client.iter_article_details(source):
+                batch.append(record)
+                if len(batch) >= import_batch_size:
+                    store.put_many(batch)
+                    index.add(batch)
+                    total += len(batch)
+                    batch = []
+        if batch:
+            store.put_many(batch)
+            index.add(batch)
+            total += len(batch)
+        print(f"{path}: {total} articles indexed so far ({time.perf_counter() - started:.1f}s)")
+    index.optimize()
+    return total
+
+
+def main():
+    from pubmed_requests import ArticleStore, PubMedClient
+
+    parser = argparse.ArgumentParser(description="Manage the offline PubMed index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="bulk-load PubMed XML dumps (.xml or .xml.gz)")
+    import_parser.add_argument("paths", nargs="+")
+    search_parser = commands.add_parser("search", help="query the local index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    index = ArticleIndex()
+    store = ArticleStore()
+    if args.command == "import":
+        client = PubMedClient()
+        total = import_dump(args.paths, index, store, client)
+        client.close()
+        print(f"Imported {total} articles; index now holds {index.count()}.")
+    else:
+        started = time.perf_counter()
+        pmids = index.search(args.query, args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        records = store.get_many(pmids)
+        for pmid in pmids:
+            print(f"{pmid}  {records[pmid].title if pmid in records else ''}")
+        print(f"{len(pmids)} results in {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
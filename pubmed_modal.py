@@ -1,5 +1,16 @@
 import streamlit as st
-from pubmed_requests import PubMedClient
+from pubmed_requests import PubMedClient, QueryCache, ArticleStore
+from pubmed_index import ArticleIndex
+from utils import get_shared_cache
+
+
+@st.cache_resource
+def get_pubmed_client():
+    """Return the process-wide PubMed client so every session shares its connections and rate limit."""
+    ncbi = st.secrets.get("NCBI", {})
+    return PubMedClient(api_key=ncbi.get("api_key"),
+                        query_cache=QueryCache(), article_store=ArticleStore(),
+                        article_index=ArticleIndex(), shared_cache=get_shared_cache())
 
 @st.dialog("Search PubMed", width="large")
 def open_dialog():
@@ -18,14 +29,15 @@ def open_dialog():
 
 
 def search_pubmed(query):
-    client = PubMedClient()
-    article_ids = client.fetch_articles(query)
-    if article_ids:
-        article_urls = client.generate_pubmed_urls(article_ids)
-        article_details = client.fetch_article_details(article_ids)
+    client = get_pubmed_client()
+    # Local index first, NCBI only for the remaining results
+    article_details = client.search_articles(query)
+    if article_details:
+        article_urls = client.generate_pubmed_urls(
+            [article.pmid for article in article_details])
 
         # Prepare data for the table
         table_data = []
         for url, article in zip(article_urls, article_details):
-            table_data.append({"Title": article['title'], "Link": url})
+            table_data.append({"Title": article.title, "Link": url})
         return table_data
\ No newline at end of file
@@ -1,31 +1,311 @@
-import requests
+import io
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote_plus
 from xml.etree import ElementTree as ET
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared_cache import cache_key
+from storage import connect, worker_share
+
+# NCBI allows 3 requests/second without an API key and 10 with one
+ncbi_rate_limit = 3
+ncbi_rate_limit_with_key = 10
+retry_statuses = {429, 500, 502, 503, 504}
+# Longest Retry-After we honour; requests run on the script thread, which cannot wait minutes
+max_retry_after = 10
+# Search results change as PubMed indexes new papers; article records practically never do
+query_cache_ttl = 15 * 60
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting how often requests may start."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        # Below one request per second the bucket must still hold a whole token, or acquire() never returns
+        self.capacity = max(1.0, burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ArticleRecord:
+    """Compact record of one parsed PubMed article."""
+
+    __slots__ = ("pmid", "title", "abstract", "journal", "year", "authors")
+
+    def __init__(self, pmid, title, abstract, journal=None, year=None, authors=()):
+        self.pmid = pmid
+        self.title = title
+        self.abstract = abstract
+        self.journal = journal
+        self.year = year
+        self.authors = authors
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"ArticleRecord(pmid={self.pmid!r}, title={self.title!r})"
+
+
+def element_text(elem):
+    """Return all text inside an element, including inline markup such as <i> or <sup>."""
+    if elem is None:
+        return None
+    return "".join(elem.itertext()).strip() or None
+
+
+def normalize_query(query):
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    query = re.sub(r"\s+", " ", query.casefold())
+    return query.strip(" .,;:!?\"'")
+
+
+class QueryCache:
+    """Short-lived in-memory map from normalized search queries to PubMed ID lists."""
+
+    def __init__(self, ttl=query_cache_ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key, article_ids):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tuple(article_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ArticleStore:
+    """Long-lived SQLite store of parsed articles keyed by PMID."""
+
+    def __init__(self, db_name="pubmed.db"):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                pmid TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                abstract TEXT NOT NULL,
+                journal TEXT,
+                year TEXT,
+                authors TEXT NOT NULL,
+                fetched REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, pmids):
+        """Return a dict of the stored records among `pmids`."""
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(pmids), 500):
+                chunk = pmids[i:i + 500]
+                rows = self._conn.execute(
+                    "SELECT pmid, title, abstract, journal, year, authors FROM articles "
+                    f"WHERE pmid IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                for pmid, title, abstract, journal, year, authors in rows:
+                    found[pmid] = ArticleRecord(pmid, title, abstract, journal, year,
+                                                tuple(authors.split("; ")) if authors else ())
+            self.hits += len(found)
+            self.misses += len(set(pmids)) - len(found)
+        return found
+
+    def put_many(self, records):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles (pmid, title, abstract, journal, year, authors, fetched) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(r.pmid, r.title, r.abstract, r.journal, r.year, "; ".join(r.authors), now)
+                 for r in records if r.pmid],
+            )
+            self._conn.commit()
+
 
 class PubMedClient:
-    def __init__(self, max_results=10):
+    def __init__(self, max_results=10, api_key=None, batch_size=200, max_workers=3,
+                 max_retries=4, backoff=0.5, timeout=30, query_cache=None, article_store=None,
+                 article_index=None, shared_cache=None):
         self.base_url_search = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
         self.base_url_fetch = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
         self.max_results = max_results
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.query_cache = query_cache
+        self.article_store = article_store
+        self.article_index = article_index
+        # Results shared with other worker processes, each request made by one of them at a time
+        self.shared_cache = shared_cache
+        # NCBI counts requests per API key or IP, so serve.py workers split the limit
+        self.rate_limiter = RateLimiter(worker_share(ncbi_rate_limit_with_key if api_key else ncbi_rate_limit))
+
+        # Keep-alive connections shared by every request this client makes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pubmed")
+
+    def _get(self, url, params, stream=False):
+        """GET through the rate limiter, retrying 429/5xx and connection errors with jittered backoff."""
+        if self.api_key:
+            params = dict(params, api_key=self.api_key)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in retry_statuses or attempt == self.max_retries:
+                    return response
+                # Hand the connection back to the pool before waiting
+                response.close()
+                # A Retry-After wait uses up an attempt like any other retry
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    time.sleep(min(int(retry_after), max_retry_after))
+                    continue
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
 
     def fetch_articles(self, query):
-        query = f"{quote_plus(query)}[TIAB]"
         """Fetch PubMed article IDs based on the search query."""
+        query_key = None
+        if self.query_cache is not None:
+            query_key = (normalize_query(query), self.max_results)
+            article_ids = self.query_cache.get(query_key)
+            if article_ids is not None:
+                return article_ids
+        if self.shared_cache is None:
+            article_ids = self._search(query)
+        else:
+            article_ids = self.shared_cache.get_or_compute(
+                cache_key("pubmed_search", normalize_query(query), self.max_results),
+                lambda: self._search(query), ttl=query_cache_ttl)
+        if query_key is not None:
+            self.query_cache.put(query_key, article_ids)
+        return article_ids
+
+    def _search(self, query):
+        query = f"{quote_plus(query)}[TIAB]"
         params = {
             'db': 'pubmed',
             'term': quote_plus(query),
             'retmode': 'xml',
             'retmax': self.max_results,
         }
-        response = requests.get(self.base_url_search, params=params)
+        response = self._get(self.base_url_search, params)
         if response.status_code == 200:
             return self.parse_pubmed_ids(response.text)
         else:
             raise Exception(f"Error fetching articles: {response.status_code}")
 
+    def search_articles(self, query):
+        """Return article records for a query, answering from the local index first.
+
+        NCBI is only asked for the results the local index cannot supply; if it
+        is unreachable the local results are returned on their own.
+        """
+        article_ids = []
+        if self.article_index is not None:
+            article_ids = self.article_index.search(query, self.max_results)
+        if len(article_ids) < self.max_results:
+            try:
+                remote_ids = self.fetch_articles(query)
+            except Exception:
+                if not article_ids:
+                    raise
+                remote_ids = []
+            local_ids = set(article_ids)
+            article_ids.extend(article_id for article_id in remote_ids if article_id not in local_ids)
+            article_ids = article_ids[:self.max_results]
+        if not article_ids:
+            return []
+        return self.fetch_article_details(article_ids)
+
     def fetch_article_details(self, article_ids):
-        """Fetch detailed information of articles given their IDs."""
+        """Fetch detailed information of articles given their IDs, only asking NCBI for uncached ones."""
+        if self.article_store is None:
+            return self._fetch_shared(article_ids)
+        cached = self.article_store.get_many(article_ids)
+        missing = [article_id for article_id in article_ids if article_id not in cached]
+        if missing:
+            fetched = self._fetch_shared(missing)
+            cached.update((article.pmid, article) for article in fetched)
+        return [cached[article_id] for article_id in article_ids if article_id in cached]
+
+    def _fetch_shared(self, article_ids):
+        """Fetch and store article records, waiting for another worker already fetching the same ones."""
+        def fetch():
+            fetched = self._fetch_details(article_ids)
+            if self.article_store is not None:
+                self.article_store.put_many(fetched)
+            if self.article_index is not None:
+                self.article_index.add(fetched)
+            return fetched
+
+        if self.shared_cache is None:
+            return fetch()
+        records = self.shared_cache.get_or_compute(
+            cache_key("pubmed_articles", sorted(article_ids)),
+            lambda: [article.to_dict() for article in fetch()], ttl=query_cache_ttl)
+        return [ArticleRecord(**dict(record, authors=tuple(record["authors"]))) for record in records]
+
+    def _fetch_details(self, article_ids):
+        """Fetch article records from efetch in parallel batches."""
+        batches = [article_ids[i:i + self.batch_size]
+                   for i in range(0, len(article_ids), self.batch_size)]
+        if len(batches) <= 1:
+            return self._fetch_batch(article_ids)
+        articles = []
+        for batch_articles in self.executor.map(self._fetch_batch, batches):
+            articles.extend(batch_articles)
+        return articles
+
+    def _fetch_batch(self, article_ids):
         ids = ",".join(article_ids)
         params = {
             'db': 'pubmed',
@@ -33,12 +313,15 @@ class PubMedClient:
             'retmode': 'xml',
             'rettype': 'abstract',
         }
-        response = requests.get(self.base_url_fetch, params=params)
-        if response.status_code == 200:
-            return self.parse_article_details(response.text)
-        else:
-            raise Exception(
-                f"Error fetching article details: {response.status_code}")
+        response = self._get(self.base_url_fetch, params, stream=True)
+        with response:
+            if response.status_code == 200:
+                # Parse straight off the socket instead of buffering the whole document
+                response.raw.decode_content = True
+                return list(self.iter_article_details(response.raw))
+            else:
+                raise Exception(
+                    f"Error fetching article details: {response.status_code}")
 
     def parse_pubmed_ids(self, xml_response):
         """Parse PubMed IDs from XML response."""
@@ -46,17 +329,68 @@ class PubMedClient:
         return [id_elem.text for id_elem in root.findall('.//Id')]
 
     def parse_article_details(self, xml_response):
-        """Parse detailed information (title and abstract) from XML response."""
-        root = ET.fromstring(xml_response)
-        articles = []
-        for article in root.findall('.//PubmedArticle'):
-            title = article.find('.//ArticleTitle').text
-            abstract = article.find('.//Abstract/AbstractText')
-            abstract_text = abstract.text if abstract is not None else 'No abstract available'
-            articles.append({'title': title, 'abstract': abstract_text})
-        return articles
+        """Parse article records from an efetch XML document given as text or bytes."""
+        if isinstance(xml_response, str):
+            xml_response = xml_response.encode("utf-8")
+        return list(self.iter_article_details(io.BytesIO(xml_response)))
+
+    def iter_article_details(self, source):
+        """Stream article records from a file-like efetch response, freeing each article once parsed."""
+        context = ET.iterparse(source, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and elem.tag == "PubmedArticle":
+                yield self.parse_article(elem)
+                root.clear()
+
+    def parse_article(self, article):
+        """Build an ArticleRecord from a PubmedArticle element."""
+        citation = article.find('MedlineCitation')
+        if citation is None:
+            citation = article
+        pmid = citation.findtext('PMID')
+        # Direct child paths avoid scanning the whole subtree with './/'
+        details = citation.find('Article')
+        if details is None:
+            return ArticleRecord(pmid, 'Untitled', 'No abstract available')
+        title = element_text(details.find('ArticleTitle'))
+        if title is None:
+            title = element_text(details.find('VernacularTitle')) or 'Untitled'
+
+        # Structured abstracts have one AbstractText per labelled section
+        sections = []
+        for section in details.iterfind('Abstract/AbstractText'):
+            text = element_text(section)
+            if text is None:
+                continue
+            label = section.get('Label')
+            sections.append(f"{label}: {text}" if label else text)
+        abstract = "\n\n".join(sections) if sections else 'No abstract available'
+
+        journal = details.findtext('Journal/Title')
+        pub_date = details.find('Journal/JournalIssue/PubDate')
+        year = None
+        if pub_date is not None:
+            year = pub_date.findtext('Year') or (pub_date.findtext('MedlineDate') or '')[:4] or None
+
+        authors = []
+        for author in details.iterfind('AuthorList/Author'):
+            last_name = author.findtext('LastName')
+            if last_name:
+                initials = author.findtext('Initials')
+                authors.append(f"{last_name} {initials}" if initials else last_name)
+            else:
+                collective_name = author.findtext('CollectiveName')
+                if collective_name:
+                    authors.append(collective_name)
+        return ArticleRecord(pmid, title, abstract, journal, year, tuple(authors))
 
     def generate_pubmed_urls(self, article_ids):
         """Generate PubMed article URLs from article IDs."""
         base_url = "https://pubmed.ncbi.nlm.nih.gov/"
         return [f"{base_url}{article_id}/" for article_id in article_ids]
+
+    def close(self):
+        """Release pooled connections and worker threads."""
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from storage import cache_path, file_lock
+
+# Rubric score columns, in the order of evaluation_page.rubric
+score_columns = ["diagnostic_accuracy", "reasoning", "patient_management",
+                 "communication_skills", "time_management", "overall_impression"]
+overall_column = score_columns.index("overall_impression")
+
+# Fixed-width columns, one file each; "scores" holds the six rubric scores of a row
+column_types = {
+    "evaluated_at": np.float64,
+    "learner": np.int32,
+    "specialization": np.int16,
+    "difficulty": np.int8,
+    "messages": np.int32,
+    "scores": np.float32,
+}
+# Columns stored as integer codes into a dictionary of their values
+dictionary_columns = ["learner", "specialization", "difficulty"]
+
+default_percentiles = (10, 25, 50, 75, 90)
+week = 7 * 24 * 3600
+
+
+class ScoreWarehouse:
+    """Append-only columnar store of evaluation scores in NumPy memory-mapped files.
+
+    Learner, specialization and difficulty are dictionary-encoded. The
+    dictionaries and the committed row count are the in-memory index;
+    `meta.json` is replaced after every append, so a torn append past the
+    committed count is ignored and overwritten. Appends hold a lock file,
+    so several worker processes can record into one warehouse.
+    """
+
+    def __init__(self, directory_name="scores"):
+        self.directory_name = directory_name
+        self.directory = cache_path(directory_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta_version = None
+        self._views = None
+        self._load_meta()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_meta(self):
+        try:
+            self._meta_version = self._version()
+            with open(self._path("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {"rows": 0, "dictionaries": {}}
+        self.rows = meta["rows"]
+        self.dictionaries = {}
+        self._dictionary_bytes = {}
+        for name in dictionary_columns:
+            size = meta["dictionaries"].get(name, 0)
+            values = []
+            if size:
+                with open(self._path(f"{name}.jsonl"), "rb") as f:
+                    values = [json.loads(line) for line in f.read(size).splitlines()]
+            self.dictionaries[name] = values
+            self._dictionary_bytes[name] = size
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self.dictionaries.items()}
+        self._views = None
+
+    def _write_meta(self):
+        meta = {"rows": self.rows, "dictionaries": self._dictionary_bytes}
+        temporary = self._path("meta.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._path("meta.json"))
+        self._meta_version = self._version()
+
+    def _version(self):
+        # meta.json is replaced, never rewritten, so a new inode means another process committed
+        stat = os.stat(self._path("meta.json"))
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _reload_if_changed(self):
+        try:
+            version = self._version()
+        except FileNotFoundError:
+            return
+        if version != self._meta_version:
+            self._load_meta()
+
+    def refresh(self):
+        """Pick up rows appended by other processes."""
+        with self._lock:
+            self._reload_if_changed()
+
+    def _encode(self, name, values):
+        """Dictionary codes for `values`, adding unseen values to the dictionary."""
+        uniques, inverse = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+        codes = self._codes[name]
+        added = [value for value in uniques.tolist() if value not in codes]
+        if added:
+            lines = "".join(json.dumps(value) + "\n" for value in added).encode("utf-8")
+            with open(self._path(f"{name}.jsonl"), "ab") as f:
+                f.write(lines)
+            self._dictionary_bytes[name] += len(lines)
+            for value in added:
+                codes[value] = len(self.dictionaries[name])
+                self.dictionaries[name].append(value)
+        return np.array([codes[value] for value in uniques.tolist()], dtype=np.int64)[inverse]
+
+    def _truncate(self):
+        """Cut every file back to what meta.json has committed."""
+        sizes = {f"{name}.jsonl": size for name, size in self._dictionary_bytes.items()}
+        for name, dtype in column_types.items():
+            width = len(score_columns) if name == "scores" else 1
+            sizes[f"{name}.bin"] = self.rows * np.dtype(dtype).itemsize * width
+        for file_name, size in sizes.items():
+            path = self._path(file_name)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def append(self, learner, specialization, difficulty, scores, messages=0, evaluated_at=None):
+        """Record one evaluation; `scores` follow `score_columns`, NaN for a missing score."""
+        self.append_many([learner], [specialization], [difficulty], [scores], [messages],
+                         [time.time() if evaluated_at is None else evaluated_at])
+
+    def append_many(self, learners, specializations, difficulties, scores, messages, evaluated_at):
+        """Record a batch of evaluations given as parallel sequences."""
+        with self._lock, file_lock(os.path.join(self.directory_name, "append.lock")):
+            self._reload_if_changed()
+            self._truncate()
+            columns = {
+                "evaluated_at": evaluated_at,
+                "learner": self._encode("learner", learners),
+                "specialization": self._encode("specialization", specializations),
+                "difficulty": self._encode("difficulty", difficulties),
+                "messages": messages,
+                "scores": np.asarray(scores, dtype=np.float32).reshape(-1, len(score_columns)),
+            }
+            for name, values in columns.items():
+                with open(self._path(f"{name}.bin"), "ab") as f:
+                    f.write(np.ascontiguousarray(values, dtype=column_types[name]).tobytes())
+            self.rows += len(columns["scores"])
+            self._write_meta()
+            self._views = None
+
+    def code(self, name, value):
+        """Dictionary code of a learner, specialization or difficulty, or None if never recorded."""
+        self.refresh()
+        return self._codes[name].get(value)
+
+    def columns(self):
+        """Read-only memory-mapped views of every committed row, keyed by column name."""
+        self.refresh()
+        with self._lock:
+            if self._views is None:
+                self._views = {name: self._map(name, dtype) for name, dtype in column_types.items()}
+            return self._views
+
+    def _map(self, name, dtype):
+        shape = (self.rows, len(score_columns)) if name == "scores" else (self.rows,)
+        if not self.rows:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._path(f"{name}.bin"), dtype=dtype, mode="r", shape=shape)
+
+    def stats(self):
+        return {
+            "rows": self.rows,
+            "learners": len(self.dictionaries["learner"]),
+            "bytes": sum(os.path.getsize(self._path(f"{name}.bin"))
+                         for name in column_types if os.path.exists(self._path(f"{name}.bin"))),
+        }
+
+
+def select(columns, specialization=None, difficulty=None, since=None):
+    """Boolean row mask for the given specialization and difficulty codes and start time."""
+    mask = np.ones(len(columns["scores"]), dtype=bool)
+    if specialization is not None:
+        mask &= columns["specialization"] == specialization
+    if difficulty is not None:
+        mask &= columns["difficulty"] == difficulty
+    if since is not None:
+        mask &= columns["evaluated_at"] >= since
+    return mask
+
+
+def score_percentiles(columns, mask, percentiles=default_percentiles):
+    """Percentiles of every rubric score over the selected rows, shaped (percentiles, score_columns).
+
+    Matches np.nanpercentile with linear interpolation, but sorts each column
+    once instead of selecting per percentile, which is several times faster.
+    """
+    scores = np.sort(columns["scores"][mask].T, axis=1)  # NaN sorts last
+    valid = (~np.isnan(scores)).sum(axis=1)
+    result = np.full((len(percentiles), len(score_columns)), np.nan)
+    present = np.flatnonzero(valid)
+    if not len(present):
+        return result
+    last = valid[present] - 1
+    positions = np.outer(np.asarray(percentiles) / 100, last)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, last)
+    below = scores[present, lower].astype(np.float64)
+    above = scores[present, upper].astype(np.float64)
+    result[:, present] = below + (above - below) * (positions - lower)
+    return result
+
+
+def grouped_mean(codes, values, groups):
+    """Mean and count of `values` per integer code in range(groups), ignoring NaN values."""
+    valid = ~np.isnan(values)
+    counts = np.bincount(codes[valid], minlength=groups)
+    sums = np.bincount(codes[valid], weights=values[valid], minlength=groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts, counts
+
+
+def specialization_heatmap(columns, mask, specializations, difficulties, score=overall_column):
+    """Mean score and row count per (specialization, difficulty) cell."""
+    cells = (columns["specialization"][mask].astype(np.int64) * difficulties
+             + columns["difficulty"][mask])
+    means, counts = grouped_mean(cells, columns["scores"][mask, score].astype(np.float64),
+                                 specializations * difficulties)
+    return means.reshape(specializations, difficulties), counts.reshape(specializations, difficulties)
+
+
+def weekly_trend(columns, mask, score=overall_column):
+    """Week start times and the mean score of the evaluations in each week."""
+    weeks = (columns["evaluated_at"][mask] // week).astype(np.int64)
+    if not len(weeks):
+        return np.empty(0), np.empty(0)
+    first = weeks.min()
+    means, counts = grouped_mean(weeks - first, columns["scores"][mask, score].astype(np.float64),
+                                 weeks.max() - first + 1)
+    present = counts > 0
+    return (np.flatnonzero(present) + first) * week, means[present]
+
+
+def learner_summary(columns, mask, score=overall_column):
+    """Per-learner trend of one score, as parallel arrays.
+
+    For each learner with a scored evaluation among the selected rows:
+    evaluation count, mean and latest score, least-squares slope of the
+    score over time in points per week (the trend) and the percentile rank
+    of the mean among the returned learners.
+    """
+    learners = columns["learner"][mask]
+    times = columns["evaluated_at"][mask]
+    values = columns["scores"][mask, score].astype(np.float64)
+    valid = ~np.isnan(values)
+    learners, times, values = learners[valid], times[valid], values[valid]
+    if not len(values):
+        empty = np.empty(0)
+        return {"learner": np.empty(0, dtype=np.int64), "evaluations": empty, "mean": empty,
+                "latest": empty, "slope": empty, "percentile": empty}
+
+    # Sums per learner for the mean and a least-squares fit, without sorting rows by learner
+    groups = int(learners.max()) + 1
+    weeks = (times - times.min()) / week
+    n = np.bincount(learners, minlength=groups).astype(np.float64)
+    sum_x = np.bincount(learners, weights=weeks, minlength=groups)
+    sum_y = np.bincount(learners, weights=values, minlength=groups)
+    sum_xx = np.bincount(learners, weights=weeks * weeks, minlength=groups)
+    sum_xy = np.bincount(learners, weights=weeks * values, minlength=groups)
+    last_time = np.full(groups, -np.inf)
+    np.maximum.at(last_time, learners, times)
+    latest = np.full(groups, np.nan)
+    is_last = times == last_time[learners]
+    latest[learners[is_last]] = values[is_last]
+
+    present = np.flatnonzero(n)
+    n, sum_x, sum_y, sum_xx, sum_xy = (a[present] for a in (n, sum_x, sum_y, sum_xx, sum_xy))
+    denominator = n * sum_xx - sum_x * sum_x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(denominator > 1e-12, (n * sum_xy - sum_x * sum_y) / denominator, np.nan)
+    mean = sum_y / n
+    ranks = np.argsort(np.argsort(mean, kind="stable"), kind="stable")
+    return {
+        "learner": present,
+        "evaluations": n,
+        "mean": mean,
+        "latest": latest[present],
+        "slope": slope,
+        "percentile": 100 * ranks / max(len(present) - 1, 1),
+    }
+
+
+def learner_history(columns, learner):
+    """Evaluation times and score rows of one learner (by code), oldest first."""
+    rows = np.flatnonzero(columns["learner"] == learner)
+    rows = rows[np.argsort(columns["evaluated_at"][rows], kind="stable")]
+    return columns["evaluated_at"][rows], columns["scores"][rows]
@@ -0,0 +1,216 @@
+"""Run several Streamlit worker processes behind one port, with sticky sessions.
+
+Each worker is `streamlit run app.py` on its own local port. A small TCP
+proxy on --port sends each browser to one worker, remembered in a cookie, so
+its websocket reconnects reach the worker holding its session state; a
+browser whose worker died is moved to another one, where the session is
+restored from the session store. Dead workers are restarted with backoff; if
+one keeps dying the launcher stops with a non-zero exit status. All workers
+share the on-disk caches and, through [SHARED_CACHE] in secrets.toml, one
+shared cache tier; each takes an equal share of the PubMed and LLM rate limits.
+
+    python serve.py --workers 4 --port 8501
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+worker_cookie = "medilearn_worker"
+cookie_pattern = re.compile(rb"^cookie:.*?\b" + worker_cookie.encode() + rb"=(\d+)", re.IGNORECASE | re.MULTILINE)
+# Largest request or response head the proxy reads before passing bytes through
+max_head_bytes = 64 * 1024
+# A worker that exits is restarted after restart_delay, doubling up to max_restart_delay while it
+# keeps exiting; after max_restarts exits without staying up for healthy_uptime the launcher stops
+restart_delay = 2
+max_restart_delay = 60
+max_restarts = 5
+healthy_uptime = 60
+# How often the launcher checks its workers
+poll_interval = 1
+service_unavailable = (b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n"
+                       b"Retry-After: 2\r\nConnection: close\r\n\r\n")
+
+
+class Worker:
+    """One Streamlit process and the proxy's count of connections routed to it."""
+
+    def __init__(self, index, port, streamlit_args=(), workers=1):
+        self.index = index
+        self.workers = workers
+        self.port = port
+        self.streamlit_args = list(streamlit_args)
+        self.connections = 0
+        self.restarts = 0
+        self.restart_at = None
+        self.started_at = None
+        self.process = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        command = [sys.executable, "-m", "streamlit", "run", os.path.join(repo_dir, "app.py"),
+                   "--server.port", str(self.port), "--server.address", "127.0.0.1",
+                   "--server.headless", "true", *self.streamlit_args]
+        self.process = subprocess.Popen(command, cwd=repo_dir,
+                                        env=dict(os.environ, MEDILEARN_WORKER=str(self.index),
+                                                 MEDILEARN_WORKERS=str(self.workers)))
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive:
+            self.process.terminate()
+
+
+class StickyProxy:
+    """Routes each client connection to the worker named in its cookie, or the least busy one."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._round_robin = itertools.cycle(range(len(workers)))
+
+    def choose(self, preferred, exclude=()):
+        """The preferred worker if it is up, otherwise the live worker with the fewest connections."""
+        if preferred is not None and preferred < len(self.workers):
+            worker = self.workers[preferred]
+            if worker.alive and worker not in exclude:
+                return worker
+        candidates = [worker for worker in self.workers if worker.alive and worker not in exclude]
+        if not candidates:
+            return None
+        start = next(self._round_robin)
+        # Ties go round-robin, so idle workers fill up evenly
+        return min(candidates, key=lambda worker: (worker.connections, (worker.index - start) % len(self.workers)))
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        match = cookie_pattern.search(head)
+        preferred = int(match.group(1)) if match else None
+
+        tried = []
+        while True:
+            worker = self.choose(preferred, tried)
+            if worker is None:
+                client_writer.write(service_unavailable)
+                await client_writer.drain()
+                client_writer.close()
+                return
+            try:
+                worker_reader, worker_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+                break
+            except OSError:
+                # Still starting up or just died
+                tried.append(worker)
+
+        worker.connections += 1
+        try:
+            worker_writer.write(head)
+            set_cookie = worker.index if worker.index != preferred else None
+            await asyncio.gather(self._pipe(client_reader, worker_writer),
+                                 self._pipe(worker_reader, client_writer, set_cookie))
+        finally:
+            worker.connections -= 1
+            worker_writer.close()
+            client_writer.close()
+
+    @staticmethod
+    async def _pipe(reader, writer, set_cookie=None):
+        """Copy bytes until EOF, adding the worker cookie to the first response head if asked."""
+        try:
+            if set_cookie is not None:
+                head = await reader.readuntil(b"\r\n\r\n")
+                cookie = f"Set-Cookie: {worker_cookie}={set_cookie}; Path=/; HttpOnly; SameSite=Lax\r\n"
+                writer.write(head[:-2] + cookie.encode() + b"\r\n")
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, OSError):
+            writer.close()
+
+
+async def supervise(workers, stopping):
+    """Restart workers that exit, with backoff, until the launcher is stopped.
+
+    Returns False if a worker keeps exiting, after max_restarts restarts in a row.
+    """
+    while not stopping.is_set():
+        now = time.monotonic()
+        for worker in workers:
+            if worker.process is None or worker.alive:
+                continue
+            if worker.restart_at is None:
+                if now - worker.started_at >= healthy_uptime:
+                    worker.restarts = 0
+                if worker.restarts >= max_restarts:
+                    logger.error("Worker %d exited with %s after %d restarts; stopping", worker.index,
+                                 worker.process.returncode, worker.restarts)
+                    return False
+                delay = min(max_restart_delay, restart_delay * 2 ** worker.restarts)
+                logger.warning("Worker %d exited with %s; restarting in %gs", worker.index,
+                               worker.process.returncode, delay)
+                worker.restart_at = now + delay
+            elif now >= worker.restart_at:
+                worker.restarts += 1
+                worker.restart_at = None
+                worker.start()
+        try:
+            await asyncio.wait_for(stopping.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            pass
+    return True
+
+
+async def serve(args):
+    workers = [Worker(i, args.worker_port + i, args.streamlit_args, args.workers) for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    proxy = StickyProxy(workers)
+    server = await asyncio.start_server(proxy.handle, args.host, args.port, limit=max_head_bytes)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    print(f"MediLearn: {args.workers} workers on ports {args.worker_port}-{args.worker_port + args.workers - 1}, "
+          f"open http://{args.host}:{args.port}", flush=True)
+    try:
+        async with server:
+            return 0 if await supervise(workers, stopping) else 1
+    finally:
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            if worker.process is not None:
+                worker.process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--worker-port", type=int, default=8600, help="port of the first worker")
+    parser.add_argument("streamlit_args", nargs="*", help="extra `streamlit run` options, after --")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(serve(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import hashlib
+import hmac
+import json
+import secrets
+import uuid
+
+import streamlit as st
+import streamlit.components.v1 as components
+from chat_context import ChatContext
+from session_store import create_session_store
+
+# URL query parameter that identifies the session across reconnects
+session_param = "session"
+# Cookie holding a random secret of the browser that started a session. The session ID in
+# the URL is only a handle: a session is restored only for the browser holding this secret,
+# so a shared, bookmarked or logged URL does not give access to the transcript.
+owner_cookie = "medilearn_owner"
+owner_cookie_max_age = 365 * 24 * 3600
+# Optional URL query parameter naming the learner (e.g. a student number) whose scores are recorded
+learner_param = "learner"
+# Learners who do not name themselves get a random ID with this prefix. It is never the
+# session ID: learner IDs are listed on the cohort dashboard, session IDs must stay private.
+anonymous_learner_prefix = "anonymous-"
+# Messages reloaded on reconnect and kept after trimming
+session_tail_messages = 20
+# Once the in-memory transcript grows past this, older messages live only in the store
+max_session_messages = 40
+
+
+@st.cache_resource
+def get_session_store():
+    """Return the process-wide session store (configure with an optional [SESSIONS] section)."""
+    return create_session_store(st.secrets.get("SESSIONS", {}))
+
+
+def browser_owner():
+    """Return a hash of this browser's secret, setting the secret as a cookie on its first visit."""
+    owner = st.session_state.get("browser_owner")
+    if owner is None:
+        secret = st.context.cookies.get(owner_cookie)
+        if not secret:
+            secret = secrets.token_urlsafe(32)
+            # Streamlit cannot set cookies itself; a zero-height component does it in the browser
+            components.html(
+                f"<script>window.parent.document.cookie = {json.dumps(f'{owner_cookie}={secret}')}"
+                f" + '; path=/; max-age={owner_cookie_max_age}; SameSite=Strict';</script>", height=0)
+        owner = hashlib.sha256(secret.encode("utf-8")).hexdigest()
+        st.session_state.browser_owner = owner
+    return owner
+
+
+def owns_session(session_id):
+    """Whether this browser may resume a session: it started it, or the session does not exist."""
+    state = get_session_store().load_state(session_id)
+    return state is None or hmac.compare_digest(state.get("owner", ""), browser_owner())
+
+
+def current_session_id():
+    """Return this session's ID, taken from the URL on reconnect and kept in the URL otherwise.
+
+    An ID from the URL is used only if this browser started that session;
+    otherwise a new session begins.
+    """
+    session_id = st.session_state.get("session_id")
+    if session_id is None:
+        session_id = st.query_params.get(session_param)
+        if session_id is None or not owns_session(session_id):
+            session_id = uuid.uuid4().hex
+        st.session_state.session_id = session_id
+    if st.query_params.get(session_param) != session_id:
+        st.query_params[session_param] = session_id
+    return session_id
+
+
+def current_learner_id():
+    """Return the learner evaluation scores are recorded for.
+
+    Taken from the URL when given, otherwise a random anonymous ID made for
+    the first session in this browser tab, which later sessions carry over.
+    """
+    learner_id = st.query_params.get(learner_param) or st.session_state.get("learner_id")
+    if learner_id is None:
+        learner_id = anonymous_learner_prefix + secrets.token_hex(8)
+        save_session(learner_id=learner_id)
+    st.session_state.learner_id = learner_id
+    return learner_id
+
+
+def restore_session():
+    """On a fresh connection, reload the saved session named in the URL.
+
+    Only the page, the case selection and the last few messages are kept in
+    memory; older messages are folded into the chat context's summary and
+    otherwise stay in the store until something needs the full transcript.
+    """
+    # Set the owner cookie on the first run, before any page content
+    browser_owner()
+    session_id = current_session_id()
+    if "page" in st.session_state:
+        return
+    store = get_session_store()
+    state = store.load_state(session_id)
+    if state is None:
+        return
+
+    # Cases can have been pruned from the store since the session was saved
+    cases = [(case_id, store.get_case(case_id)) for case_id in state.get("case_ids") or ()]
+    cases = [(case_id, text) for case_id, text in cases if text is not None]
+    if cases:
+        st.session_state.case_ids = [case_id for case_id, _ in cases]
+        st.session_state.case_studies = [text for _, text in cases]
+        st.session_state.selected_specialization = state.get("specialization")
+        st.session_state.selected_difficulty = state.get("difficulty")
+    if state.get("learner_id"):
+        st.session_state.learner_id = state["learner_id"]
+    if state.get("selected_case_id"):
+        st.session_state.selected_case_id = state["selected_case_id"]
+        st.session_state.selected_case_study = store.get_case(state["selected_case_id"])
+
+    count = store.message_count(session_id)
+    start = max(0, count - session_tail_messages)
+    st.session_state.messages = store.load_messages(session_id, start)
+    st.session_state.messages_offset = start
+    case_study = st.session_state.get("selected_case_study")
+    if start and case_study is not None:
+        # Rebuild the summary of the turns that stay in the store, as trim_messages would have
+        context = ChatContext(case_study)
+        older = store.load_messages(session_id, 0, start)
+        context.forget(older, len(older))
+        st.session_state.chat_context = context
+
+    page = state.get("page", "case_selection")
+    if page != "case_selection" and st.session_state.get("selected_case_study") is None:
+        page = "case_selection"
+    st.session_state.page = page
+
+
+def save_session(**fields):
+    """Persist part of the session's state, e.g. the page or the case selection."""
+    get_session_store().update_state(current_session_id(), dict(fields, owner=browser_owner()))
+
+
+def store_case_studies(case_studies):
+    """Save generated case studies once each and return their IDs."""
+    return get_session_store().put_cases(case_studies)
+
+
+def new_session():
+    """Start a fresh transcript under a new session ID, keeping the current case selection."""
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.messages = []
+    st.session_state.messages_offset = 0
+    save_session(page="case_selection",
+                 learner_id=st.session_state.get("learner_id"),
+                 case_ids=st.session_state.get("case_ids"),
+                 specialization=st.session_state.get("selected_specialization"),
+                 difficulty=st.session_state.get("selected_difficulty"))
+
+
+def append_message(message):
+    """Append a message to the stored transcript and the in-memory tail; return its sequence number."""
+    messages = st.session_state.messages
+    seq = st.session_state.get("messages_offset", 0) + len(messages)
+    get_session_store().append_message(current_session_id(), seq, message)
+    messages.append(message)
+    return seq
+
+
+def trim_messages():
+    """Bound the in-memory transcript, leaving older messages only in the store."""
+    messages = st.session_state.messages
+    if len(messages) <= max_session_messages:
+        return
+    drop = len(messages) - session_tail_messages
+    context = st.session_state.get("chat_context")
+    if context is not None:
+        context.forget(messages, drop)
+    del messages[:drop]
+    st.session_state.messages_offset = st.session_state.get("messages_offset", 0) + drop
+
+
+def set_references(seq, references):
+    """Attach references to message `seq`, in the store and in memory if it is still there."""
+    get_session_store().set_references(current_session_id(), seq, references)
+    index = seq - st.session_state.get("messages_offset", 0)
+    if 0 <= index < len(st.session_state.messages):
+        st.session_state.messages[index]["references"] = references
+
+
+def full_transcript():
+    """Return the whole transcript, loading messages that were trimmed from memory."""
+    offset = st.session_state.get("messages_offset", 0)
+    if not offset:
+        return st.session_state.messages
+    return get_session_store().load_messages(current_session_id(), 0, offset) + st.session_state.messages
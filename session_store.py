@@ -0,0 +1,236 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from storage import connect
+
+# Sessions untouched for this long are deleted, with their transcripts
+session_ttl = 30 * 24 * 3600
+# Case texts kept in memory and shared by every session that shows them
+case_cache_size = 512
+
+
+def case_id_for(text):
+    """Content-addressed ID of a case study."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """Interface for persisting learner sessions outside st.session_state.
+
+    A session has a small JSON state (page, case selection), an append-only
+    transcript addressed by sequence number, and refers to case studies by ID;
+    each case text is stored once however many sessions use it.
+    """
+
+    def load_state(self, session_id):
+        """Return the saved state dict, or None for an unknown session."""
+        raise NotImplementedError
+
+    def update_state(self, session_id, fields):
+        """Merge `fields` into the saved state."""
+        raise NotImplementedError
+
+    def put_cases(self, texts):
+        """Store case texts and return their IDs."""
+        raise NotImplementedError
+
+    def get_case(self, case_id):
+        """Return the case text for an ID, or None."""
+        raise NotImplementedError
+
+    def append_message(self, session_id, seq, message):
+        """Store a message at position `seq` of the transcript, dropping any stored from `seq` on.
+
+        `seq` may not be past the end of the transcript.
+        """
+        raise NotImplementedError
+
+    def set_references(self, session_id, seq, references):
+        """Attach literature references to an already stored message."""
+        raise NotImplementedError
+
+    def message_count(self, session_id):
+        raise NotImplementedError
+
+    def load_messages(self, session_id, start=0, end=None):
+        """Return messages `start` (inclusive) to `end` (exclusive) of the transcript."""
+        raise NotImplementedError
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a WAL-mode SQLite database shared by all sessions of the process."""
+
+    def __init__(self, db_name="sessions.db", ttl=session_ttl):
+        self._lock = threading.Lock()
+        self._cases = OrderedDict()
+        self._conn = connect(db_name)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cases (
+                id TEXT PRIMARY KEY,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                refs TEXT,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+        """)
+        self._expire(time.time() - ttl)
+        self._conn.commit()
+
+    def _expire(self, cutoff):
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT id FROM sessions WHERE updated < ?", (cutoff,))]
+        if not stale:
+            return
+        self._conn.executemany("DELETE FROM messages WHERE session_id = ?", [(s,) for s in stale])
+        self._conn.executemany("DELETE FROM sessions WHERE id = ?", [(s,) for s in stale])
+        # Drop cases no remaining session refers to
+        self._conn.execute("""
+            DELETE FROM cases WHERE id NOT IN (
+                SELECT value FROM sessions, json_each(sessions.state, '$.case_ids')
+                UNION SELECT json_extract(state, '$.selected_case_id') FROM sessions)
+        """)
+
+    def load_state(self, session_id):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_state(self, session_id, fields):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            state.update(fields)
+            self._conn.execute("INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                               (session_id, json.dumps(state), time.time()))
+            self._conn.commit()
+
+    def put_cases(self, texts):
+        ids = [case_id_for(text) for text in texts]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO cases (id, body) VALUES (?, ?)", zip(ids, texts))
+            self._conn.commit()
+        return ids
+
+    def get_case(self, case_id):
+        with self._lock:
+            text = self._cases.get(case_id)
+            if text is None:
+                row = self._conn.execute("SELECT body FROM cases WHERE id = ?", (case_id,)).fetchone()
+                if row is None:
+                    return None
+                text = row[0]
+            # Sessions showing the same case hold references to this one string
+            self._cases[case_id] = text
+            self._cases.move_to_end(case_id)
+            if len(self._cases) > case_cache_size:
+                self._cases.popitem(last=False)
+            return text
+
+    def append_message(self, session_id, seq, message):
+        references = message.get("references")
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+            if seq > count:
+                raise ValueError(f"Message {seq} would leave a gap after message {count - 1}")
+            self._conn.execute("DELETE FROM messages WHERE session_id = ? AND seq >= ?", (session_id, seq))
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, refs) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, message["role"], message["content"],
+                 json.dumps(references) if references is not None else None))
+            self._conn.execute("UPDATE sessions SET updated = ? WHERE id = ?", (time.time(), session_id))
+            self._conn.commit()
+
+    def set_references(self, session_id, seq, references):
+        with self._lock:
+            self._conn.execute("UPDATE messages SET refs = ? WHERE session_id = ? AND seq = ?",
+                               (json.dumps(references), session_id, seq))
+            self._conn.commit()
+
+    def message_count(self, session_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def load_messages(self, session_id, start=0, end=None):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, refs FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? "
+                "ORDER BY seq", (session_id, start, end if end is not None else 2 ** 62)).fetchall()
+        messages = []
+        for role, content, refs in rows:
+            message = {"role": role, "content": content}
+            if refs is not None:
+                message["references"] = json.loads(refs)
+            messages.append(message)
+        return messages
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local session store for development; sessions survive reconnects but not restarts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+        self._cases = {}
+        self._messages = {}
+
+    def load_state(self, session_id):
+        state = self._states.get(session_id)
+        return dict(state) if state is not None else None
+
+    def update_state(self, session_id, fields):
+        with self._lock:
+            self._states.setdefault(session_id, {}).update(fields)
+
+    def put_cases(self, texts):
+        ids = [case_id_for(text) for text in texts]
+        with self._lock:
+            for case_id, text in zip(ids, texts):
+                self._cases.setdefault(case_id, text)
+        return ids
+
+    def get_case(self, case_id):
+        return self._cases.get(case_id)
+
+    def append_message(self, session_id, seq, message):
+        with self._lock:
+            transcript = self._messages.setdefault(session_id, [])
+            if seq > len(transcript):
+                raise ValueError(f"Message {seq} would leave a gap after message {len(transcript) - 1}")
+            del transcript[seq:]
+            transcript.append(dict(message))
+
+    def set_references(self, session_id, seq, references):
+        transcript = self._messages.get(session_id, [])
+        if seq < len(transcript):
+            transcript[seq]["references"] = references
+
+    def message_count(self, session_id):
+        return len(self._messages.get(session_id, []))
+
+    def load_messages(self, session_id, start=0, end=None):
+        return [dict(message) for message in self._messages.get(session_id, [])[start:end]]
+
+
+def create_session_store(settings):
+    """Build the store named in the [SESSIONS] settings ("sqlite" by default, or "memory")."""
+    name = settings.get("backend", "sqlite")
+    if name == "sqlite":
+        return SQLiteSessionStore(settings.get("db_name", "sessions.db"))
+    if name == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {name}")
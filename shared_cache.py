@@ -0,0 +1,227 @@
+import contextlib
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+
+from storage import connect
+
+# How long a worker may hold a computation lease before others take over
+default_lease = 120
+# How often waiting workers look for the leader's result
+poll_interval = 0.05
+
+
+def cache_key(*parts):
+    """Stable key for JSON-serializable parts, the same in every process."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    """Interface for a cache shared by every worker process, with cross-process single-flight.
+
+    Values are JSON-serializable and never None. A lease on a key is held by
+    at most one process at a time and lapses after its duration, so a worker
+    that dies mid-computation only delays the others.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value stored under `key`, or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Store `value`, expiring after `ttl` seconds (never when None)."""
+        raise NotImplementedError
+
+    def acquire(self, key, lease=default_lease):
+        """Take the lease on `key`; return a token to release it with, or None if another process holds it."""
+        raise NotImplementedError
+
+    def release(self, key, token):
+        """Give up a lease taken with `acquire`."""
+        raise NotImplementedError
+
+    def _count(self, name):
+        with self._counts_lock:
+            self.counts[name] += 1
+
+    @contextlib.contextmanager
+    def lease(self, key, lease=default_lease):
+        """Hold the lease on `key` for the block; yields whether it was taken."""
+        token = self.acquire(key, lease)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release(key, token)
+
+    def get_or_compute(self, key, compute, ttl=None, lease=default_lease, timeout=None):
+        """Return the cached value, or compute and store it in exactly one process at a time.
+
+        Processes that find another one computing the key wait for its result;
+        if it fails or its lease lapses, one of them takes over. After
+        `timeout` seconds of waiting (default: the lease) a waiter computes
+        the value itself.
+        """
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+        deadline = time.monotonic() + (lease if timeout is None else timeout)
+        waited = False
+        while True:
+            token = self.acquire(key, lease)
+            if token is not None:
+                try:
+                    # The previous holder may have finished between our lookup and the lease
+                    value = self.get(key)
+                    if value is None:
+                        self._count("computed")
+                        value = compute()
+                        self.set(key, value, ttl)
+                    else:
+                        self._count("waited" if waited else "hits")
+                    return value
+                finally:
+                    self.release(key, token)
+            waited = True
+            while time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                value = self.get(key)
+                if value is not None:
+                    self._count("waited")
+                    return value
+                if self.acquire_possible(key):
+                    break
+            else:
+                self._count("timeouts")
+                value = compute()
+                self.set(key, value, ttl)
+                return value
+
+    def acquire_possible(self, key):
+        """Whether nobody holds the lease on `key` right now."""
+        return False
+
+    def stats(self):
+        with self._counts_lock:
+            counts = dict(self.counts)
+        lookups = sum(counts.values())
+        shared = counts.get("hits", 0) + counts.get("waited", 0)
+        return dict(counts, backend=type(self).__name__, hit_rate=shared / lookups if lookups else 0.0)
+
+
+class SQLiteSharedCache(SharedCache):
+    """Shared cache in a WAL-mode SQLite file, for workers on one machine."""
+
+    def __init__(self, db_name="shared_cache.db"):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shared_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires REAL
+            );
+            CREATE INDEX IF NOT EXISTS shared_entries_expires ON shared_entries (expires);
+            CREATE TABLE IF NOT EXISTS shared_leases (
+                key TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM shared_entries WHERE key = ?",
+                                     (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_entries WHERE expires < ?", (now,))
+            self._conn.execute("INSERT OR REPLACE INTO shared_entries (key, value, expires) VALUES (?, ?, ?)",
+                               (key, json.dumps(value), None if ttl is None else now + ttl))
+            self._conn.commit()
+
+    def acquire(self, key, lease=default_lease):
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            # Only a lapsed lease is removed, so this cannot take a live one from another process
+            self._conn.execute("DELETE FROM shared_leases WHERE key = ? AND expires < ?", (key, now))
+            cursor = self._conn.execute("INSERT OR IGNORE INTO shared_leases (key, token, expires) VALUES (?, ?, ?)",
+                                        (key, token, now + lease))
+            self._conn.commit()
+        return token if cursor.rowcount == 1 else None
+
+    def release(self, key, token):
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_leases WHERE key = ? AND token = ?", (key, token))
+            self._conn.commit()
+
+    def acquire_possible(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT expires FROM shared_leases WHERE key = ?", (key,)).fetchone()
+        return row is None or row[0] < time.time()
+
+
+class RedisSharedCache(SharedCache):
+    """Shared cache on a Redis-compatible server (Redis, Valkey, KeyDB, ...), for workers on several machines."""
+
+    # Delete the lease only if it is still ours
+    release_script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", prefix="medilearn:"):
+        super().__init__()
+        # Only needed for this backend, so it is not in requirements.txt
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError('[SHARED_CACHE] backend = "redis" needs the redis package: pip install redis') from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._release = self._client.register_script(self.release_script)
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self.prefix + key, json.dumps(value), ex=None if ttl is None else max(1, int(ttl)))
+
+    def acquire(self, key, lease=default_lease):
+        token = uuid.uuid4().hex
+        taken = self._client.set(f"{self.prefix}lease:{key}", token, nx=True, px=int(lease * 1000))
+        return token if taken else None
+
+    def release(self, key, token):
+        self._release(keys=[f"{self.prefix}lease:{key}"], args=[token])
+
+    def acquire_possible(self, key):
+        return not self._client.exists(f"{self.prefix}lease:{key}")
+
+
+def create_shared_cache(settings):
+    """Build the cache named in the [SHARED_CACHE] settings ("sqlite" by default, "redis", or "off" for None)."""
+    name = settings.get("backend", "sqlite")
+    if name == "sqlite":
+        return SQLiteSharedCache(settings.get("db_name", "shared_cache.db"))
+    if name == "redis":
+        return RedisSharedCache(settings.get("url", "redis://127.0.0.1:6379/0"),
+                                settings.get("prefix", "medilearn:"))
+    if name == "off":
+        return None
+    raise ValueError(f"Unknown shared cache backend: {name}")
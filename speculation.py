@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from chat_context import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Speculative requests in flight at once, across all sessions
+max_speculative_requests = 4
+# Tokens (prompt plus completion budget) speculation may spend per minute
+speculative_tokens_per_minute = 20000
+# Finished results nobody claimed within this many seconds are dropped
+speculation_retention = 15 * 60
+# Shortest gap between two speculations of the same kind for one owner, in seconds
+speculation_min_interval = 30
+# Longest a page waits for a speculated result before asking the model itself, in seconds
+claim_timeout = 30
+
+
+class Speculation:
+    """One speculative request: what it is for, its future and its token estimate."""
+
+    def __init__(self, owner, kind, key, future, prompt_tokens, on_unclaimed):
+        self.owner = owner
+        self.kind = kind
+        self.key = key
+        self.future = future
+        self.prompt_tokens = prompt_tokens
+        self.on_unclaimed = on_unclaimed
+        self.superseded = False
+        self.finished = None
+
+    def tokens(self, text):
+        return self.prompt_tokens + estimate_tokens(text)
+
+
+class Speculator:
+    """Starts LLM requests a user is likely to need next, within a concurrency and token budget.
+
+    Each owner (a session) has at most one speculation per kind, named by the
+    key its result would be cached under. The page that needs the result
+    claims it by that key instead of asking again. A newer speculation of
+    the same kind supersedes the older one, which is cancelled or, once
+    finished, handed to `on_unclaimed` (e.g. to pool case studies); tokens
+    spent on results nobody used are counted as wasted.
+    """
+
+    def __init__(self, enabled=True, max_in_flight=max_speculative_requests,
+                 tokens_per_minute=speculative_tokens_per_minute, retention=speculation_retention,
+                 min_interval=speculation_min_interval):
+        self.enabled = enabled
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.retention = retention
+        self.min_interval = min_interval
+        # Reentrant: cancelling a future runs its done callback, _finished, right away
+        self._lock = threading.RLock()
+        self._tasks = {}
+        self._running = set()
+        self._spent = deque()
+        self._last_started = {}
+        self._counts = defaultdict(Counter)
+
+    def submit(self, owner, kind, key, start, prompt_tokens, completion_tokens,
+               on_unclaimed=None, cancel_superseded=True):
+        """Start `start()`, which returns a concurrent.futures.Future of the response text.
+
+        Does nothing when the same key is already speculated for this owner,
+        and skips the request when this owner started one of the same kind
+        less than `min_interval` seconds ago, when too many are in flight or
+        when the per-minute token budget is spent. Returns whether the
+        result is on its way.
+        """
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        unclaimed = []
+        with self._lock:
+            unclaimed += self._expire(now)
+            previous = self._tasks.get((owner, kind))
+            if previous is not None and previous.key == key:
+                return True
+            counts = self._counts[kind]
+            self._prune(now)
+            # Too soon after this owner's last one of the kind, which stays until a newer one starts
+            throttled = (owner, kind) in self._last_started
+            if previous is not None and not throttled:
+                del self._tasks[(owner, kind)]
+                unclaimed += self._supersede(previous, cancel_superseded)
+            if throttled:
+                counts["skipped_throttled"] += 1
+                task = None
+            elif len(self._running) >= self.max_in_flight:
+                counts["skipped_busy"] += 1
+                task = None
+            elif sum(tokens for _, tokens in self._spent) + prompt_tokens + completion_tokens > self.tokens_per_minute:
+                counts["skipped_budget"] += 1
+                task = None
+            else:
+                self._spent.append((now, prompt_tokens + completion_tokens))
+                self._last_started[(owner, kind)] = now
+                task = Speculation(owner, kind, key, start(), prompt_tokens, on_unclaimed)
+                self._tasks[(owner, kind)] = task
+                self._running.add(task)
+                counts["started"] += 1
+        self._hand_over(unclaimed)
+        if task is None:
+            return False
+        task.future.add_done_callback(lambda future: self._finished(task))
+        return True
+
+    def claim(self, owner, kind, key, timeout=claim_timeout):
+        """Return the speculated response text for `key`, waiting up to `timeout` seconds if still running, or None."""
+        with self._lock:
+            task = self._tasks.get((owner, kind))
+            counts = self._counts[kind]
+            if task is None or task.key != key:
+                counts["misses"] += 1
+                return None
+            del self._tasks[(owner, kind)]
+            waited = not task.future.done()
+        try:
+            text = task.future.result(timeout)
+        except Exception:
+            # Failed, cancelled or too slow: the caller asks again itself
+            task.future.cancel()
+            with self._lock:
+                counts["misses"] += 1
+                counts["failed"] += 1
+            return None
+        with self._lock:
+            counts["late_hits" if waited else "hits"] += 1
+            counts["used_tokens"] += task.tokens(text)
+        return text
+
+    def _finished(self, task):
+        with self._lock:
+            self._running.discard(task)
+            task.finished = time.monotonic()
+            unclaimed = self._supersede(task, cancel=False) if task.superseded else []
+        self._hand_over(unclaimed)
+
+    def _supersede(self, task, cancel):
+        """Retire a task nobody will claim; return [(callback, text)] to run outside the lock."""
+        task.superseded = True
+        counts = self._counts[task.kind]
+        if not task.future.done():
+            if cancel and task.future.cancel():
+                counts["cancelled"] += 1
+                # The prompt was already sent
+                counts["wasted_tokens"] += task.prompt_tokens
+            # Otherwise _finished retires it again once the response is in
+            return []
+        if task.future.cancelled():
+            return []
+        if task.future.exception() is not None:
+            counts["failed"] += 1
+            return []
+        text = task.future.result()
+        if task.on_unclaimed is not None:
+            counts["recycled"] += 1
+            counts["recycled_tokens"] += task.tokens(text)
+            return [(task.on_unclaimed, text)]
+        counts["wasted"] += 1
+        counts["wasted_tokens"] += task.tokens(text)
+        return []
+
+    def _prune(self, now):
+        while self._spent and self._spent[0][0] < now - 60:
+            self._spent.popleft()
+        for owner_kind, started in list(self._last_started.items()):
+            if started <= now - self.min_interval:
+                del self._last_started[owner_kind]
+
+    def _expire(self, now):
+        unclaimed = []
+        for owner_kind, task in list(self._tasks.items()):
+            if task.finished is not None and task.finished < now - self.retention:
+                del self._tasks[owner_kind]
+                unclaimed += self._supersede(task, cancel=False)
+        return unclaimed
+
+    @staticmethod
+    def _hand_over(unclaimed):
+        for callback, text in unclaimed:
+            try:
+                callback(text)
+            except Exception:
+                logger.exception("Could not hand over an unclaimed speculative result")
+
+    def stats(self):
+        """Per-kind counters with hit rate and the share of speculative tokens wasted."""
+        now = time.monotonic()
+        with self._lock:
+            unclaimed = self._expire(now)
+            self._prune(now)
+            stats = {"in_flight": len(self._running),
+                     "tokens_last_minute": sum(tokens for _, tokens in self._spent)}
+            for kind, counts in self._counts.items():
+                hits = counts["hits"] + counts["late_hits"]
+                lookups = hits + counts["misses"]
+                spent = counts["used_tokens"] + counts["recycled_tokens"] + counts["wasted_tokens"]
+                stats[kind] = dict(counts,
+                                   hit_rate=hits / lookups if lookups else 0.0,
+                                   wasted_share=counts["wasted_tokens"] / spent if spent else 0.0)
+        self._hand_over(unclaimed)
+        return stats
@@ -0,0 +1,46 @@
+import contextlib
+import os
+import sqlite3
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one worker process is supported there
+    fcntl = None
+
+# Directory for on-disk caches and stores (override with MEDILEARN_CACHE_DIR)
+CACHE_DIR = os.environ.get(
+    "MEDILEARN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".medilearn_cache"),
+)
+
+
+def worker_share(limit):
+    """This process's part of a rate limit that every worker started by serve.py must share."""
+    return limit / max(1, int(os.environ.get("MEDILEARN_WORKERS", 1)))
+
+
+def cache_path(name):
+    """Return the path of a file inside the cache directory, creating the directory if needed."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def connect(name):
+    """Open a WAL-mode SQLite database in the cache directory that can be shared across threads."""
+    conn = sqlite3.connect(cache_path(name), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextlib.contextmanager
+def file_lock(name):
+    """Hold an exclusive lock on a file in the cache directory, across processes, for the block."""
+    with open(cache_path(name), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
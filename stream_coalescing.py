@@ -0,0 +1,141 @@
+import queue
+import re
+import threading
+import time
+
+# Where a flushed chunk may end for each boundary setting: after whitespace
+# for "word", after sentence punctuation or a newline for "sentence"
+boundary_patterns = {
+    "none": None,
+    "word": re.compile(r"\s"),
+    "sentence": re.compile(r"[.!?:;](?=\s)|\n"),
+}
+
+
+class CoalescePolicy:
+    """When buffered stream deltas are released to the renderer.
+
+    Once `min_interval` seconds have passed since the last flush, buffered
+    text is released up to its last boundary ("none", "word" or "sentence");
+    after `max_interval` seconds or `max_chars` buffered characters it is
+    released whole. The first delta is always passed through at once so
+    time to first token is unchanged.
+    """
+
+    def __init__(self, min_interval=0.04, max_interval=0.15, boundary="word", max_chars=400):
+        if boundary not in boundary_patterns:
+            raise ValueError(f"Unknown flush boundary: {boundary}")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.boundary = boundary
+        self.max_chars = max_chars
+
+    def flush_point(self, text, elapsed):
+        """Return how many characters of `text` to release now (0 to keep buffering)."""
+        if elapsed >= self.max_interval or len(text) >= self.max_chars:
+            return len(text)
+        if elapsed < self.min_interval:
+            return 0
+        pattern = boundary_patterns[self.boundary]
+        if pattern is None:
+            return len(text)
+        end = 0
+        for match in pattern.finditer(text):
+            end = match.end()
+        return end
+
+
+default_policy = CoalescePolicy()
+# Yields every delta as it arrives, i.e. the behaviour without coalescing
+passthrough_policy = CoalescePolicy(min_interval=0, max_interval=0, boundary="none")
+
+
+_end = object()
+
+
+class _Reader:
+    """Reads an iterator on a helper thread so its items can be awaited with a timeout."""
+
+    def __init__(self, chunks):
+        self._items = queue.Queue()
+        self._stop = threading.Event()
+        threading.Thread(target=self._pump, args=(iter(chunks),), name="stream-reader", daemon=True).start()
+
+    def _pump(self, iterator):
+        try:
+            for chunk in iterator:
+                self._items.put((chunk, None))
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            self._items.put((None, e))
+        finally:
+            # Closing the source lets e.g. the LLM gateway stop generating
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self._items.put((_end, None))
+
+    def get(self, timeout):
+        """Return the next item, None if nothing arrived within `timeout` seconds, or _end."""
+        try:
+            chunk, error = self._items.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if error is not None:
+            raise error
+        return chunk
+
+    def close(self):
+        self._stop.set()
+
+
+def coalesce_chunks(chunks, policy=default_policy, clock=time.perf_counter, timed=True):
+    """Merge small stream deltas into fewer, larger ones according to `policy`.
+
+    With `timed`, the source is read on a helper thread, so buffered text is
+    released once `max_interval` has passed even while the source stalls
+    (`clock` must then count real seconds). Without it, buffered text is only
+    released when the next delta arrives. Whatever remains is flushed when
+    the stream ends.
+    """
+    reader = _Reader(chunks) if timed else None
+    iterator = None if timed else iter(chunks)
+    buffer = ""
+    last_flush = None
+    try:
+        while True:
+            if reader is None:
+                chunk = next(iterator, _end)
+            else:
+                # Wake up in time to release text that has waited `max_interval`
+                timeout = max(0.0, policy.max_interval - (clock() - last_flush)) if buffer else None
+                chunk = reader.get(timeout)
+            if chunk is _end:
+                break
+            if chunk is None and buffer:
+                now = clock()
+                end = policy.flush_point(buffer, now - last_flush)
+                if end:
+                    yield buffer[:end]
+                    buffer = buffer[end:]
+                    last_flush = now
+                continue
+            if not chunk:
+                continue
+            if last_flush is None:
+                last_flush = clock()
+                yield chunk
+                continue
+            buffer += chunk
+            now = clock()
+            end = policy.flush_point(buffer, now - last_flush)
+            if end:
+                yield buffer[:end]
+                buffer = buffer[end:]
+                last_flush = now
+    finally:
+        if reader is not None:
+            reader.close()
+    if buffer:
+        yield buffer
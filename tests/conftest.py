@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MEDILEARN_CACHE_DIR", tempfile.mkdtemp(prefix="medilearn-test-"))
+
+import storage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Give every test its own empty cache directory."""
+    monkeypatch.setattr(storage, "CACHE_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,33 @@
+import time
+
+from answer_cache import AnswerCache, features
+
+
+def test_a_reworded_question_is_served_from_the_cache():
+    cache = AnswerCache()
+    cache.put("case-1", "Should I order an ECG for this patient?", "", "Yes, get a 12-lead ECG.")
+    assert cache.lookup("case-1", "should i order ECG for the patient") == "Yes, get a 12-lead ECG."
+    assert cache.lookup("case-1", "What labs should I order?") is None
+    assert cache.lookup("case-2", "Should I order an ECG for this patient?") is None
+
+
+def test_a_short_question_needs_a_closer_match():
+    cache = AnswerCache(threshold=0.5)
+    cache.put("case-1", "ECG?", "What are the vitals?", "Sinus tachycardia.")
+    similar = "ECG now?"
+    # Close enough for a longer question, not for one of two words
+    assert cache.lookup("case-1", similar, "What are the vitals?") is None
+    assert cache.lookup("case-1", "ECG?", "What are the vitals?") == "Sinus tachycardia."
+
+
+def test_stored_questions_that_no_longer_have_features_are_skipped():
+    cache = AnswerCache()
+    cache.put("case-1", "What labs should I order?", "", "CBC and electrolytes.")
+    # As if the stop words had grown since this row was stored
+    cache._conn.execute("INSERT INTO answers (case_id, question, context, answer, last_used) VALUES (?, ?, ?, ?, ?)",
+                        ("case-1", "is it that", "", "Unreachable.", time.time()))
+    cache._conn.commit()
+    assert not len(features("is it that")[0])
+    reloaded = AnswerCache()
+    assert reloaded.stats()["answers"] == 1
+    assert reloaded.lookup("case-1", "What labs should I order?") == "CBC and electrolytes."
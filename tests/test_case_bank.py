@@ -0,0 +1,51 @@
+import threading
+import time
+
+from case_bank import CaseBank, fill_bank
+
+cases = [
+    "A 54-year-old man with crushing chest pain radiating to the left arm, diaphoresis and ST elevation in V1-V4.",
+    "A 23-year-old woman with palpitations, heat intolerance, weight loss, a fine tremor and a diffuse goitre.",
+    "A 67-year-old smoker with progressive dyspnoea, a chronic productive cough and a barrel-shaped chest.",
+    "A 35-year-old man with sudden severe headache, neck stiffness and photophobia after lifting weights.",
+]
+
+
+def prompt_for(specialization, difficulty):
+    return f"{specialization} {difficulty}"
+
+
+def test_fill_bank_below_one_request_per_second():
+    batches = iter([[cases[0], cases[1], cases[0]], [cases[2], cases[3]]])
+    calls = []
+
+    def generate(prompt):
+        calls.append(time.monotonic())
+        return next(batches)
+
+    bank = CaseBank()
+    done = threading.Event()
+    result = {}
+
+    def run():
+        result["totals"] = fill_bank(bank, generate, [("Cardiology", "Beginner")], 3, prompt_for,
+                                     workers=1, requests_per_minute=30, log=lambda message: None)
+        done.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    # 30 requests per minute: the first at once, the second two seconds later
+    assert done.wait(10), "fill_bank must not hang at rates below one request per second"
+    assert result["totals"] == {"accepted": 3, "duplicates": 1, "failed_batches": 0}
+    assert len(calls) == 2 and calls[1] - calls[0] >= 1.5
+    assert bank.count("Cardiology", "Beginner") == 3
+
+
+def test_rerun_only_fills_what_is_missing():
+    bank = CaseBank()
+    fill_bank(bank, lambda prompt: cases[:2], [("Neurology", "Expert")], 2, prompt_for,
+              requests_per_minute=600, log=lambda message: None)
+    calls = []
+    totals = fill_bank(bank, lambda prompt: calls.append(prompt) or cases[2:], [("Neurology", "Expert")], 2,
+                       prompt_for, requests_per_minute=600, log=lambda message: None)
+    assert calls == [] and totals["accepted"] == 0
+    assert sorted(text for _, text in bank.sample("Neurology", "Expert", 5)) == sorted(cases[:2])
@@ -0,0 +1,31 @@
+from utils import CaseStudySplitter, split_case_studies
+
+text = ("Here are three case studies.\n\n**Case Study 1:** A 54-year-old man with chest pain.\n\n"
+        "**Case Study 2:** A 2-year-old with a febrile seizure.\n\n"
+        "**Case Study 3:** An 80-year-old woman with confusion and low sodium.")
+cases = ["A 54-year-old man with chest pain.",
+         "A 2-year-old with a febrile seizure.",
+         "An 80-year-old woman with confusion and low sodium."]
+
+
+def test_text_is_split_at_the_markers():
+    assert split_case_studies(text) == cases
+    assert split_case_studies("No marker in this reply.") == []
+
+
+def test_each_case_is_released_when_the_next_marker_arrives():
+    splitter = CaseStudySplitter()
+    assert splitter.feed(text[:text.index("**Case Study 2:**")]) == []
+    # Only the first case is complete while the third marker is still partial
+    assert splitter.feed(text[text.index("**Case Study 2:**"):text.index("**Case Study 3:**") + 5]) == cases[:1]
+    assert splitter.feed(text[text.index("**Case Study 3:**") + 5:]) == cases[1:2]
+    assert splitter.close() == cases[2:]
+
+
+def test_markers_split_across_any_chunks_are_found():
+    for size in (1, 2, 7, 16, 33):
+        splitter = CaseStudySplitter()
+        found = []
+        for start in range(0, len(text), size):
+            found += splitter.feed(text[start:start + size])
+        assert found + splitter.close() == cases
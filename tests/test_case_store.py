@@ -0,0 +1,61 @@
+import time
+
+from case_store import CaseStudyStore
+
+
+def generator(calls):
+    def generate(prompt):
+        calls.append(prompt)
+        return [f"{prompt} case {len(calls)}.{i}" for i in range(3)]
+    return generate
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_a_take_refills_the_pool_in_the_background():
+    calls = []
+    store = CaseStudyStore(generator(calls), "model", pool_size=6, refill_interval=0)
+    assert store.take("cardiology") is None
+    store.request_refill("cardiology")
+    wait_for(lambda: store.stats()["pending_refills"] == 0 and store.available("cardiology") == 6)
+    assert calls == ["cardiology"] * 2
+
+    assert store.take("cardiology") == ["cardiology case 1.0", "cardiology case 1.1", "cardiology case 1.2"]
+    wait_for(lambda: store.stats()["pending_refills"] == 0 and store.available("cardiology") == 6)
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["refills"]) == (1, 1, 3)
+
+
+def test_pools_are_keyed_by_model():
+    store = CaseStudyStore(generator([]), "model", refill=False)
+    store.put("cardiology", ["a", "b"])
+    assert CaseStudyStore(generator([]), "other-model", refill=False).take("cardiology") is None
+    assert store.take("cardiology") == ["a", "b"]
+
+
+def test_cases_older_than_the_ttl_are_dropped():
+    store = CaseStudyStore(generator([]), "model", ttl=0.05, refill=False)
+    store.put("cardiology", ["a", "b"])
+    time.sleep(0.1)
+    store.put("neurology", ["c"])
+    assert store.take("cardiology") is None
+    assert store.take("neurology") == ["c"]
+    assert store.stats()["evictions"] == 2
+
+
+def test_the_least_recently_used_pool_is_evicted_first():
+    store = CaseStudyStore(generator([]), "model", max_entries=4, refill=False)
+    store.put("cardiology", ["a", "b"])
+    store.put("neurology", ["c", "d"])
+    # Using cardiology makes neurology the least recently used pool
+    assert store.take("cardiology", count=1) == ["a"]
+    store.put("pediatrics", ["e", "f"])
+    assert store.available("neurology") == 0
+    assert store.available("cardiology") == 1
+    assert store.available("pediatrics") == 2
+    assert store.stats()["evictions"] == 2
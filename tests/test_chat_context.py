@@ -0,0 +1,83 @@
+from chat_context import ChatContext, estimate_tokens
+
+case_study = "A 54-year-old man with two hours of crushing chest pain."
+
+
+def conversation(turns, words=40):
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Question {turn}. " + "what about the troponin " * (words // 4)})
+        messages.append({"role": "assistant", "content": f"Answer {turn}. " + "consider the ECG first " * (words // 4)})
+    return messages
+
+
+def test_a_short_chat_is_sent_verbatim():
+    messages = conversation(3)
+    prompt = ChatContext(case_study).build_prompt(messages, "Next?")
+    assert prompt.startswith(f"Case Study: {case_study}")
+    assert "Summary of earlier discussion" not in prompt
+    assert all(message["content"] in prompt for message in messages)
+    assert prompt.endswith("Now Junior Doctor said something: Next?")
+
+
+def test_a_long_chat_stays_within_budget_and_keeps_the_latest_turns():
+    context = ChatContext(case_study, token_budget=1500, keep_turns=3, summary_budget=200)
+    messages = conversation(60)
+    prompt = context.build_prompt(messages, "Next?")
+    assert estimate_tokens(prompt) <= 1500
+    assert all(message["content"] in prompt for message in messages[-6:])
+    assert messages[-7]["content"] not in prompt
+    # Older turns survive as one-line summaries, the oldest dropped once the summary is full
+    assert "- Senior Doctor: Answer 56." in prompt
+    assert "(earlier exchanges omitted)" in prompt
+    assert context.summary_tokens <= 200
+
+
+def test_growing_a_chat_turn_by_turn_folds_each_message_once():
+    folded = []
+    context = ChatContext(case_study, token_budget=1500, keep_turns=3,
+                          summarize_fn=lambda message: folded.append(message["content"]) or "- x\n")
+    messages = conversation(40)
+    for end in range(2, len(messages) + 1, 2):
+        prompt = context.build_prompt(messages[:end], "Next?")
+        assert estimate_tokens(prompt) <= 1500
+    assert folded == [message["content"] for message in messages[:len(folded)]]
+    assert len(folded) == context.summarized_upto
+
+
+def test_a_shorter_history_starts_a_new_summary():
+    context = ChatContext(case_study, token_budget=1500, keep_turns=3)
+    context.build_prompt(conversation(40), "Next?")
+    assert context.summarized_upto > 0
+    prompt = context.build_prompt(conversation(2), "Next?")
+    assert context.summarized_upto == 0
+    assert "Summary of earlier discussion" not in prompt
+
+
+def test_each_turn_extends_the_previous_message_list():
+    context = ChatContext(case_study)
+    messages = conversation(5)
+    previous = context.build_messages("You are a senior doctor.", messages[:2], "Next?")
+    assert previous[0] == {"role": "system", "content": f"You are a senior doctor.\n\nCase Study:\n{case_study}"}
+    for end in range(4, len(messages) + 1, 2):
+        current = context.build_messages("You are a senior doctor.", messages[:end], "Next?")
+        # Everything but the pending question is sent again unchanged
+        assert current[:len(previous) - 1] == previous[:-1]
+        assert current[-1] == {"role": "user", "content": "Next?"}
+        previous = current
+
+
+def test_compaction_rewrites_the_prefix_once_then_appends_again():
+    context = ChatContext(case_study, token_budget=1500, keep_turns=3)
+    messages = conversation(60)
+    rewrites = 0
+    previous = None
+    for end in range(2, len(messages) + 1, 2):
+        current = context.build_messages("You are a senior doctor.", messages[:end], "Next?")
+        assert sum(estimate_tokens(message["content"]) for message in current) <= 1500
+        if previous is not None and current[:len(previous) - 1] != previous[:-1]:
+            rewrites += 1
+            assert current[1]["content"].startswith("Summary of earlier discussion:")
+        previous = current
+    # Compacting below the low-water mark leaves room for several turns before the next rewrite
+    assert 0 < rewrites <= len(messages) // 2 // 3
@@ -0,0 +1,73 @@
+import uuid
+
+from streamlit.testing.v1 import AppTest
+
+import chat_page
+
+
+def chat_script():
+    import streamlit as st
+    from chat_page import chat_history, chat_panel
+    from session import append_message
+
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+        for i in range(6):
+            append_message({"role": "user" if i % 2 == 0 else "assistant", "content": f"old {i}"})
+    # Streamlit reruns only the fragment when a message is sent; AppTest always reruns the
+    # whole script, so the test marks the runs that stand for a fragment rerun
+    if not st.session_state.pop("fragment_rerun", False):
+        chat_history()
+    chat_panel(st.session_state.selected_case_study)
+
+
+def chat_app(monkeypatch):
+    drawn = []
+    render_message = chat_page.render_message
+
+    def record(message):
+        drawn.append(message["content"])
+        render_message(message)
+
+    monkeypatch.setattr(chat_page, "render_message", record)
+    monkeypatch.setattr(chat_page, "start_chat_completion", lambda case_study, history, prompt: iter(["Check ", "the ECG."]))
+    monkeypatch.setattr(chat_page, "start_reference_lookup", lambda case_study, prompt: None)
+    monkeypatch.setattr(chat_page, "speculate_evaluation", lambda case_study: None)
+    at = AppTest.from_function(chat_script, default_timeout=30)
+    at.session_state.session_id = uuid.uuid4().hex
+    at.session_state.selected_case_study = "A 54-year-old man with chest pain."
+    return at, drawn
+
+
+def test_sending_a_message_redraws_only_the_turns_since_the_last_full_rerun(monkeypatch):
+    at, drawn = chat_app(monkeypatch)
+    at.run()
+    assert drawn == [f"old {i}" for i in range(6)]
+
+    drawn.clear()
+    at.session_state.fragment_rerun = True
+    at.chat_input[0].set_value("Is the troponin up?").run()
+    assert not at.exception
+    assert drawn == ["Is the troponin up?"]
+    assert at.session_state.messages[-1] == {"role": "assistant", "content": "Check the ECG."}
+
+    drawn.clear()
+    at.session_state.fragment_rerun = True
+    at.chat_input[0].set_value("Any ST elevation?").run()
+    assert drawn == ["Is the troponin up?", "Check the ECG.", "Any ST elevation?"]
+
+    # A full rerun draws every message once, in the history rather than the fragment
+    drawn.clear()
+    at.run()
+    assert drawn == [message["content"] for message in at.session_state.messages]
+
+
+def test_the_fragment_hands_its_turns_to_the_history_once_it_holds_enough(monkeypatch):
+    at, drawn = chat_app(monkeypatch)
+    at.run()
+    for turn in range(chat_page.fragment_messages // 2):
+        assert at.session_state.history_drawn == 6
+        at.session_state.fragment_rerun = True
+        at.chat_input[0].set_value(f"Question {turn}?").run()
+    # The last send filled the fragment and asked for a full rerun, which drew the history again
+    assert at.session_state.history_drawn == len(at.session_state.messages)
@@ -0,0 +1,37 @@
+import time
+
+from evaluation_cache import EvaluationCache
+
+case_study = "A 54-year-old man with chest pain."
+messages = [{"role": "user", "content": "Should I order an ECG?"},
+            {"role": "assistant", "content": "Yes, and a troponin."}]
+
+
+def test_the_key_changes_with_everything_that_shapes_an_evaluation():
+    key = EvaluationCache.key_for(case_study, messages, "model", 1)
+    assert EvaluationCache.key_for(case_study, [dict(m) for m in messages], "model", 1) == key
+    # Fields other than role and content, such as references, do not count
+    assert EvaluationCache.key_for(case_study, [dict(messages[0], references=[]), messages[1]], "model", 1) == key
+    assert EvaluationCache.key_for(case_study, messages, "model", 2) != key
+    assert EvaluationCache.key_for(case_study, messages, "other-model", 1) != key
+    assert EvaluationCache.key_for(case_study + " ", messages, "model", 1) != key
+    assert EvaluationCache.key_for(case_study, messages[:1], "model", 1) != key
+
+
+def test_a_new_prompt_version_misses_the_old_evaluation():
+    cache = EvaluationCache()
+    cache.put(EvaluationCache.key_for(case_study, messages, "model", 1), '{"Score": 7}')
+    assert EvaluationCache().get(EvaluationCache.key_for(case_study, messages, "model", 1)) == '{"Score": 7}'
+    assert cache.get(EvaluationCache.key_for(case_study, messages, "model", 2)) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_invalidate_and_the_size_bound():
+    cache = EvaluationCache(max_entries=2)
+    for content in ("a", "b", "c"):
+        cache.put(content, content)
+        time.sleep(0.01)
+    assert cache.get("a") is None
+    cache.invalidate("b")
+    assert cache.get("b") is None
+    assert cache.get("c") == "c"
@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+from json_stream import IncrementalObjectParser, parse_object_tolerant
+
+fixture_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "benchmarks", "fixtures", "evaluation_outputs.json")
+with open(fixture_path, encoding="utf-8") as f:
+    outputs = json.load(f)["outputs"]
+
+
+@pytest.mark.parametrize("output", outputs, ids=[output["name"] for output in outputs])
+def test_recorded_outputs_keep_every_member_that_parses(output):
+    assert len(parse_object_tolerant(output["text"])) == output["expected_members"]
+
+
+@pytest.mark.parametrize("output", outputs, ids=[output["name"] for output in outputs])
+def test_streaming_in_small_chunks_gives_the_same_members(output):
+    parser = IncrementalObjectParser()
+    members = []
+    for start in range(0, len(output["text"]), 3):
+        members += parser.feed(output["text"][start:start + 3])
+    members += parser.finish()
+    assert dict(members) == parse_object_tolerant(output["text"])
+
+
+def test_members_are_emitted_as_soon_as_they_close():
+    parser = IncrementalObjectParser()
+    assert parser.feed('Here you go: {"a": {"Score": 7, "Comments": "ok, fine"}') == []
+    assert parser.feed(', "b"') == [("a", {"Score": 7, "Comments": "ok, fine"})]
+    assert parser.feed(': "x}"}') == [("b", "x}")]
+    assert parser.feed(' {"c": 1}') == []
+
+
+def test_a_truncated_tail_is_salvaged():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"a": 1, "Feedback": "Good work on the') == [("a", 1)]
+    assert parser.finish() == [("Feedback", "Good work on the")]
+
+
+def test_a_broken_member_is_dropped_without_losing_the_others():
+    assert parse_object_tolerant('{"a": 1, "b": nope, "c": [1, 2]}') == {"a": 1, "c": [1, 2]}
+
+
+def test_escaped_quotes_do_not_end_a_string():
+    text = r'{"a": "she said \"stop, now}\" twice", "b": 2}'
+    parser = IncrementalObjectParser()
+    members = []
+    for char in text:
+        members += parser.feed(char)
+    assert members == [("a", 'she said "stop, now}" twice'), ("b", 2)]
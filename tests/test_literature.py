@@ -0,0 +1,66 @@
+import threading
+
+from literature import LiteratureRetriever, extract_terms, stopwords
+from pubmed_requests import ArticleRecord
+
+
+class BlockingClient:
+    """PubMed client stand-in whose searches wait until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.queries = []
+
+    def search_articles(self, query):
+        self.queries.append(query)
+        self.release.wait(5)
+        return [ArticleRecord("1", f"On {query}", None)]
+
+    def generate_pubmed_urls(self, pmids):
+        return [f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" for pmid in pmids]
+
+
+def test_cancelling_one_caller_keeps_the_lookup_for_others():
+    client = BlockingClient()
+    retriever = LiteratureRetriever(client, max_workers=1)
+    # Occupies the only worker, so the next lookup stays queued
+    busy = retriever.submit(("sepsis",))
+    first = retriever.submit(("troponin",))
+    second = retriever.submit(("troponin",))
+    assert first is not second
+    assert first.cancel()
+    client.release.set()
+    assert second.result(5) == [{"title": "On troponin", "url": "https://pubmed.ncbi.nlm.nih.gov/1/"}]
+    assert busy.result(5)
+    assert first.cancelled()
+
+
+def test_lookup_is_cancelled_once_every_caller_withdraws():
+    client = BlockingClient()
+    retriever = LiteratureRetriever(client, max_workers=1)
+    busy = retriever.submit(("sepsis",))
+    callers = [retriever.submit(("troponin",)) for _ in range(2)]
+    assert all(caller.cancel() for caller in callers)
+    client.release.set()
+    busy.result(5)
+    retriever.executor.shutdown(wait=True)
+    assert client.queries == ["sepsis"]
+
+
+def test_running_lookup_cannot_be_cancelled():
+    client = BlockingClient()
+    retriever = LiteratureRetriever(client)
+    future = retriever.submit(("troponin",))
+    while not client.queries:
+        threading.Event().wait(0.01)
+    assert not future.cancel()
+    client.release.set()
+    assert future.result(5)
+    # A finished lookup is served from the results cache
+    assert retriever.submit(("troponin",)).result(0) == future.result()
+
+
+def test_extract_terms_skips_stopwords_and_favours_the_message():
+    terms = extract_terms("Patient presents with chest pain and elevated troponin.", "Should I order troponin?")
+    assert terms[0] == "troponin"
+    assert not set(terms) & stopwords
@@ -0,0 +1,72 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import llm_backend
+from llm_backend import GroqBackend, create_backend
+from llm_gateway import LLMGateway
+from llm_metrics import LLMMetrics
+from mock_llm_server import classify, default_responses_path, start_server, token_pattern
+
+
+def rate_limited(retry_after):
+    return SimpleNamespace(response=SimpleNamespace(headers={"retry-after": retry_after}))
+
+
+@pytest.mark.parametrize("retry_after, delay", [("2", 2.0), ("0.5", 0.5), ("3600", llm_backend.max_retry_after)])
+def test_retry_after_is_honoured_up_to_the_cap(retry_after, delay):
+    assert GroqBackend("key").retry_delay(rate_limited(retry_after), 0) == delay
+
+
+@pytest.mark.parametrize("retry_after", [None, "soon", "Wed, 21 Oct 2026 07:28:00 GMT", "-1", "nan", "inf"])
+def test_an_unusable_retry_after_falls_back_to_backoff(retry_after, monkeypatch):
+    monkeypatch.setattr(llm_backend.random, "uniform", lambda low, high: 1.0)
+    assert GroqBackend("key").retry_delay(rate_limited(retry_after), 2) == llm_backend.retry_backoff * 4
+
+
+@pytest.fixture(scope="module")
+def mock_server():
+    server = start_server(port=0, ttft=0, tokens_per_second=100000)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def gateway(mock_server):
+    backend = create_backend({"backend": "mock", "base_url": f"http://127.0.0.1:{mock_server.server_address[1]}"},
+                             None)
+    return LLMGateway(backend, limits={}, metrics=LLMMetrics())
+
+
+with open(default_responses_path, encoding="utf-8") as f:
+    recorded = json.load(f)
+
+
+def test_requests_are_answered_with_the_matching_kind_of_recording():
+    assert classify([{"role": "user", "content": "Generate 3 case studies for a Beginner level doctor"}]) == \
+        "case_studies"
+    assert classify([{"role": "system", "content": "Return the evaluation as JSON."}]) == "evaluation"
+    assert classify([{"role": "system", "content": "You are a senior doctor."}]) == "chat"
+    assert classify([]) == "chat"
+
+
+def test_the_app_backend_streams_and_completes_against_the_mock(gateway):
+    messages = [{"role": "system", "content": "You are a senior doctor."}, {"role": "user", "content": "ECG?"}]
+    streamed = "".join(gateway.stream(messages, "mock-model", label="stream"))
+    completed = gateway.complete(messages, "mock-model", coalesce=False, label="complete")
+    # Recordings are replayed in turn
+    assert {streamed, completed} <= set(recorded["chat"])
+    assert streamed != completed or len(recorded["chat"]) == 1
+    rows = {row["operation"]: row for row in gateway.metrics.snapshot()}
+    assert rows["stream"]["completion_tokens"] == len(token_pattern.findall(streamed))
+    assert rows["complete"]["completion_tokens"] == len(token_pattern.findall(completed))
+    # The mock counts prompt tokens the way it splits replies: "You are a senior doctor." and "ECG?"
+    assert rows["stream"]["prompt_tokens"] == 6
+
+
+def test_max_tokens_cuts_the_reply_short(gateway):
+    reply = gateway.complete([{"role": "user", "content": "Generate 3 case studies for Cardiology"}], "mock-model",
+                             max_tokens=5, coalesce=False)
+    assert len(token_pattern.findall(reply)) == 5
+    assert any(text.startswith(reply) for text in recorded["case_studies"])
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_backend import LLMBackend
+from llm_gateway import LLMGateway, stream_buffer
+from llm_metrics import LLMMetrics
+
+model = "test-model"
+
+
+class FakeBackend(LLMBackend):
+    """Streams a few deltas with a pause between them; completions return at once."""
+
+    def __init__(self, pause=0.2, fail_first=0, deltas=("one ", "two ", "three")):
+        self.pause = pause
+        self.fail_first = fail_first
+        self.deltas = deltas
+        self.calls = 0
+
+    async def complete(self, messages, model, max_tokens=None, usage=None):
+        self.calls += 1
+        if usage is not None:
+            usage(12, 1)
+        return "done"
+
+    async def stream(self, messages, model, max_tokens=None, usage=None):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            raise ConnectionError("dropped")
+        for text in self.deltas:
+            yield text
+            await asyncio.sleep(self.pause)
+        if usage is not None:
+            usage(7, 3)
+
+    def is_retryable(self, error):
+        return isinstance(error, ConnectionError)
+
+    def retry_delay(self, error, attempt):
+        return 0
+
+
+def make_gateway(backend):
+    return LLMGateway(backend, limits={model: {"concurrency": 1, "tokens_per_minute": 10**9}},
+                      metrics=LLMMetrics())
+
+
+def test_stream_holds_its_slot_while_the_provider_streams():
+    gateway = make_gateway(FakeBackend())
+    stream = gateway.stream([{"role": "user", "content": "hi"}], model)
+    assert next(stream) == "one "
+    waiting = gateway.submit_complete([{"role": "user", "content": "other"}], model, coalesce=False)
+    time.sleep(0.1)
+    # The only slot belongs to the stream the provider is still generating
+    assert not waiting.done()
+    assert "".join(stream) == "two three"
+    assert waiting.result(2) == "done"
+
+
+def test_a_slow_reader_keeps_the_slot_after_the_provider_could_finish():
+    deltas = [f"{i} " for i in range(3 * stream_buffer)]
+    gateway = make_gateway(FakeBackend(pause=0, deltas=deltas))
+    stream = gateway.stream([{"role": "user", "content": "hi"}], model)
+    assert next(stream) == "0 "
+    waiting = gateway.submit_complete([{"role": "user", "content": "other"}], model, coalesce=False)
+    time.sleep(0.1)
+    # The provider is stalled on the full buffer rather than finished
+    assert not waiting.done()
+    assert list(stream) == deltas[1:]
+    assert waiting.result(2) == "done"
+
+
+def test_abandoned_stream_releases_its_slot():
+    gateway = make_gateway(FakeBackend(pause=5))
+    stream = gateway.stream([{"role": "user", "content": "hi"}], model)
+    assert next(stream) == "one "
+    stream.close()
+    assert gateway.complete([{"role": "user", "content": "other"}], model, coalesce=False) == "done"
+
+
+def test_stream_is_retried_before_the_first_delta():
+    backend = FakeBackend(pause=0, fail_first=1)
+    gateway = make_gateway(backend)
+    assert "".join(gateway.stream([{"role": "user", "content": "hi"}], model)) == "one two three"
+    assert gateway.retries == 1
+
+
+def test_identical_completions_are_merged():
+    backend = FakeBackend()
+    gateway = make_gateway(backend)
+    messages = [{"role": "user", "content": "same"}]
+    futures = [gateway.submit_complete(messages, model) for _ in range(3)]
+    assert [future.result(2) for future in futures] == ["done"] * 3
+    assert backend.calls + gateway.coalesced == 3
+
+
+def test_failure_reaches_the_caller():
+    class Broken(FakeBackend):
+        async def complete(self, messages, model, max_tokens=None, usage=None):
+            raise ValueError("bad request")
+
+    gateway = make_gateway(Broken())
+    with pytest.raises(ValueError):
+        gateway.complete([{"role": "user", "content": "hi"}], model)
+
+
+def test_reported_usage_is_recorded():
+    gateway = make_gateway(FakeBackend(pause=0))
+    gateway.complete([{"role": "user", "content": "hi"}], model, label="complete")
+    "".join(gateway.stream([{"role": "user", "content": "hi"}], model, label="stream"))
+    rows = {row["operation"]: row for row in gateway.metrics.snapshot()}
+    assert (rows["complete"]["prompt_tokens"], rows["complete"]["completion_tokens"]) == (12, 1)
+    assert (rows["stream"]["prompt_tokens"], rows["stream"]["completion_tokens"]) == (7, 3)
+    assert rows["stream"]["chunks"] == 3
+    assert 'medilearn_llm_completion_tokens_total{operation="stream",model="test-model"} 3' in \
+        gateway.metrics.prometheus_text()
+
+
+def test_serve_workers_split_the_model_limits(monkeypatch):
+    monkeypatch.setenv("MEDILEARN_WORKERS", "4")
+    gateway = LLMGateway(FakeBackend(), limits={model: {"concurrency": 6, "tokens_per_minute": 30000}},
+                         metrics=LLMMetrics())
+    semaphore, bucket = gateway._limits(model)
+    assert semaphore._value == 1
+    assert bucket.capacity == 7500
@@ -0,0 +1,68 @@
+import numpy as np
+
+from case_bank import CaseBank
+from case_diversity import CaseDiversityIndex
+from minhash import MinHasher, MinHashIndex, similarity
+
+base = ("A 54-year-old man presents with crushing central chest pain radiating to the left arm for two hours, "
+        "with diaphoresis and nausea. ECG shows ST elevation in leads V1 to V4 and troponin is raised.")
+reworded = base.replace("two hours", "three hours").replace("nausea", "vomiting")
+different = ("A 7-year-old girl has a barking cough, inspiratory stridor and a low-grade fever that began "
+             "overnight after two days of coryza; she is alert and drinking well.")
+
+
+def test_signature_similarity_tracks_overlap():
+    hasher = MinHasher()
+    signature = hasher.signature(base)
+    assert signature.dtype == np.uint32 and len(signature) == hasher.num_perm
+    assert similarity(signature, hasher.signature(base)) == 1.0
+    assert similarity(signature, hasher.signature(reworded)) > 0.5
+    assert similarity(signature, hasher.signature(different)) < 0.2
+
+
+def test_index_finds_near_duplicates_only():
+    hasher = MinHasher()
+    index = MinHashIndex(hasher.num_perm)
+    index.add("base", hasher.signature(base))
+    index.add("different", hasher.signature(different))
+    assert [key for key, _ in index.query(hasher.signature(reworded), 0.5)] == ["base"]
+    index.remove("base")
+    assert "base" not in index and len(index) == 1
+    assert index.query(hasher.signature(reworded), 0.5) == []
+
+
+def test_version_changes_with_the_hasher():
+    assert MinHasher().version == MinHasher().version
+    assert MinHasher(num_perm=32).version != MinHasher().version
+    assert MinHasher(seed=2).version != MinHasher().version
+
+
+def test_bank_signed_by_another_version_is_resigned():
+    hasher = MinHasher()
+    bank = CaseBank()
+    case_id = bank.add("Cardiology", "Beginner", base, np.zeros(hasher.num_perm, dtype=np.uint32))
+    bank._conn.execute("INSERT INTO meta (key, value) VALUES ('signature_version', '1/64/1')")
+    bank._conn.commit()
+    assert bank.ensure_signatures(hasher) == 1
+    assert bank.signature_version() == hasher.version
+    assert np.array_equal(dict(bank.signatures())[case_id], hasher.signature(base))
+    assert bank.ensure_signatures(hasher) == 0
+
+
+def test_diversity_index_drops_signatures_of_another_version():
+    index = CaseDiversityIndex()
+    seen = set()
+    assert index.drop_repeats([base], seen) == [base]
+    assert CaseDiversityIndex().drop_repeats([reworded], seen) == []
+    index._conn.execute("UPDATE meta SET value = 'old' WHERE key = 'signature_version'")
+    index._conn.commit()
+    assert len(CaseDiversityIndex().index) == 0
+
+
+def test_cases_marked_seen_are_not_checked_but_catch_later_repeats():
+    index = CaseDiversityIndex()
+    seen = set()
+    index.mark_seen([base], seen)
+    assert index.checked == 0
+    assert index.drop_repeats([reworded], seen) == []
+    assert (index.checked, index.repeats) == (1, 1)
@@ -0,0 +1,39 @@
+from chat_context import estimate_tokens
+from prompt_cache import PrefixCache
+
+system = {"role": "system", "content": "You are a senior doctor. Case Study: chest pain."}
+question = {"role": "user", "content": "Should I order an ECG?"}
+answer = {"role": "assistant", "content": "Yes, and a troponin."}
+
+
+def tokens(*messages):
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+
+def test_the_longest_prefix_already_sent_is_counted_as_reused():
+    cache = PrefixCache()
+    assert cache.account([system, question]) == {"prompt_tokens": tokens(system, question), "reused_tokens": 0}
+    follow_up = {"role": "user", "content": "What does the ECG show?"}
+    assert cache.account([system, question, answer, follow_up]) == {
+        "prompt_tokens": tokens(system, question, answer, follow_up),
+        "reused_tokens": tokens(system, question),
+    }
+    stats = cache.stats()
+    assert (stats["requests"], stats["reused_tokens"]) == (2, tokens(system, question))
+    assert stats["reuse_ratio"] == stats["reused_tokens"] / stats["prompt_tokens"]
+
+
+def test_a_prefix_matches_only_with_the_same_messages_before_it():
+    cache = PrefixCache()
+    cache.account([system, question])
+    other_case = {"role": "system", "content": "You are a senior doctor. Case Study: headache."}
+    assert cache.account([other_case, question])["reused_tokens"] == 0
+    # The same text under another role is a different message
+    assert cache.account([system, dict(question, role="assistant")])["reused_tokens"] == tokens(system)
+
+
+def test_the_least_recently_used_prefixes_are_evicted():
+    cache = PrefixCache(max_entries=2)
+    cache.account([system, question])
+    cache.account([{"role": "system", "content": "Another case."}])
+    assert cache.account([system, question])["reused_tokens"] == 0
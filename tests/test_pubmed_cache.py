@@ -0,0 +1,49 @@
+import time
+
+from pubmed_requests import ArticleRecord, ArticleStore, PubMedClient, QueryCache, normalize_query
+
+
+def record(pmid):
+    return ArticleRecord(pmid, f"Title {pmid}", f"Abstract {pmid}.", "BMJ", "2024", ("Smith J", "Lee K"))
+
+
+def test_trivially_different_queries_normalize_alike():
+    assert normalize_query("  Febrile   SEIZURE recurrence? ") == normalize_query("febrile seizure recurrence")
+
+
+def test_query_cache_entries_expire_and_the_oldest_are_evicted():
+    cache = QueryCache(ttl=0.05, max_entries=2)
+    cache.put("a", ["1"])
+    cache.put("b", ["2"])
+    assert cache.get("a") == ["1"]
+    cache.put("c", ["3"])
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"]
+    time.sleep(0.1)
+    assert cache.get("c") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_article_records_round_trip_through_the_store():
+    ArticleStore().put_many([record("11"), record("12")])
+    found = ArticleStore().get_many(["11", "12", "13"])
+    assert sorted(found) == ["11", "12"]
+    assert found["11"].to_dict() == record("11").to_dict()
+
+
+def test_the_client_only_asks_ncbi_for_what_it_has_not_cached():
+    searches, fetches = [], []
+    client = PubMedClient(query_cache=QueryCache(), article_store=ArticleStore())
+    client._search = lambda query: searches.append(query) or ["1", "2", "3"]
+    client._fetch_details = lambda article_ids: fetches.append(list(article_ids)) or [record(i) for i in article_ids]
+
+    assert client.fetch_articles("Febrile seizure") == ["1", "2", "3"]
+    assert client.fetch_articles("febrile  seizure.") == ["1", "2", "3"]
+    assert searches == ["Febrile seizure"]
+
+    client.fetch_article_details(["1", "2"])
+    articles = client.fetch_article_details(["2", "3", "1"])
+    assert [article.pmid for article in articles] == ["2", "3", "1"]
+    assert fetches == [["1", "2"], ["3"]]
+    client.close()
@@ -0,0 +1,44 @@
+from pubmed_index import ArticleIndex, fts_query
+from pubmed_requests import ArticleRecord, PubMedClient
+
+
+def record(pmid, title, abstract):
+    return ArticleRecord(pmid, title, abstract)
+
+
+def test_search_needs_every_term_and_ranks_title_matches_first():
+    index = ArticleIndex()
+    index.add([record("1", "Outcomes of cardiac surgery", "Febrile seizure recurrence was rare."),
+               record("2", "Febrile seizure recurrence in toddlers", "A cohort study."),
+               record("3", "Febrile illness", "No seizures were recorded.")])
+    assert index.search("febrile seizure recurrence") == ["2", "1"]
+    # Porter stemming matches "seizures" too
+    assert sorted(index.search("febrile seizures")) == ["1", "2", "3"]
+    assert index.search("febrile seizures", limit=1) == ["2"]
+    assert index.search("") == []
+
+
+def test_re_adding_an_article_replaces_its_row():
+    index = ArticleIndex()
+    index.add([record("7", "Old title", "Asthma in adults.")])
+    index.add([record("7", "New title", "Bronchiolitis in infants."), record("not-a-pmid", "x", "Asthma")])
+    assert index.count() == 1
+    assert index.search("asthma") == []
+    assert index.search("bronchiolitis") == ["7"]
+
+
+def test_fts_syntax_in_a_query_is_treated_as_text():
+    assert fts_query('seizure" OR title:* NEAR(') == '"seizure" "or" "title" "near"'
+    index = ArticleIndex()
+    index.add([record("1", "Seizure or syncope", "Title near the end.")])
+    assert index.search('seizure" OR title:* NEAR(') == ["1"]
+
+
+def test_the_client_answers_from_the_index_before_asking_ncbi():
+    index = ArticleIndex()
+    index.add([record(str(pmid), f"Kawasaki disease case {pmid}", "Coronary aneurysm.") for pmid in range(1, 4)])
+    client = PubMedClient(max_results=3, article_index=index)
+    client.fetch_articles = lambda query: (_ for _ in ()).throw(AssertionError("NCBI asked"))
+    client._fetch_shared = lambda article_ids: [record(i, "t", "a") for i in article_ids]
+    assert sorted(article.pmid for article in client.search_articles("kawasaki disease")) == ["1", "2", "3"]
+    client.close()
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pubmed_requests
+from pubmed_requests import PubMedClient, RateLimiter
+
+
+def test_burst_then_rate():
+    limiter = RateLimiter(20, burst=2)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    # Two from the burst, then two more at 20 per second
+    assert 0.08 <= time.monotonic() - started < 0.5
+
+
+def test_rate_below_one_per_second_returns():
+    limiter = RateLimiter(30 / 60)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), done.set()), daemon=True)
+    thread.start()
+    assert done.wait(1), "the first request must not wait for a token the bucket cannot hold"
+    assert limiter.capacity == 1
+
+
+def test_rate_below_one_per_second_spaces_requests(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(pubmed_requests.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(pubmed_requests.time, "sleep", sleep)
+    limiter = RateLimiter(0.5)
+    for _ in range(3):
+        limiter.acquire()
+    assert clock[0] == 4.0
+    assert sleeps == [2.0, 2.0]
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_retry_after_is_capped_and_counts_as_an_attempt(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(pubmed_requests.time, "sleep", sleeps.append)
+    client = PubMedClient(max_retries=2)
+    responses = [FakeResponse(429, {"Retry-After": "3600"}) for _ in range(3)]
+    client.session = FakeSession(responses)
+    response = client._get(client.base_url_search, {})
+    client.close()
+    assert response.status_code == 429
+    assert client.session.calls == 3
+    assert sleeps == [pubmed_requests.max_retry_after] * 2
+    # Retried responses give their connection back; the returned one is left to the caller
+    assert [r.closed for r in responses] == [True, True, False]
+
+
+def test_serve_workers_split_the_ncbi_limit(monkeypatch):
+    monkeypatch.setenv("MEDILEARN_WORKERS", "4")
+    assert PubMedClient().rate_limiter.rate == pubmed_requests.ncbi_rate_limit / 4
+    assert PubMedClient(api_key="key").rate_limiter.rate == pubmed_requests.ncbi_rate_limit_with_key / 4
@@ -0,0 +1,98 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import storage
+from score_warehouse import (ScoreWarehouse, score_columns, select, score_percentiles, specialization_heatmap,
+                             learner_summary, learner_history, week)
+
+
+def sample_warehouse(rows=500, seed=3):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(1, 11, size=(rows, len(score_columns))).astype(float)
+    scores[rng.random(scores.shape) < 0.05] = np.nan
+    warehouse = ScoreWarehouse()
+    warehouse.append_many([f"l{i}" for i in rng.integers(0, 20, rows)],
+                          rng.choice(["Cardiology", "Neurology", "Pediatrics"], rows),
+                          rng.choice(["Beginner", "Expert"], rows), scores,
+                          rng.integers(2, 40, rows), np.sort(rng.uniform(0, 10 * week, rows)))
+    return warehouse
+
+
+def test_rows_survive_a_reopen_and_a_torn_append_is_ignored():
+    warehouse = sample_warehouse(rows=10)
+    # An append that died after writing scores but before committing meta.json
+    with open(warehouse._path("scores.bin"), "ab") as f:
+        f.write(b"\0" * 24)
+    reopened = ScoreWarehouse()
+    assert reopened.rows == 10
+    assert reopened.dictionaries == warehouse.dictionaries
+    np.testing.assert_array_equal(reopened.columns()["scores"][:], warehouse.columns()["scores"][:])
+    reopened.append("l99", "Cardiology", "Expert", [5] * len(score_columns))
+    assert ScoreWarehouse().columns()["learner"][-1] == ScoreWarehouse().code("learner", "l99")
+
+
+def test_group_bys_match_plain_numpy():
+    warehouse = sample_warehouse()
+    columns = warehouse.columns()
+    cardiology = warehouse.code("specialization", "Cardiology")
+    mask = select(columns, specialization=cardiology)
+    overall = columns["scores"][:, -1].astype(float)
+
+    np.testing.assert_allclose(score_percentiles(columns, mask),
+                               np.nanpercentile(columns["scores"][mask].astype(float), (10, 25, 50, 75, 90), axis=0))
+
+    specializations, difficulties = (len(warehouse.dictionaries[name]) for name in ("specialization", "difficulty"))
+    means, counts = specialization_heatmap(columns, select(columns), specializations, difficulties)
+    for s in range(specializations):
+        for d in range(difficulties):
+            cell = overall[(columns["specialization"] == s) & (columns["difficulty"] == d)]
+            assert counts[s, d] == np.count_nonzero(~np.isnan(cell))
+            np.testing.assert_allclose(means[s, d], np.nanmean(cell))
+
+    summary = learner_summary(columns, mask)
+    first = columns["evaluated_at"][mask & ~np.isnan(overall)].min()
+    for learner, mean, latest, slope in zip(summary["learner"], summary["mean"], summary["latest"], summary["slope"]):
+        rows = mask & (columns["learner"] == learner) & ~np.isnan(overall)
+        times, values = columns["evaluated_at"][rows], overall[rows]
+        np.testing.assert_allclose(mean, values.mean())
+        assert latest == values[np.argmax(times)]
+        if len(values) > 1:
+            np.testing.assert_allclose(slope, np.polyfit((times - first) / week, values, 1)[0], atol=1e-9)
+
+    learner = summary["learner"][0]
+    times, scores = learner_history(columns, learner)
+    assert (np.diff(times) >= 0).all()
+    assert len(scores) == np.count_nonzero(columns["learner"] == learner)
+
+
+def record(worker, batches, rows):
+    warehouse = ScoreWarehouse()
+    for batch in range(batches):
+        learners = [f"w{worker}-l{row % 3}" for row in range(rows)]
+        scores = [[worker] * len(score_columns)] * rows
+        warehouse.append_many(learners, ["Cardiology"] * rows, ["Easy"] * rows, scores,
+                              [batch] * rows, [float(batch)] * rows)
+
+
+@pytest.mark.skipif(storage.fcntl is None, reason="the append lock needs fcntl")
+def test_appends_from_several_processes_are_all_committed():
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=record, args=(worker, 20, 7)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    warehouse = ScoreWarehouse()
+    columns = warehouse.columns()
+    assert warehouse.rows == 4 * 20 * 7
+    learners = warehouse.dictionaries["learner"]
+    assert sorted(learners) == sorted(f"w{worker}-l{row}" for worker in range(4) for row in range(3))
+    # Every row keeps the learner and scores its own process wrote
+    names = np.array(learners)[columns["learner"][:]]
+    writers = np.array([int(name[1:name.index("-")]) for name in names])
+    assert (columns["scores"][:, 0] == writers).all()
+    assert np.bincount(writers).tolist() == [140] * 4
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import serve
+
+
+class CrashingWorker(serve.Worker):
+    """A worker whose process has always exited already."""
+
+    class Exited:
+        returncode = 1
+
+        def poll(self):
+            return self.returncode
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.starts.append(self.started_at)
+        self.process = self.Exited()
+
+
+def test_a_worker_that_keeps_exiting_is_restarted_with_backoff_then_given_up(monkeypatch):
+    monkeypatch.setattr(serve, "restart_delay", 0.02)
+    monkeypatch.setattr(serve, "max_restarts", 3)
+    monkeypatch.setattr(serve, "poll_interval", 0.002)
+    worker = CrashingWorker(0, 0)
+    worker.starts = []
+    worker.start()
+    assert asyncio.run(serve.supervise([worker], asyncio.Event())) is False
+    assert worker.restarts == 3
+    gaps = [later - earlier for earlier, later in zip(worker.starts, worker.starts[1:])]
+    for gap, delay in zip(gaps, [0.02, 0.04, 0.08]):
+        assert delay <= gap < delay + 0.015
+
+
+def test_a_worker_that_stayed_up_starts_its_backoff_again(monkeypatch):
+    monkeypatch.setattr(serve, "restart_delay", 0.01)
+    monkeypatch.setattr(serve, "max_restarts", 1)
+    monkeypatch.setattr(serve, "poll_interval", 0.002)
+    worker = CrashingWorker(0, 0)
+    worker.starts = []
+    worker.start()
+    # Already restarted as often as allowed, but then up for longer than healthy_uptime
+    worker.restarts = 1
+    worker.started_at -= serve.healthy_uptime
+    assert asyncio.run(serve.supervise([worker], asyncio.Event())) is False
+    # Restarted once more; only the quick exit after that ends the launcher
+    assert len(worker.starts) == 2
+    assert worker.restarts == 1
@@ -0,0 +1,46 @@
+from session_store import MemorySessionStore, SQLiteSessionStore, case_id_for
+
+import pytest
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request):
+    return SQLiteSessionStore() if request.param == "sqlite" else MemorySessionStore()
+
+
+def test_state_is_merged(store):
+    assert store.load_state("s1") is None
+    store.update_state("s1", {"page": "chat_page", "owner": "abc"})
+    store.update_state("s1", {"page": "evaluation"})
+    assert store.load_state("s1") == {"page": "evaluation", "owner": "abc"}
+
+
+def test_cases_are_stored_once_by_content(store):
+    ids = store.put_cases(["Case A", "Case B"])
+    assert ids == [case_id_for("Case A"), case_id_for("Case B")]
+    assert store.put_cases(["Case A"]) == ids[:1]
+    assert store.get_case(ids[1]) == "Case B"
+    assert store.get_case("missing") is None
+
+
+def test_transcript_ranges_and_references(store):
+    store.update_state("s1", {})
+    for seq in range(5):
+        store.append_message("s1", seq, {"role": "user" if seq % 2 == 0 else "assistant", "content": f"m{seq}"})
+    store.set_references("s1", 1, [{"title": "T", "url": "U"}])
+    assert store.message_count("s1") == 5
+    assert [m["content"] for m in store.load_messages("s1", 2)] == ["m2", "m3", "m4"]
+    assert [m["content"] for m in store.load_messages("s1", 0, 2)] == ["m0", "m1"]
+    assert store.load_messages("s1", 1, 2)[0]["references"] == [{"title": "T", "url": "U"}]
+
+
+def test_appending_at_an_earlier_seq_replaces_the_rest_of_the_transcript(store):
+    store.update_state("s1", {})
+    for seq in range(4):
+        store.append_message("s1", seq, {"role": "user", "content": f"m{seq}"})
+    store.append_message("s1", 2, {"role": "user", "content": "edited"})
+    assert store.message_count("s1") == 3
+    assert [m["content"] for m in store.load_messages("s1")] == ["m0", "m1", "edited"]
+    with pytest.raises(ValueError):
+        store.append_message("s1", 5, {"role": "user", "content": "gap"})
+    assert store.message_count("s1") == 3
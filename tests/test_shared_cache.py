@@ -0,0 +1,164 @@
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import shared_cache
+from shared_cache import RedisSharedCache, SQLiteSharedCache
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(shared_cache, "poll_interval", 0.01)
+
+
+def test_a_lease_is_held_by_one_worker_until_released():
+    # Each instance has its own connection, like a worker process
+    first, second = SQLiteSharedCache(), SQLiteSharedCache()
+    token = first.acquire("k")
+    assert token is not None
+    assert second.acquire("k") is None
+    assert not second.acquire_possible("k")
+    first.release("k", token)
+    assert second.acquire_possible("k")
+    with second.lease("k") as held:
+        assert held
+        with first.lease("k") as also_held:
+            assert not also_held
+
+
+def test_a_lapsed_lease_is_taken_over():
+    first, second = SQLiteSharedCache(), SQLiteSharedCache()
+    assert first.acquire("k", lease=0.05) is not None
+    time.sleep(0.1)
+    assert second.acquire("k") is not None
+
+
+def test_one_worker_computes_while_the_others_wait():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"answer": 42}
+
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(SQLiteSharedCache().get_or_compute("k", compute)))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert results == [{"answer": 42}] * 4
+    assert len(calls) == 1
+
+
+def test_a_waiter_takes_over_when_the_leader_fails():
+    leader, waiter = SQLiteSharedCache(), SQLiteSharedCache()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("provider down")
+
+    def lead():
+        with pytest.raises(RuntimeError):
+            leader.get_or_compute("k", fail)
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    started.wait()
+    assert waiter.get_or_compute("k", lambda: "recomputed") == "recomputed"
+    thread.join()
+    assert waiter.counts["computed"] == 1
+    assert leader.get("k") == "recomputed"
+
+
+class StubRedis:
+    """The few Redis commands RedisSharedCache uses, on one dict shared by every client."""
+
+    def __init__(self):
+        self.values = {}
+
+    def _live(self, key):
+        value, expires = self.values.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+    def get(self, key):
+        return self._live(key)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        ttl = ex if ex is not None else None if px is None else px / 1000
+        self.values[key] = (value.encode() if isinstance(value, str) else value,
+                            None if ttl is None else time.monotonic() + ttl)
+        return True
+
+    def exists(self, key):
+        return int(self._live(key) is not None)
+
+    def register_script(self, script):
+        assert "redis.call('get', KEYS[1]) == ARGV[1]" in script
+
+        def release(keys, args):
+            if self._live(keys[0]) == args[0].encode():
+                del self.values[keys[0]]
+                return 1
+            return 0
+        return release
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = StubRedis()
+    urls = []
+
+    def from_url(url):
+        urls.append(url)
+        return server
+
+    monkeypatch.setitem(sys.modules, "redis", types.SimpleNamespace(Redis=types.SimpleNamespace(from_url=from_url)))
+    server.urls = urls
+    return server
+
+
+def test_the_redis_backend_shares_values_and_leases_between_workers(redis_server):
+    first, second = RedisSharedCache("redis://cache:6379/1"), RedisSharedCache("redis://cache:6379/1")
+    assert redis_server.urls == ["redis://cache:6379/1"] * 2
+    first.set("k", {"answer": 42})
+    assert second.get("k") == {"answer": 42}
+    assert "medilearn:k" in redis_server.values
+
+    token = first.acquire("lease-key")
+    assert token is not None
+    assert second.acquire("lease-key") is None
+    assert not second.acquire_possible("lease-key")
+    # Releasing with someone else's token leaves the lease in place
+    second.release("lease-key", "not-the-token")
+    assert not second.acquire_possible("lease-key")
+    first.release("lease-key", token)
+    assert second.get_or_compute("lease-key", lambda: "computed") == "computed"
+    assert first.get("lease-key") == "computed"
+
+
+def test_redis_values_and_leases_expire(redis_server):
+    cache = RedisSharedCache()
+    # Redis expiries are whole seconds, so a shorter ttl still keeps the value for one
+    cache.set("k", "v", ttl=0.05)
+    assert redis_server.values["medilearn:k"][1] - time.monotonic() > 0.9
+    assert cache.acquire("lease-key", lease=0.05) is not None
+    time.sleep(0.1)
+    assert cache.acquire("lease-key") is not None
+
+
+def test_the_redis_backend_says_which_package_is_missing(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", None)
+    with pytest.raises(ImportError, match="pip install redis"):
+        shared_cache.create_shared_cache({"backend": "redis"})
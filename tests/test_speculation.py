@@ -0,0 +1,36 @@
+from concurrent.futures import Future
+
+import speculation
+from speculation import Speculator
+
+
+def finished(text):
+    future = Future()
+    future.set_result(text)
+    return future
+
+
+def test_speculations_of_one_kind_are_spaced_out(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(speculation.time, "monotonic", lambda: now[0])
+    speculator = Speculator(min_interval=30)
+    assert speculator.submit("s1", "evaluation", "k1", lambda: finished("one"), 10, 10)
+    now[0] += 10
+    assert not speculator.submit("s1", "evaluation", "k2", lambda: finished("two"), 10, 10)
+    # Other owners and kinds are not held back
+    assert speculator.submit("s2", "evaluation", "k2", lambda: finished("two"), 10, 10)
+    assert speculator.submit("s1", "case_studies", "k2", lambda: finished("two"), 10, 10)
+    assert speculator.stats()["evaluation"]["skipped_throttled"] == 1
+    # The throttled request left the earlier speculation in place
+    assert speculator.claim("s1", "evaluation", "k1") == "one"
+    now[0] += 20
+    assert speculator.submit("s1", "evaluation", "k3", lambda: finished("three"), 10, 10)
+
+
+def test_claim_gives_up_after_its_timeout():
+    speculator = Speculator()
+    pending = Future()
+    assert speculator.submit("s1", "evaluation", "k1", lambda: pending, 10, 10)
+    assert speculator.claim("s1", "evaluation", "k1", timeout=0.01) is None
+    assert pending.cancelled()
+    assert speculator.stats()["evaluation"]["failed"] == 1
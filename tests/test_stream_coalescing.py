@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from stream_coalescing import CoalescePolicy, coalesce_chunks, passthrough_policy
+
+
+def stalled(first, stall_after, release):
+    """Yield `first`, then wait for `release` before yielding the rest."""
+    yield from first[:stall_after]
+    release.wait(5)
+    yield from first[stall_after:]
+
+
+def test_untimed_merges_deltas_and_keeps_the_text():
+    deltas = ["Hel", "lo ", "the", "re ", "doc", "tor."]
+    ticks = iter(range(100))
+    policy = CoalescePolicy(min_interval=2, max_interval=100, boundary="word")
+    chunks = list(coalesce_chunks(deltas, policy, clock=lambda: next(ticks), timed=False))
+    assert chunks[0] == "Hel"
+    assert len(chunks) < len(deltas)
+    assert "".join(chunks) == "".join(deltas)
+
+
+def test_passthrough_yields_every_delta():
+    deltas = ["a", "b", "", "c"]
+    assert list(coalesce_chunks(deltas, passthrough_policy)) == ["a", "b", "c"]
+
+
+def test_stalled_stream_is_flushed_after_max_interval():
+    release = threading.Event()
+    policy = CoalescePolicy(min_interval=10, max_interval=0.1, boundary="word")
+    chunks = coalesce_chunks(stalled(["First", " buffered", " text"], 3, release), policy)
+    assert next(chunks) == "First"
+    started = time.perf_counter()
+    # Held back by min_interval, then released by the timer although no delta follows
+    assert next(chunks) == " buffered text"
+    assert time.perf_counter() - started < 1
+    release.set()
+    assert list(chunks) == []
+
+
+def test_source_errors_reach_the_reader():
+    def failing():
+        yield "partial"
+        raise ConnectionError("dropped")
+
+    with pytest.raises(ConnectionError):
+        list(coalesce_chunks(failing()))
+
+
+def test_abandoning_the_reader_closes_the_source():
+    closed = threading.Event()
+
+    def source():
+        try:
+            while True:
+                yield "token "
+                time.sleep(0.01)
+        finally:
+            closed.set()
+
+    chunks = coalesce_chunks(source())
+    next(chunks)
+    chunks.close()
+    assert closed.wait(2)
@@ -1,45 +1,154 @@
 import os
 import streamlit as st
-from groq import Groq
 import re
+from llm_gateway import LLMGateway
+from llm_metrics import metrics, start_metrics_server
+from stream_coalescing import CoalescePolicy
 
-# Initialize the Groq client with your API key from the TOML file
-api_key = st.secrets["GROQ"]["api_key"]
-client = Groq(api_key=api_key)
+
+@st.cache_resource
+def get_gateway():
+    """Create the process-wide LLM gateway on first use.
+
+    Uses the Groq API key from the TOML file; an optional [LLM] section selects
+    another backend, e.g. the local mock server.
+    """
+    # The provider SDK is imported here so pages that never call the model do not load it
+    from llm_backend import create_backend
+
+    llm_settings = st.secrets.get("LLM", {})
+    api_key = st.secrets.get("GROQ", {}).get("api_key")
+    gateway = LLMGateway(create_backend(llm_settings, api_key))
+    # Optionally expose the gateway's latency metrics for Prometheus to scrape
+    if llm_settings.get("metrics_port"):
+        # Workers started by serve.py each take the next port
+        worker = int(os.environ.get("MEDILEARN_WORKER", 0))
+        start_metrics_server(metrics, int(llm_settings["metrics_port"]) + worker)
+    return gateway
+
+@st.cache_resource
+def get_shared_cache():
+    """Return the cache shared by all worker processes, or None (configure with an optional [SHARED_CACHE] section)."""
+    from shared_cache import create_shared_cache
+    return create_shared_cache(st.secrets.get("SHARED_CACHE", {}))
+
+@st.cache_resource
+def get_speculator():
+    """Return the process-wide speculative prefetcher (configure with an optional [SPECULATION] section)."""
+    from speculation import Speculator
+    return Speculator(**st.secrets.get("SPECULATION", {}))
 
 model_name = "llama3-70b-8192"
 chat_response_token = 600
 evaluation_token = 800
+# "messages" sends a stable system prefix plus role-tagged history, "prompt" one rebuilt user prompt
+chat_mode = "messages"
+# How streamed chat deltas are merged before rendering; override in an optional [STREAM] section
+# (min_interval, max_interval, boundary = "none" | "word" | "sentence", max_chars)
+chat_stream_policy = CoalescePolicy(**st.secrets.get("STREAM", {}))
 
-def generate_case_studies(user_prompt):
-    prompt = user_prompt
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[{"role": "system", "content": prompt}]
-        )
-    case_study_text = response.choices[0].message.content
-    case_studies = re.split(r'\*\*Case Study \d+:\*\*', case_study_text)
-    case_studies.pop(0)
-    case_studies = [case.strip() for case in case_studies if case.strip()]
+# Marker the model puts in front of each generated case study
+case_marker = re.compile(r'\*\*Case Study \d+:\*\*')
+# Enough trailing characters to hold a marker split across stream chunks
+case_marker_lookback = 32
+
+
+class CaseStudySplitter:
+    """Incrementally split generated text into case studies as it arrives."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.scan_from = 0
+        self.case_start = None
+
+    def feed(self, text):
+        """Add a chunk of text and return the case studies completed by it."""
+        self.buffer += text
+        finished = []
+        for match in case_marker.finditer(self.buffer, self.scan_from):
+            if self.case_start is not None:
+                case = self.buffer[self.case_start:match.start()].strip()
+                if case:
+                    finished.append(case)
+            self.case_start = match.end()
+            self.scan_from = match.end()
+
+        # Drop text that can no longer be part of a case or a marker
+        keep_from = self.case_start
+        if keep_from is None:
+            keep_from = max(0, len(self.buffer) - case_marker_lookback)
+        self.buffer = self.buffer[keep_from:]
+        if self.case_start is not None:
+            self.case_start -= keep_from
+        self.scan_from = max(self.scan_from - keep_from,
+                             len(self.buffer) - case_marker_lookback, 0)
+        return finished
+
+    def close(self):
+        """Return the last case study once the text is complete."""
+        if self.case_start is None:
+            return []
+        case = self.buffer[self.case_start:].strip()
+        self.buffer = ""
+        self.case_start = None
+        self.scan_from = 0
+        return [case] if case else []
+
+
+def split_case_studies(case_study_text):
+    splitter = CaseStudySplitter()
+    case_studies = splitter.feed(case_study_text)
+    case_studies.extend(splitter.close())
     return case_studies
 
+def generate_case_studies(user_prompt, gateway=None):
+    prompt = user_prompt
+    # Background threads pass the gateway in, since cached resources need a script run to look up
+    gateway = gateway or get_gateway()
+    # Never merge identical generation requests: each call should produce fresh cases
+    case_study_text = gateway.complete(
+        [{"role": "system", "content": prompt}], model_name, coalesce=False, label="case_studies")
+    return split_case_studies(case_study_text)
+
+def submit_case_studies(user_prompt):
+    """Start generating case studies in the background; return a future of the raw text."""
+    return get_gateway().submit_complete([{"role": "system", "content": user_prompt}], model_name,
+                                         coalesce=False, label="speculative_case_studies")
+
+def stream_case_studies(user_prompt):
+    """Yield each case study as soon as the streamed completion reaches the next marker."""
+    response = get_gateway().stream([{"role": "system", "content": user_prompt}], model_name, label="case_studies")
+    splitter = CaseStudySplitter()
+    for content in response:
+        yield from splitter.feed(content)
+    yield from splitter.close()
+
 def get_chat_response( system_prompt, dynamic_prompt):
-    chat_completion = client.chat.completions.create(
-        model=model_name,
-        messages=[
+    chat_completion = get_gateway().stream(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": dynamic_prompt}
         ],
+        model_name,
         max_tokens=chat_response_token,
-        stream=True,
+        label="chat",
     )
     return chat_completion
 
-def evaluate_performance(evaluation_prompt):
-    evaluation_response = client.chat.completions.create(
-        model=model_name,
-        messages=[{"role": "system", "content": evaluation_prompt}],
-        max_tokens=evaluation_token
-    )
+def get_chat_messages_response(messages):
+    """Stream a chat reply for an already role-tagged message list."""
+    return get_gateway().stream(messages, model_name, max_tokens=chat_response_token, label="chat")
 
-    return evaluation_response.choices[0].message.content
+def submit_evaluation(evaluation_prompt):
+    """Start an evaluation in the background; return a future of its text."""
+    return get_gateway().submit_evaluate(evaluation_prompt, model_name, max_tokens=evaluation_token,
+                                         label="speculative_evaluation")
+
+def stream_evaluation(evaluation_prompt):
+    """Yield the evaluation text as it is generated."""
+    return get_gateway().stream(
+        [{"role": "system", "content": evaluation_prompt}],
+        model_name,
+        max_tokens=evaluation_token,
+        label="evaluation",
+    )